@@ -1,7 +1,12 @@
+import argparse
 import psycopg2
 from psycopg2 import sql
 from db_config import db_connection_params
 from db_utils import connect_to_db, close_db_connection
+from metrics import track_stage
+from db_migrations import apply_migrations, print_migration_status
+from vehicle_lineage import LINEAGE_TABLE_DDL
+from log_config import logger
 
 def execute_query(conn, query, message="쿼리 실행"):
     """주어진 쿼리를 실행하는 함수."""
@@ -10,17 +15,24 @@ def execute_query(conn, query, message="쿼리 실행"):
         try:
             cur.execute(query)
             conn.commit()
-            print(f"✅ {message} 성공적으로 실행되었습니다.")
+            logger.info(f"✅ {message} 성공적으로 실행되었습니다.")
         except psycopg2.Error as e:
-            print(f"❌ {message} 오류: {e}")
+            logger.error(f"❌ {message} 오류: {e}")
             conn.rollback()
 
 def create_tables(conn):
     """모든 테이블을 삭제하고 새로 생성하는 함수."""
-    print("\n--- 기존 테이블 삭제 및 새 테이블 생성 시작 ---")
+    logger.info("--- 기존 테이블 삭제 및 새 테이블 생성 시작 ---")
 
     # 기존 테이블 삭제 (외래 키 제약 조건 역순으로 삭제)
     drop_queries = [
+        "DROP TABLE IF EXISTS schema_migrations CASCADE;",
+        "DROP TABLE IF EXISTS bus_vehicle_lineage CASCADE;",
+        "DROP TABLE IF EXISTS bus_monthly_quarantine CASCADE;",
+        "DROP TABLE IF EXISTS bus_ev_operation_periods CASCADE;",
+        "DROP TABLE IF EXISTS bus_ev_annual_emissions CASCADE;",
+        "DROP TABLE IF EXISTS bus_ev_monthly_emissions CASCADE;",
+        "DROP TABLE IF EXISTS grid_emission_factors CASCADE;",
         "DROP TABLE IF EXISTS bus_emission_reductions CASCADE;",
         "DROP TABLE IF EXISTS bus_baseline_parameters CASCADE;",
         "DROP TABLE IF EXISTS bus_driving_records CASCADE;",
@@ -50,33 +62,32 @@ def create_tables(conn):
     """
     execute_query(conn, create_vehicle_master_query, message="'bus_vehicle_master' 테이블 생성")
 
-    # 2. bus_driving_records 테이블 생성 (변경된 스키마)
+    # 2. bus_driving_records 테이블 생성 (운행년월 기준 연도별 범위 파티션, 파티션은 db_partitions.py가 생성)
     create_driving_records_query = """
     CREATE TABLE bus_driving_records (
-        id SERIAL PRIMARY KEY,
         vehicle_plate_no VARCHAR(20) NOT NULL,
-        year_month VARCHAR(7) NOT NULL,
+        year_month INT NOT NULL,
         operating_days INT,
         driving_distance_km FLOAT,
         fuel_quantity_l FLOAT,
         charging_amount_kwh FLOAT,
 
-        UNIQUE (vehicle_plate_no, year_month),
+        PRIMARY KEY (vehicle_plate_no, year_month),
         FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
-    );
+    ) PARTITION BY RANGE (year_month);
     """
     execute_query(conn, create_driving_records_query, message="'bus_driving_records' 테이블 생성")
 
-    # 3. bus_monthly_fuel_data 테이블 생성
+    # 3. bus_monthly_fuel_data 테이블 생성 (운행년월 기준 연도별 범위 파티션)
     create_monthly_fuel_data_query = """
     CREATE TABLE bus_monthly_fuel_data (
         vehicle_plate_no VARCHAR(20) NOT NULL,
-        record_year_month VARCHAR(6) NOT NULL,
+        record_year_month INT NOT NULL,
         fuel_consumption_l DOUBLE PRECISION,
         distance_km DOUBLE PRECISION,
         PRIMARY KEY (vehicle_plate_no, record_year_month),
         FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
-    );
+    ) PARTITION BY RANGE (record_year_month);
     """
     execute_query(conn, create_monthly_fuel_data_query, message="'bus_monthly_fuel_data' 테이블 생성")
 
@@ -84,8 +95,8 @@ def create_tables(conn):
     create_baseline_parameters_query = """
     CREATE TABLE bus_baseline_parameters (
         vehicle_plate_no VARCHAR(20) PRIMARY KEY,
-        baseline_start_ym VARCHAR(7),
-        baseline_end_ym VARCHAR(7),
+        baseline_start_ym INT,
+        baseline_end_ym INT,
         months_of_operation INT,
         avg_annual_distance_km FLOAT,
         avg_annual_fuel_l FLOAT,
@@ -115,18 +126,110 @@ def create_tables(conn):
     """
     execute_query(conn, create_emission_reductions_query, message="'bus_emission_reductions' 테이블 생성")
 
-    print("--- 기존 테이블 삭제 및 새 테이블 생성 완료 ---")
+    # 5. grid_emission_factors 테이블 생성 (연도별 전력 배출계수)
+    create_grid_emission_factors_query = """
+    CREATE TABLE grid_emission_factors (
+        factor_year INT PRIMARY KEY,
+        kg_co2_per_kwh DOUBLE PRECISION NOT NULL
+    );
+    """
+    execute_query(conn, create_grid_emission_factors_query, message="'grid_emission_factors' 테이블 생성")
+
+    # 6. bus_ev_monthly_emissions 테이블 생성 (전기버스 월별 간접배출량)
+    create_ev_monthly_emissions_query = """
+    CREATE TABLE bus_ev_monthly_emissions (
+        vehicle_plate_no VARCHAR(20) NOT NULL,
+        year_month INT NOT NULL,
+        charging_amount_kwh DOUBLE PRECISION NOT NULL,
+        grid_emission_factor DOUBLE PRECISION NOT NULL,
+        ev_co2_emission_kg DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (vehicle_plate_no, year_month),
+        FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
+    );
+    """
+    execute_query(conn, create_ev_monthly_emissions_query, message="'bus_ev_monthly_emissions' 테이블 생성")
+
+    # 7. bus_ev_annual_emissions 테이블 생성 (전기버스 연간 간접배출량)
+    create_ev_annual_emissions_query = """
+    CREATE TABLE bus_ev_annual_emissions (
+        vehicle_plate_no VARCHAR(20) NOT NULL,
+        emission_year INT NOT NULL,
+        months_reported INT NOT NULL,
+        charging_amount_kwh DOUBLE PRECISION NOT NULL,
+        ev_co2_emission_kg DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (vehicle_plate_no, emission_year),
+        FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
+    );
+    """
+    execute_query(conn, create_ev_annual_emissions_query, message="'bus_ev_annual_emissions' 테이블 생성")
+
+    # 8. bus_ev_operation_periods 테이블 생성 (전기버스 운행기간)
+    create_ev_operation_periods_query = """
+    CREATE TABLE bus_ev_operation_periods (
+        vehicle_plate_no VARCHAR(20) PRIMARY KEY,
+        ev_registration_date DATE NOT NULL,
+        first_active_ym INT,
+        last_active_ym INT,
+        active_months INT NOT NULL,
+        gap_months INT NOT NULL,
+        run_count INT NOT NULL,
+        longest_run_months INT NOT NULL,
+        coverage_ratio DOUBLE PRECISION NOT NULL,
+
+        FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
+    );
+    """
+    execute_query(conn, create_ev_operation_periods_query, message="'bus_ev_operation_periods' 테이블 생성")
+
+    # 9. bus_monthly_quarantine 테이블 생성 (10번 품질 검사에서 걸린 월별 연료 데이터, 02번 베이스라인 계산에서 제외)
+    create_monthly_quarantine_query = """
+    CREATE TABLE bus_monthly_quarantine (
+        vehicle_plate_no VARCHAR(20) NOT NULL,
+        record_year_month INT NOT NULL,
+        flags INT NOT NULL,
+        reasons VARCHAR(200) NOT NULL,
+        fuel_per_km DOUBLE PRECISION,
+        robust_z DOUBLE PRECISION,
+        distance_ratio DOUBLE PRECISION,
+        PRIMARY KEY (vehicle_plate_no, record_year_month),
+        FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
+    );
+    """
+    execute_query(conn, create_monthly_quarantine_query, message="'bus_monthly_quarantine' 테이블 생성")
+
+    # 10. bus_vehicle_lineage 테이블 생성 (차량 대체 계보 closure 테이블, 01번이 차량 마스터 저장 시 갱신)
+    execute_query(conn, LINEAGE_TABLE_DDL, message="'bus_vehicle_lineage' 테이블 생성")
+
+    # 조회/조인용 인덱스는 이어서 실행되는 apply_migrations(버전 2, db_migrations.SUPPORTING_INDEXES)가 생성
+
+    logger.info("--- 기존 테이블 삭제 및 새 테이블 생성 완료 ---")
 
 def main():
     """메인 실행 함수."""
-    print("\n--- [파일 00] 데이터베이스 스키마 관리 시작 ---")
+    parser = argparse.ArgumentParser(description="데이터베이스 스키마 관리 (초기화 또는 마이그레이션)")
+    parser.add_argument('--migrate', action='store_true',
+                        help="테이블을 삭제하지 않고, 아직 적용되지 않은 스키마 마이그레이션만 적용합니다.")
+    parser.add_argument('--status', action='store_true', help="스키마 마이그레이션 적용 현황만 출력합니다.")
+    args = parser.parse_args()
+
+    logger.info("--- [파일 00] 데이터베이스 스키마 관리 시작 ---")
     
     db_params = db_connection_params  # db_config.py에서 가져온 DB 연결 정보
     conn = connect_to_db(db_params)
     
     if conn:
-        create_tables(conn)
+        if args.status:
+            print_migration_status(conn)
+        elif args.migrate:
+            # 기존 데이터를 유지한 채 스키마만 최신 버전으로 변경
+            apply_migrations(conn)
+            print_migration_status(conn)
+        else:
+            # 최신 스키마로 새로 만든 뒤, 마이그레이션 이력을 기록 (이미 최신 구조이므로 현재~미래 연도 파티션만 생성되고 버전이 기록됨)
+            create_tables(conn)
+            apply_migrations(conn)
         close_db_connection(conn)
 
 if __name__ == '__main__':
-    main()
+    with track_stage():
+        main()
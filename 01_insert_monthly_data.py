@@ -3,12 +3,15 @@ import numpy as np
 import random
 from datetime import datetime
 import psycopg2
-from psycopg2 import sql
-from psycopg2.extras import execute_values
 from io import StringIO
 import os
 from db_config import db_connection_params
 from db_utils import connect_to_db, close_db_connection
+from metrics import track_stage, track_step
+from db_writer import bulk_upsert
+from db_partitions import ensure_year_partitions
+from vehicle_lineage import find_changed_link_plates, refresh_lineage
+from log_config import logger
 
 def execute_query(conn, query, message="쿼리 실행"):
     """주어진 쿼리를 실행하는 함수."""
@@ -17,52 +20,31 @@ def execute_query(conn, query, message="쿼리 실행"):
         try:
             cur.execute(query)
             conn.commit()
-            print(f"✅ {message} 성공적으로 실행되었습니다.")
+            logger.info(f"✅ {message} 성공적으로 실행되었습니다.")
         except psycopg2.Error as e:
-            print(f"❌ {message} 오류: {e}")
+            logger.error(f"❌ {message} 오류: {e}")
             conn.rollback()
 
 def insert_vehicle_master_data(conn, df):
     """
     bus_vehicle_master 테이블에 차량 마스터 데이터를 저장하거나 업데이트하는 함수.
+    - ev_registration_date의 NaT는 공통 저장 함수(bulk_upsert)에서 NULL로 일괄 변환됩니다.
+    - 자기참조 외래 키(replaced_by_ev_plate_no 등)는 문장 단위로 검사되므로, bulk_upsert는 COPY 병합이든
+      execute_values(기본 page_size = COPY 기준 행 수)든 전체 배치를 한 문장으로 저장합니다.
+    - 저장 후 대체 관계 컬럼이 바뀐 차량의 계보(bus_vehicle_lineage)만 증분 갱신합니다.
     :param conn: psycopg2 connection 객체
     :param df: 저장할 차량 마스터 데이터프레임
     """
     if not conn or df.empty: return
-
-    # ev_registration_date의 NaT 값을 None으로 변환하여 DB의 DATE 타입에 맞춤
-    df_copy = df.copy()
-    if 'ev_registration_date' in df_copy.columns:
-        df_copy['ev_registration_date'] = df_copy['ev_registration_date'].apply(lambda x: x.strftime('%Y-%m-%d') if pd.notna(x) else None)
-
-    cols = df_copy.columns.tolist()
-    values = [tuple(row) for row in df_copy.to_numpy()]
-
-    update_cols = [col for col in cols if col != 'vehicle_plate_no']
-    update_statement = ", ".join([f"{col}=EXCLUDED.{col}" for col in update_cols])
-
-    insert_query = sql.SQL("""
-        INSERT INTO bus_vehicle_master ({}) 
-        VALUES %s
-        ON CONFLICT (vehicle_plate_no) DO UPDATE SET {}
-    """).format(
-        sql.SQL(', ').join(map(sql.Identifier, cols)),
-        sql.SQL(update_statement)
-    )
-
-    with conn.cursor() as cur:
-        try:
-            print("⏳ 'bus_vehicle_master' 테이블에 차량 마스터 데이터를 저장/업데이트합니다...")
-            execute_values(cur, insert_query, values)
-            conn.commit()
-            print(f"✅ {cur.rowcount}개의 차량 마스터 레코드가 성공적으로 저장/업데이트되었습니다.")
-        except psycopg2.Error as e:
-            print(f"❌ 차량 마스터 데이터 저장 오류: {e}")
-            conn.rollback()
+    changed_plates = find_changed_link_plates(conn, df)
+    result = bulk_upsert(conn, 'bus_vehicle_master', df, key_cols=['vehicle_plate_no'], label='차량 마스터')
+    if result is not None:
+        refresh_lineage(conn, changed_plates)
+    return result
 
 def insert_driving_records_data(conn, df):
     """
-    DataFrame을 PostgreSQL의 bus_driving_records에 저장하거나 업데이트하는 함수 (execute_values 사용).
+    DataFrame을 PostgreSQL의 bus_driving_records에 저장하거나 업데이트하는 함수 (bulk_upsert 사용).
     :param conn: psycopg2 connection 객체
     :param df: 저장할 데이터프레임 (vehicle_plate_no, year_month, operating_days, driving_distance_km, fuel_quantity_l, charging_amount_kwh)
     """
@@ -72,33 +54,13 @@ def insert_driving_records_data(conn, df):
         'vehicle_plate_no', 'year_month', 'operating_days',
         'driving_distance_km', 'fuel_quantity_l', 'charging_amount_kwh'
     ]
-    values = [tuple(row) for row in df[cols].to_numpy()]
-
-    update_cols = [col for col in cols if col not in ['vehicle_plate_no', 'year_month']]
-    update_statement = ", ".join([f"{col}=EXCLUDED.{col}" for col in update_cols])
-
-    insert_query = sql.SQL("""
-        INSERT INTO bus_driving_records ({}) 
-        VALUES %s
-        ON CONFLICT (vehicle_plate_no, year_month) DO UPDATE SET {}
-    """).format(
-        sql.SQL(', ').join(map(sql.Identifier, cols)),
-        sql.SQL(update_statement)
-    )
-
-    with conn.cursor() as cur:
-        try:
-            print("⏳ 'bus_driving_records' 테이블에 월별 데이터를 저장/업데이트합니다...")
-            execute_values(cur, insert_query, values)
-            conn.commit()
-            print(f"✅ {cur.rowcount}개의 월별 운행 기록 레코드가 성공적으로 저장/업데이트되었습니다.")
-        except psycopg2.Error as e:
-            print(f"❌ 월별 운행 기록 데이터 저장 오류: {e}")
-            conn.rollback()
+    return bulk_upsert(conn, 'bus_driving_records', df, key_cols=['vehicle_plate_no', 'year_month'],
+                       columns=cols, label='월별 운행 기록')
 
 def insert_monthly_fuel_data(conn, df):
     """
-    DataFrame을 PostgreSQL의 bus_monthly_fuel_data에 저장하거나 업데이트하는 함수 (execute_values 사용).
+    DataFrame을 PostgreSQL의 bus_monthly_fuel_data에 저장하거나 업데이트하는 함수 (bulk_upsert 사용).
+    - NaN 값은 공통 저장 함수에서 NULL로 일괄 변환되어 DB의 DOUBLE PRECISION 타입에 맞춰집니다.
     :param conn: psycopg2 connection 객체
     :param df: 저장할 데이터프레임 (vehicle_plate_no, record_year_month, fuel_consumption_l, distance_km)
     """
@@ -107,41 +69,15 @@ def insert_monthly_fuel_data(conn, df):
     cols = [
         'vehicle_plate_no', 'record_year_month', 'fuel_consumption_l', 'distance_km'
     ]
-
-    # NaN 값을 None으로 변환하여 DB의 DOUBLE PRECISION 타입에 맞춤
-    df_copy = df[cols].copy()
-    for col in ['fuel_consumption_l', 'distance_km']:
-        df_copy[col] = df_copy[col].replace({np.nan: None})
-
-    values = [tuple(row) for row in df_copy.to_numpy()]
-
-    update_cols = [col for col in cols if col not in ['vehicle_plate_no', 'record_year_month']]
-    update_statement = ", ".join([f"{col}=EXCLUDED.{col}" for col in update_cols])
-
-    insert_query = sql.SQL("""
-        INSERT INTO bus_monthly_fuel_data ({}) 
-        VALUES %s
-        ON CONFLICT (vehicle_plate_no, record_year_month) DO UPDATE SET {}
-    """).format(
-        sql.SQL(', ').join(map(sql.Identifier, cols)),
-        sql.SQL(update_statement)
-    )
-    
-    with conn.cursor() as cur:
-        try:
-            print("⏳ 'bus_monthly_fuel_data' 테이블에 월별 연료 데이터를 저장/업데이트합니다...")
-            execute_values(cur, insert_query, values)
-            conn.commit()
-            print(f"✅ {cur.rowcount}개의 월별 연료 기록 레코드가 성공적으로 삽입/업데이트되었습니다.")
-        except psycopg2.Error as e:
-            print(f"❌ 월별 연료 기록 데이터 저장 오류: {e}")
-            conn.rollback()
+    return bulk_upsert(conn, 'bus_monthly_fuel_data', df, key_cols=['vehicle_plate_no', 'record_year_month'],
+                       columns=cols, label='월별 연료 기록')
 
 def main():
     """메인 실행 함수"""
-    print("--- [파일 1] 월별 운행 기록 데이터 생성 및 DB 적재 시작 ---")
+    logger.info("--- [파일 1] 월별 운행 기록 데이터 생성 및 DB 적재 시작 ---")
 
     # --- 가상 데이터 생성 ---
+    generate_step = track_step('compute', 'generate')
     num_total_vehicles = 30 # 전체 차량 수 (EV + ICE)
     num_replacement_evs = 10 # 대체도입 전기버스 수 (이 수만큼 베이스라인 대상 내연기관 차량이 필요)
     start_year, end_year = 2019, 2023 # Generate 5 years of data (2019-2023)
@@ -298,7 +234,7 @@ def main():
             
             monthly_records_data.append({
                 'vehicle_plate_no': vehicle_plate_no,
-                'year_month': date.strftime('%Y%m'),
+                'year_month': date.year * 100 + date.month,  # 정수 YYYYMM
                 'operating_days': operating_days,
                 'driving_distance_km': distance,
                 'fuel_quantity_l': fuel,
@@ -317,7 +253,8 @@ def main():
     monthly_records_df['fuel_quantity_l'] = pd.to_numeric(monthly_records_df['fuel_quantity_l'], errors='coerce').fillna(0).astype(float)
     monthly_records_df['charging_amount_kwh'] = pd.to_numeric(monthly_records_df['charging_amount_kwh'], errors='coerce').fillna(0).astype(float)
 
-    print("✅ 가상 데이터 생성 및 정제를 완료했습니다.")
+    generate_step.finish(rows_out=len(vehicle_master_df) + len(monthly_records_df))
+    logger.info("✅ 가상 데이터 생성 및 정제를 완료했습니다.")
 
     # --- 생성된 데이터를 엑셀 파일로 저장 ---
     try:
@@ -333,13 +270,13 @@ def main():
         with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
             vehicle_master_df.to_excel(writer, sheet_name='Vehicle_Master', index=False)
             monthly_records_df.to_excel(writer, sheet_name='Monthly_Records', index=False)
-        print(f"✅ 생성된 데이터를 엑셀 파일로 저장했습니다: {excel_path}")
+        logger.info(f"✅ 생성된 데이터를 엑셀 파일로 저장했습니다: {excel_path}")
 
     except ImportError:
-        print("\n⚠️ 'openpyxl' 라이브러리가 설치되지 않아 엑셀 파일로 저장할 수 없습니다.")
-        print("   (엑셀 출력을 원하시면 'pip install openpyxl' 실행 후 다시 시도해주세요)\n")
+        logger.warning("⚠️ 'openpyxl' 라이브러리가 설치되지 않아 엑셀 파일로 저장할 수 없습니다.")
+        logger.info("   (엑셀 출력을 원하시면 'pip install openpyxl' 실행 후 다시 시도해주세요)\n")
     except Exception as e:
-        print(f"❌ 엑셀 파일 저장 중 오류 발생: {e}")
+        logger.error(f"❌ 엑셀 파일 저장 중 오류 발생: {e}")
 
     # --- DB 연결 및 작업 수행 ---
     db_params = db_connection_params  # db_config.py에서 가져온 DB 연결 정보
@@ -349,7 +286,10 @@ def main():
         # 1. bus_vehicle_master 테이블에 차량 마스터 데이터 적재
         insert_vehicle_master_data(conn, vehicle_master_df)
 
-        # 2. bus_driving_records 테이블에 월별 운행 기록 데이터 적재
+        # 2. 적재할 데이터 연도(및 현재~미래 연도)의 파티션을 미리 생성 (파티션이 없는 연도의 행은 INSERT가 실패함)
+        ensure_year_partitions(conn, years=(monthly_records_df['year_month'] // 100).unique().tolist())
+
+        # bus_driving_records 테이블에 월별 운행 기록 데이터 적재
         insert_driving_records_data(conn, monthly_records_df)
 
         # 3. bus_monthly_fuel_data 테이블에 월별 연료 데이터 적재
@@ -364,4 +304,5 @@ def main():
         close_db_connection(conn)
 
 if __name__ == '__main__':
-    main()
+    with track_stage():
+        main()
@@ -1,88 +1,75 @@
+import argparse
 import pandas as pd
 import numpy as np
-import psycopg2
-from psycopg2 import sql
-from psycopg2.extras import execute_values
 from datetime import datetime
-from db_config import db_connection_params
-from db_utils import connect_to_db, close_db_connection
+from storage import add_storage_arguments, open_storage_from_args
+from metrics import track_stage, track_step
 from constants import NET_CALORIFIC_VALUE, CO2_EMISSION_FACTOR, CNG_DENSITY_KG_PER_M3
+from log_config import logger, WarningAggregator
 
-def execute_query(conn, query, message="쿼리 실행"):
-    """주어진 쿼리를 실행하는 함수."""
-    if not conn: return
-    with conn.cursor() as cur:
-        try:
-            cur.execute(query)
-            conn.commit()
-            print(f"✅ {message} 성공적으로 실행되었습니다.")
-        except psycopg2.Error as e:
-            print(f"❌ {message} 오류: {e}")
-            conn.rollback()
-
-def load_data_from_db(conn, table_name):
-    """DB에서 지정된 테이블의 데이터를 불러와 DataFrame으로 반환하는 함수."""
-    if not conn: return pd.DataFrame()
-    print(f"⏳ '{table_name}' 테이블에서 데이터를 로드합니다...")
-    try:
-        query = f"SELECT * FROM {table_name};"
-        df = pd.read_sql_query(query, conn)
-        print(f"✅ {len(df)}개의 '{table_name}' 데이터를 성공적으로 로드했습니다.")
-        return df
-    except Exception as e:
-        print(f"❌ '{table_name}' 데이터 로드 중 오류 발생: {e}")
-        return pd.DataFrame()
-
-def insert_or_update_baseline_data(conn, df):
+def load_recent_monthly_fuel_data(storage, from_year_month):
     """
-    베이스라인 데이터를 DB에 저장하거나 업데이트하는 함수 (ON CONFLICT ... DO UPDATE).
-    :param conn: psycopg2 connection 객체
+    베이스라인 산정 기간(from_year_month 이후)의 월별 연료 데이터만 불러오는 함수.
+    - PostgreSQL의 bus_monthly_fuel_data는 연도별 파티션 테이블이므로, 운행년월 범위 조건으로 기간 밖 연도 파티션은 읽지 않습니다.
+      (DuckDB 스냅샷에서는 연도 파티션 폴더와 Parquet 행 그룹 통계로 같은 효과를 얻습니다.)
+    :param storage: storage.open_storage로 연 저장소
+    :param from_year_month: 조회 시작 운행년월 (정수 YYYYMM, 포함)
+    """
+    return storage.load_table('bus_monthly_fuel_data', filters=[('record_year_month', '>=', from_year_month)])
+
+def exclude_quarantined_rows(storage, monthly_fuel_df, from_year_month):
+    """
+    10번 스크립트가 격리한 월별 행(bus_monthly_quarantine)을 베이스라인 계산 대상에서 제외하는 함수.
+    - 격리 테이블이 없으면(10번 미실행) 그대로 반환합니다.
+    :return: 격리된 행을 제외한 월별 연료 데이터
+    """
+    if monthly_fuel_df.empty or not storage.has_table('bus_monthly_quarantine'):
+        return monthly_fuel_df
+    key_cols = ['vehicle_plate_no', 'record_year_month']
+    quarantined_df = storage.load_table('bus_monthly_quarantine', columns=key_cols,
+                                        filters=[('record_year_month', '>=', from_year_month)])
+    if quarantined_df.empty:
+        return monthly_fuel_df
+    quarantined = pd.MultiIndex.from_frame(quarantined_df.astype({'record_year_month': 'int64'}))
+    is_quarantined = pd.MultiIndex.from_frame(monthly_fuel_df[key_cols].astype({'record_year_month': 'int64'})).isin(quarantined)
+    logger.info(f"ℹ️  품질 검사에서 격리된 월별 데이터 {is_quarantined.sum()}건을 베이스라인 계산에서 제외합니다.")
+    return monthly_fuel_df[~is_quarantined]
+
+def insert_or_update_baseline_data(storage, df):
+    """
+    베이스라인 데이터를 저장하거나 업데이트하는 함수 (PostgreSQL은 bulk_upsert 사용).
+    :param storage: storage.open_storage로 연 저장소
     :param df: 저장할 베이스라인 데이터프레임 (vehicle_plate_no, months_of_operation, avg_annual_distance_km, avg_annual_fuel_l, fuel_per_km)
     """
-    if not conn or df.empty: return
-    
-    # bus_baseline_parameters 테이블의 컬럼명에 맞게 DataFrame 컬럼명 변경 (이미 영문으로 가정)
-    cols = df.columns.tolist()
-    values = [tuple(row) for row in df.to_numpy()]
-    
-    # ON CONFLICT ... DO UPDATE 쿼리 작성
-    update_cols = [col for col in cols if col != 'vehicle_plate_no']
-    update_statement = ", ".join([f"{col}=EXCLUDED.{col}" for col in update_cols])
-    
-    insert_query = sql.SQL("""
-        INSERT INTO bus_baseline_parameters ({}) 
-        VALUES %s
-        ON CONFLICT (vehicle_plate_no) DO UPDATE SET {}
-    """).format(
-        sql.SQL(', ').join(map(sql.Identifier, cols)),
-        sql.SQL(update_statement)
-    )
-    
-    with conn.cursor() as cur:
-        try:
-            print("⏳ 'bus_baseline_parameters' 테이블에 데이터를 저장/업데이트합니다...")
-            execute_values(cur, insert_query, values)
-            conn.commit()
-            print(f"✅ {cur.rowcount}개의 베이스라인 레코드가 성공적으로 저장/업데이트되었습니다.")
-        except psycopg2.Error as e:
-            print(f"❌ 베이스라인 데이터 저장 오류: {e}")
-            conn.rollback()
+    if not storage or df.empty: return
+    return storage.upsert('bus_baseline_parameters', df, key_cols=['vehicle_plate_no'], label='베이스라인')
 
 def main():
     """메인 실행 함수."""
-    print("\n--- [파일 2] 베이스라인 인자 계산 및 DB 적재 시작 ---")
+    parser = argparse.ArgumentParser(description="베이스라인 인자 계산 및 적재")
+    add_storage_arguments(parser)
+    args = parser.parse_args()
+
+    logger.info("--- [파일 2] 베이스라인 인자 계산 및 DB 적재 시작 ---")
     
-    db_params = db_connection_params  # db_config.py에서 가져온 DB 연결 정보
-    conn = connect_to_db(db_params)
+    # 저장소: 기본은 PostgreSQL(db_config.py), --storage duckdb/sqlite로 DB 서버 없이 스냅샷에서 계산
+    storage = open_storage_from_args(args)
     
-    if conn:
-        # 1. DB에서 월별 연료 데이터 및 차량 마스터 데이터 로드
-        monthly_fuel_df = load_data_from_db(conn, 'bus_monthly_fuel_data')
-        vehicle_master_df = load_data_from_db(conn, 'bus_vehicle_master')
+    if storage:
+        # 베이스라인은 현재 날짜 기준으로 5년 전까지의 데이터만 고려
+        current_date = pd.to_datetime(datetime.now().strftime('%Y%m'), format='%Y%m')
+        five_years_ago = current_date - pd.DateOffset(years=5)
+
+        # 1. DB에서 월별 연료 데이터(산정 기간 파티션만) 및 차량 마스터 데이터 로드
+        from_year_month = five_years_ago.year * 100 + five_years_ago.month
+        monthly_fuel_df = load_recent_monthly_fuel_data(storage, from_year_month)
+        # 품질 검사(10번)에서 격리된 월(물리적으로 불가능한 연비, 주행거리 급증 등)은 베이스라인에 넣지 않음
+        monthly_fuel_df = exclude_quarantined_rows(storage, monthly_fuel_df, from_year_month)
+        vehicle_master_df = storage.load_table('bus_vehicle_master')
         
         if monthly_fuel_df.empty or vehicle_master_df.empty:
-            print("⚠️ 필요한 데이터(월별 연료 기록 또는 차량 마스터)가 없습니다. 01번 스크립트를 먼저 실행해주세요.")
-            conn.close()
+            logger.warning("⚠️ 필요한 데이터(최근 5년 월별 연료 기록 또는 차량 마스터)가 없습니다. 01번 스크립트를 먼저 실행해주세요.")
+            storage.close()
             return
 
         # 월별 연료 기록과 차량 마스터 정보를 조인
@@ -96,18 +83,21 @@ def main():
         ].copy()
 
         if ice_vehicles_for_baseline.empty:
-            print("⚠️ 베이스라인을 계산할 내연기관 차량 데이터가 없습니다.")
-            close_db_connection(conn)
+            logger.warning("⚠️ 베이스라인을 계산할 내연기관 차량 데이터가 없습니다.")
+            storage.close()
             return
 
-        print(f"✅ 베이스라인 계산 대상 내연기관 차량 {len(ice_vehicles_for_baseline['vehicle_plate_no'].unique())}대에 대한 데이터 {len(ice_vehicles_for_baseline)}개를 로드했습니다.")
+        logger.info(f"✅ 베이스라인 계산 대상 내연기관 차량 {len(ice_vehicles_for_baseline['vehicle_plate_no'].unique())}대에 대한 데이터 {len(ice_vehicles_for_baseline)}개를 로드했습니다.")
 
         # 2. 베이스라인 계산을 위한 데이터 정제 및 계산
-        # 'record_year_month'를 datetime으로 변환하여 정렬 및 기간 필터링 용이하게 함
-        ice_vehicles_for_baseline['record_year_month_dt'] = pd.to_datetime(ice_vehicles_for_baseline['record_year_month'], format='%Y%m')
+        # 'record_year_month'(정수 YYYYMM)를 datetime으로 변환하여 정렬 및 기간 필터링 용이하게 함
+        ice_vehicles_for_baseline['record_year_month_dt'] = pd.to_datetime(ice_vehicles_for_baseline['record_year_month'].astype(str), format='%Y%m')
         ice_vehicles_for_baseline = ice_vehicles_for_baseline.sort_values(by=['vehicle_plate_no', 'record_year_month_dt'])
 
+        compute_step = track_step('compute', 'baseline', rows_in=len(ice_vehicles_for_baseline))
         baseline_data = []
+        # 차량마다 경고를 남기면 차량 수만큼 로그가 쌓이므로 사유별 건수와 예시 차량번호로 모아서 기록
+        skipped = WarningAggregator('baseline.skipped')
         for vehicle_plate_no, group in ice_vehicles_for_baseline.groupby('vehicle_plate_no'):
             # 유효한 연료 소비량과 주행 거리가 있는 데이터만 필터링
             valid_monthly_data = group[
@@ -116,20 +106,16 @@ def main():
             ].copy()
 
             if valid_monthly_data.empty:
-                print(f"⚠️ 차량 {vehicle_plate_no}: 유효한 월별 연료/거리 데이터가 없어 베이스라인을 계산할 수 없습니다.")
+                skipped.add("유효한 월별 연료/거리 데이터가 없어 베이스라인을 계산할 수 없는 차량", vehicle_plate_no)
                 continue
 
             # 최근 5년치 (60개월) 데이터 중 최소 3년치 (36개월) 이상이 존재하는지 확인
-            # 현재 날짜 기준으로 5년 전까지의 데이터만 고려
-            current_date = pd.to_datetime(datetime.now().strftime('%Y%m'), format='%Y%m')
-            five_years_ago = current_date - pd.DateOffset(years=5)
-
             recent_data = valid_monthly_data[
                 (valid_monthly_data['record_year_month_dt'] >= five_years_ago)
             ].copy()
 
             if len(recent_data) < 36:
-                print(f"⚠️ 차량 {vehicle_plate_no}: 베이스라인 계산에 필요한 최소 3년(36개월)치 데이터가 부족합니다 ({len(recent_data)}개월). 베이스라인을 계산하지 않습니다.")
+                skipped.add("최소 3년(36개월)치 데이터가 부족해 베이스라인을 계산하지 않은 차량", vehicle_plate_no, detail=f"{len(recent_data)}개월")
                 continue
             
             # 실제 베이스라인 계산에 사용될 데이터 (최대 5년치)
@@ -177,14 +163,16 @@ def main():
                 'baseline_emission_factor': baseline_emission_factor
             })
         
+        skipped.flush()
         baseline_df = pd.DataFrame(baseline_data)
+        compute_step.finish(rows_out=len(baseline_df))
         
         if baseline_df.empty:
-            print("⚠️ 모든 차량에 대해 베이스라인을 계산할 수 없었습니다.")
-            close_db_connection(conn)
+            logger.warning("⚠️ 모든 차량에 대해 베이스라인을 계산할 수 없었습니다.")
+            storage.close()
             return
 
-        print("✅ 베이스라인 인자 계산을 완료했습니다.")
+        logger.info("✅ 베이스라인 인자 계산을 완료했습니다.")
 
         # 3. bus_baseline_parameters 테이블 스키마에 맞게 컬럼 선택
         # 이미 위에서 필요한 컬럼만으로 DataFrame을 생성했으므로 추가 선택 불필요
@@ -199,11 +187,13 @@ def main():
         # ]]
             
         # 4. 베이스라인 데이터 적재
-        insert_or_update_baseline_data(conn, baseline_df)
+        insert_or_update_baseline_data(storage, baseline_df)
     else:
-        print("⚠️ 베이스라인을 계산할 데이터가 없습니다.")
+        logger.warning("⚠️ 베이스라인을 계산할 데이터가 없습니다.")
+        return
     
-    close_db_connection(conn)
+    storage.close()
 
 if __name__ == '__main__':
-    main()
+    with track_stage():
+        main()
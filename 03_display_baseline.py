@@ -1,95 +1,272 @@
+import argparse
+import os
+import time
 import pandas as pd
 import psycopg2
 from datetime import datetime
+from psycopg2 import sql
 from db_config import db_connection_params
 from db_utils import connect_to_db, close_db_connection
+from metrics import track_stage
+from log_config import logger
 
-def load_data_from_db(conn, table_name):
-    """DB에서 지정된 테이블의 데이터를 불러와 DataFrame으로 반환하는 함수."""
-    if not conn: return pd.DataFrame()
-    print(f"⏳ '{table_name}' 테이블에서 데이터를 로드합니다...")
+# 한 화면(페이지)에 출력하는 차량 수
+DEFAULT_PAGE_SIZE = 50
+
+# 엑셀 파일 기본 저장 폴더
+DEFAULT_OUTPUT_DIR = 'reports'
+
+# 조회 필터 (명령행 옵션 이름 -> 조건 컬럼)
+# plate_prefix는 LIKE '접두어%' 조건으로, 나머지는 일치(=) 조건으로 SQL에 전달됩니다.
+FILTER_COLUMNS = {
+    'company': ('vm', 'company_name'),
+    'fuel': ('vm', 'original_fuel_type'),
+    'business_type': ('vm', 'business_type'),
+    'plate_prefix': ('bp', 'vehicle_plate_no')
+}
+
+# 필터/페이지 조회에 쓰는 인덱스(업체별 (company_name, vehicle_plate_no), 차량번호 접두어 varchar_pattern_ops)는
+# db_migrations.py의 SUPPORTING_INDEXES가 CONCURRENTLY로 생성합니다. (조회 화면은 DDL을 실행하지 않음)
+
+DISPLAY_COLUMNS = {
+    'vehicle_plate_no': '차량번호',
+    'company_name': '업체명',
+    'business_type': '사업구분',
+    'original_fuel_type': '기존 연료',
+    'baseline_start_ym': '베이스라인_시작월',
+    'baseline_end_ym': '베이스라인_종료월',
+    'months_of_operation': '산정월수',
+    'avg_annual_distance_km': '연평균주행거리(km)',
+    'avg_annual_fuel_l': '연평균주유량(L)',
+    'fuel_per_km': '연비(L/km)'
+}
+
+def build_filter_clause(filters):
+    """
+    필터 딕셔너리를 SQL WHERE 조건과 파라미터로 변환하는 함수.
+    :param filters: {'company', 'fuel', 'business_type', 'plate_prefix'} 중 값이 있는 항목
+    :return: (조건 SQL 목록, 파라미터 딕셔너리)
+    """
+    conditions, params = [], {}
+    for name, (alias, column) in FILTER_COLUMNS.items():
+        value = filters.get(name)
+        if not value:
+            continue
+        target = sql.SQL("{}.{}").format(sql.Identifier(alias), sql.Identifier(column))
+        if name == 'plate_prefix':
+            # LIKE 특수문자는 이스케이프하여 접두어 그대로 비교
+            escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append(sql.SQL("{} LIKE {}").format(target, sql.Placeholder(name)))
+            params[name] = escaped + '%'
+        else:
+            conditions.append(sql.SQL("{} = {}").format(target, sql.Placeholder(name)))
+            params[name] = value
+    return conditions, params
+
+def fetch_baseline_page(conn, filters, after=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    필터 조건에 맞는 베이스라인 인자를 차량번호 순으로 한 페이지만 조회하는 함수 (키셋 페이지네이션).
+    - OFFSET 대신 '마지막으로 본 차량번호보다 큰 행'부터 읽으므로, 뒤쪽 페이지도 앞쪽과 같은 속도로 조회됩니다.
+    :param after: 직전 페이지의 마지막 차량번호 (None이면 첫 페이지)
+    :return: 한 페이지 분량의 DataFrame (컬럼명은 영문)
+    """
+    conditions, params = build_filter_clause(filters)
+    if after is not None:
+        conditions.append(sql.SQL("bp.vehicle_plate_no > {}").format(sql.Placeholder('after')))
+        params['after'] = after
+    params['page_size'] = page_size
+
+    query = sql.SQL("""
+        SELECT
+            bp.vehicle_plate_no,
+            vm.company_name,
+            vm.business_type,
+            vm.original_fuel_type,
+            bp.baseline_start_ym,
+            bp.baseline_end_ym,
+            bp.months_of_operation,
+            bp.avg_annual_distance_km,
+            bp.avg_annual_fuel_l,
+            bp.fuel_per_km
+        FROM
+            bus_baseline_parameters bp
+        JOIN
+            bus_vehicle_master vm ON bp.vehicle_plate_no = vm.vehicle_plate_no
+        {where}
+        ORDER BY
+            bp.vehicle_plate_no
+        LIMIT {page_size};
+    """).format(
+        where=sql.SQL("WHERE ") + sql.SQL(" AND ").join(conditions) if conditions else sql.SQL(""),
+        page_size=sql.Placeholder('page_size')
+    )
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        columns = [desc[0] for desc in cur.description]
+        return pd.DataFrame(cur.fetchall(), columns=columns)
+
+def iter_baseline_pages(conn, filters, page_size=DEFAULT_PAGE_SIZE, after=None):
+    """키셋 페이지네이션으로 필터 결과를 페이지 단위로 반환하는 제너레이터. (페이지 DataFrame, 조회 소요 시간) 반환"""
+    while True:
+        started = time.perf_counter()
+        page_df = fetch_baseline_page(conn, filters, after=after, page_size=page_size)
+        elapsed = time.perf_counter() - started
+        if page_df.empty:
+            return
+        yield page_df, elapsed
+        if len(page_df) < page_size:
+            return
+        after = page_df['vehicle_plate_no'].iloc[-1]
+
+def describe_filters(filters):
+    """출력용 필터 설명 문자열을 만드는 함수."""
+    described = [f"{name}={value}" for name, value in filters.items() if value]
+    return ', '.join(described) if described else '전체'
+
+def print_page(page_df, page_no, elapsed):
+    """한 페이지 분량의 베이스라인 인자를 한글 컬럼명으로 출력하는 함수."""
+    # 소수점 2자리까지만 표시
+    pd.options.display.float_format = '{:,.2f}'.format
+
+    print("\n" + "="*100)
+    print(" " * 33 + f"[ 최종 베이스라인 인자 - {page_no}페이지 ]")
+    print("="*100)
+    print(page_df.rename(columns=DISPLAY_COLUMNS).to_string(index=False))
+    print("="*100)
+    print(f"⏱️  {page_no}페이지 {len(page_df)}건 조회 소요 시간: {elapsed * 1000:.1f}ms")
+
+def display_baseline_data(db_params, filters=None, page_size=DEFAULT_PAGE_SIZE, output_dir=DEFAULT_OUTPUT_DIR, save_excel=True):
+    """
+    필터 조건에 맞는 베이스라인 인자를 페이지 단위로 모두 출력하고, 선택 시 엑셀 파일로 저장하는 함수.
+    - 필터는 SQL로 전달되므로 조회 비용은 전체 차량 수가 아니라 조건에 맞는 차량 수에 비례합니다.
+    """
+    if not db_params: return
+    filters = filters or {}
+
+    conn = connect_to_db(db_params)
+    if not conn: return
+
+    logger.info(f"⏳ 베이스라인 인자를 조회합니다... (조건: {describe_filters(filters)}, 페이지 크기: {page_size})")
     try:
-        query = f"SELECT * FROM {table_name};"
-        df = pd.read_sql_query(query, conn)
-        print(f"✅ {len(df)}개의 '{table_name}' 데이터를 성공적으로 로드했습니다.")
-        return df
+        pages = []
+        for page_no, (page_df, elapsed) in enumerate(iter_baseline_pages(conn, filters, page_size), start=1):
+            print_page(page_df, page_no, elapsed)
+            pages.append(page_df)
+
+        if not pages:
+            logger.warning("⚠️ 조회된 데이터가 없습니다. 조건을 확인하거나 01, 02번 스크립트를 먼저 실행했는지 확인해주세요.")
+            return
+
+        result_df = pd.concat(pages, ignore_index=True)
+        logger.info(f"✅ 총 {len(result_df)}대의 베이스라인 인자를 조회했습니다.")
+
+        if save_excel:
+            save_df_to_excel(result_df.rename(columns=DISPLAY_COLUMNS), "baseline_calculation_results", output_dir)
+
     except Exception as e:
-        print(f"❌ '{table_name}' 데이터 로드 중 오류 발생: {e}")
-        return pd.DataFrame()
+        logger.error(f"❌ 데이터 조회 중 오류 발생: {e}")
+    finally:
+        close_db_connection(conn)
 
-def display_baseline_data(conn):
-    """DB에서 베이스라인 인자 데이터를 불러와 출력하는 함수."""
+def browse_interactive(db_params, filters=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    대화형으로 필터를 입력받아 베이스라인 인자를 한 페이지씩 넘겨보는 함수.
+    - Enter: 다음 페이지 / f: 조건 다시 입력 / q: 종료
+    """
+    if not db_params: return
+    conn = connect_to_db(db_params)
     if not conn: return
-    
-    print("\n⏳ 베이스라인 인자 및 차량 마스터 데이터를 조회합니다...")
+
+    prompts = {
+        'company': '업체명',
+        'fuel': '기존 연료',
+        'business_type': '사업구분',
+        'plate_prefix': '차량번호 접두어'
+    }
     try:
-        baseline_df = load_data_from_db(conn, 'bus_baseline_parameters')
-        vehicle_master_df = load_data_from_db(conn, 'bus_vehicle_master')
+        filters = dict(filters or {})
+        if not any(filters.values()):
+            print("\nℹ️ 조회 조건을 입력하세요. (비워두면 조건 없이 조회)")
+            filters = {name: input(f"   {label}: ").strip() or None for name, label in prompts.items()}
 
-        if baseline_df.empty or vehicle_master_df.empty:
-            print("⚠️ 조회된 데이터가 없습니다. 01, 02번 스크립트를 먼저 실행했는지 확인해주세요.")
-            return
+        while True:
+            print(f"\n⏳ 조회 조건: {describe_filters(filters)}")
+            pages = iter_baseline_pages(conn, filters, page_size)
+            command = ''
+            shown = False
+            for page_no, (page_df, elapsed) in enumerate(pages, start=1):
+                shown = True
+                print_page(page_df, page_no, elapsed)
+                command = input("Enter: 다음 페이지 / f: 조건 변경 / q: 종료 > ").strip().lower()
+                if command in ('f', 'q'):
+                    break
+            if not shown:
+                print("⚠️ 조건에 맞는 데이터가 없습니다.")
+            elif command not in ('f', 'q'):
+                print("ℹ️ 마지막 페이지입니다.")
 
-        # 베이스라인 데이터와 차량 마스터 정보를 조인
-        merged_df = pd.merge(baseline_df, vehicle_master_df, on='vehicle_plate_no', how='inner')
-        
-        # 보기 좋게 출력하기 위해 컬럼명 변경 및 포맷팅
-        merged_df.rename(columns={
-            'vehicle_plate_no': '차량번호',
-            'company_name': '업체명',
-            'sequence_no': '순번',
-            'business_type': '사업구분',
-            'model_year': '연식',
-            'ev_registration_date': '전기차량 등록일',
-            'original_fuel_type': '기존 연료',
-            'baseline_start_ym': '베이스라인_시작월',
-            'baseline_end_ym': '베이스라인_종료월',
-            'months_of_operation': '산정월수',
-            'avg_annual_distance_km': '연평균주행거리(km)',
-            'avg_annual_fuel_l': '연평균주유량(L)',
-            'fuel_per_km': '연비(L/km)'
-        }, inplace=True)
-        
-        # 소수점 2자리까지만 표시
-        pd.options.display.float_format = '{:,.2f}'.format
-        
-        print("\n" + "="*100)
-        print(" " * 38 + "[ 최종 베이스라인 인자 ]")
-        print("="*100)
-        print(merged_df[['차량번호', '업체명', '사업구분', '기존 연료', '베이스라인_시작월', '베이스라인_종료월', '산정월수', '연평균주행거리(km)', '연평균주유량(L)', '연비(L/km)']])
-        print("="*100)
-        
-        # 엑셀 파일로 저장
-        save_df_to_excel(merged_df[['차량번호', '업체명', '사업구분', '기존 연료', '베이스라인_시작월', '베이스라인_종료월', '산정월수', '연평균주행거리(km)', '연평균주유량(L)', '연비(L/km)']], "baseline_calculation_results")
+            if command == 'q':
+                break
+            if command != 'f':
+                command = input("f: 조건 변경 / q: 종료 > ").strip().lower()
+                if command != 'f':
+                    break
+            filters = {name: input(f"   {label}: ").strip() or None for name, label in prompts.items()}
 
+    except (KeyboardInterrupt, EOFError):
+        print("\nℹ️ 조회를 종료합니다.")
     except Exception as e:
-        print(f"❌ 데이터 조회 중 오류 발생: {e}")
+        logger.error(f"❌ 데이터 조회 중 오류 발생: {e}")
+    finally:
+        close_db_connection(conn)
 
-def save_df_to_excel(df, filename_prefix):
-    """DataFrame을 엑셀 파일로 저장하는 함수"""
+def save_df_to_excel(df, filename_prefix, output_dir=DEFAULT_OUTPUT_DIR):
+    """DataFrame을 output_dir 폴더에 엑셀 파일로 저장하는 함수"""
     if df.empty:
-        print(f"⚠️ {filename_prefix} 저장: 데이터프레임이 비어 있어 엑셀 파일을 생성하지 않습니다.")
+        logger.warning(f"⚠️ {filename_prefix} 저장: 데이터프레임이 비어 있어 엑셀 파일을 생성하지 않습니다.")
         return
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = rf"C:\Users\USER\OneDrive - 주식회사후시파트너스\문서\Develope\GHGERC_BUS\reports\{filename_prefix}_{timestamp}.xlsx"
-    
+    file_path = os.path.join(output_dir, f"{filename_prefix}_{timestamp}.xlsx")
+
     try:
+        os.makedirs(output_dir, exist_ok=True)
         df.to_excel(file_path, index=False, sheet_name="베이스라인 계산결과")
-        print(f"✅ 엑셀 파일 저장 성공: {file_path}")
+        logger.info(f"✅ 엑셀 파일 저장 성공: {file_path}")
     except Exception as e:
-        print(f"❌ 엑셀 파일 저장 중 오류 발생: {e}")
+        logger.error(f"❌ 엑셀 파일 저장 중 오류 발생: {e}")
 
 def main():
     """메인 실행 함수"""
-    print("\n--- [파일 3] 베이스라인 인자 조회 및 출력 시작 ---")
-    
+    parser = argparse.ArgumentParser(description="베이스라인 인자 조회 및 출력")
+    parser.add_argument('--company', help="업체명 (일치 조건)")
+    parser.add_argument('--fuel', help="기존 연료 (예: 경유, CNG)")
+    parser.add_argument('--business-type', help="사업구분 (일치 조건)")
+    parser.add_argument('--plate-prefix', help="차량번호 접두어 (예: 서울70)")
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"한 페이지에 출력할 차량 수 (기본값: {DEFAULT_PAGE_SIZE})")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR,
+                        help=f"엑셀 파일 저장 폴더 (기본값: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('--no-excel', action='store_true', help="엑셀 파일을 저장하지 않습니다.")
+    parser.add_argument('-i', '--interactive', action='store_true',
+                        help="조건을 입력받아 한 페이지씩 넘겨보는 대화형 모드로 실행합니다.")
+    args = parser.parse_args()
+
+    logger.info("--- [파일 3] 베이스라인 인자 조회 및 출력 시작 ---")
+
     db_params = db_connection_params  # db_config.py에서 가져온 DB 연결 정보
-    conn = connect_to_db(db_params)
-    
-    if conn:
-        display_baseline_data(conn)
-        close_db_connection(conn)
+    filters = {
+        'company': args.company,
+        'fuel': args.fuel,
+        'business_type': args.business_type,
+        'plate_prefix': args.plate_prefix
+    }
+    if args.interactive:
+        browse_interactive(db_params, filters, page_size=args.page_size)
+    else:
+        display_baseline_data(db_params, filters, page_size=args.page_size,
+                              output_dir=args.output_dir, save_excel=not args.no_excel)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    with track_stage():
+        main()
@@ -1,88 +1,60 @@
+import argparse
 import pandas as pd
 import numpy as np
-import psycopg2
-from psycopg2 import sql
-from psycopg2.extras import execute_values
-from db_config import db_connection_params
 from datetime import datetime
-from db_utils import connect_to_db, close_db_connection
-
-
-def execute_query(conn, query, message="쿼리 실행"):
-    """주어진 쿼리를 실행하는 함수."""
-    if not conn: return
-    with conn.cursor() as cur:
-        try:
-            cur.execute(query)
-            conn.commit()
-            print(f"✅ {message} 성공적으로 실행되었습니다.")
-        except psycopg2.Error as e:
-            print(f"❌ {message} 오류: {e}")
-            conn.rollback()
-
-def load_data_from_db(conn, table_name):
-    """DB에서 지정된 테이블의 데이터를 불러와 DataFrame으로 반환하는 함수."""
-    if not conn: return pd.DataFrame()
-    print(f"⏳ 	'{table_name}' 테이블에서 데이터를 로드합니다...")
-    try:
-        query = f"SELECT * FROM {table_name};"
-        df = pd.read_sql_query(query, conn)
-        print(f"✅ {len(df)}개의 	'{table_name}' 데이터를 성공적으로 로드했습니다.")
-        return df
-    except Exception as e:
-        print(f"❌ 	'{table_name}' 데이터 로드 중 오류 발생: {e}")
-        return pd.DataFrame()
-
-def insert_or_update_emission_reductions(conn, df):
+from storage import add_storage_arguments, open_storage_from_args
+from metrics import track_stage, track_step
+from log_config import logger
+
+
+def load_ev_annual_emissions(storage, emission_year):
+    """
+    08번 스크립트가 산정한 전기버스 연간 간접배출량(kg)을 불러오는 함수.
+    - 진행 중인 연도(또는 연중 등록 차량)는 충전 기록이 있는 달만 합산되어 있으므로,
+      12개월 기준 베이스라인과 비교할 수 있도록 기록된 개월 수(months_reported)로 연환산합니다.
+    :return: vehicle_plate_no, ev_co2_emission_kg(연환산) 컬럼의 DataFrame
     """
-    계산된 감축량 데이터를 DB에 저장하거나 업데이트하는 함수.
-    :param conn: psycopg2 connection 객체
+    columns = ['vehicle_plate_no', 'ev_co2_emission_kg']
+    if not storage.has_table('bus_ev_annual_emissions'):
+        logger.warning("⚠️ 전기버스 간접배출량을 불러오지 못해 0으로 처리합니다. (08번 스크립트 실행 여부 확인): 'bus_ev_annual_emissions' 테이블 없음")
+        return pd.DataFrame(columns=columns).astype({'ev_co2_emission_kg': float})
+    # 결과가 없을 때도 배출량 컬럼이 숫자형이 되도록 변환 (빈 결과는 object 타입으로 읽힘)
+    ev_emission_df = storage.load_table('bus_ev_annual_emissions', columns=columns + ['months_reported'],
+                                        filters=[('emission_year', '=', emission_year)])
+    ev_emission_df = ev_emission_df.reindex(columns=columns + ['months_reported']).astype(
+        {'ev_co2_emission_kg': float, 'months_reported': float})
+    months = ev_emission_df['months_reported'].where(ev_emission_df['months_reported'] > 0)
+    ev_emission_df['ev_co2_emission_kg'] = (ev_emission_df['ev_co2_emission_kg'] * 12 / months).fillna(0.0)
+    return ev_emission_df[columns]
+
+def insert_or_update_emission_reductions(storage, df):
+    """
+    계산된 감축량 데이터를 저장하거나 업데이트하는 함수 (PostgreSQL은 bulk_upsert 사용).
+    :param storage: storage.open_storage로 연 저장소
     :param df: 저장할 감축량 데이터프레임
     """
-    if not conn or df.empty: return
-    
-    # bus_emission_reductions 테이블의 컬럼명에 맞게 DataFrame 컬럼명 변경 (이미 영문으로 가정)
-    cols = df.columns.tolist()
-    values = [tuple(row) for row in df.to_numpy()]
-    
-    # ON CONFLICT ... DO UPDATE 쿼리 작성
-    update_cols = [col for col in cols if col != 'vehicle_plate_no']
-    update_statement = ", ".join([f"{col}=EXCLUDED.{col}" for col in update_cols])
-    
-    insert_query = sql.SQL("""
-        INSERT INTO bus_emission_reductions ({}) 
-        VALUES %s
-        ON CONFLICT (vehicle_plate_no) DO UPDATE SET {}
-    """).format(
-        sql.SQL(', ').join(map(sql.Identifier, cols)),
-        sql.SQL(update_statement)
-    )
-    
-    with conn.cursor() as cur:
-        try:
-            print("⏳ 'bus_emission_reductions' 테이블에 데이터를 저장/업데이트합니다...")
-            execute_values(cur, insert_query, values)
-            conn.commit()
-            print(f"✅ {cur.rowcount}개의 감축량 레코드가 성공적으로 저장/업데이트되었습니다.")
-        except psycopg2.Error as e:
-            print(f"❌ 감축량 데이터 저장 오류: {e}")
-            conn.rollback()
+    if not storage or df.empty: return
+    return storage.upsert('bus_emission_reductions', df, key_cols=['vehicle_plate_no'], label='감축량')
 
 def main():
     """메인 실행 함수."""
-    print("\n--- [파일 4] 사업 목표 감축량 계산 시작 ---")
+    parser = argparse.ArgumentParser(description="사업 목표 감축량 계산")
+    add_storage_arguments(parser)
+    args = parser.parse_args()
+
+    logger.info("--- [파일 4] 사업 목표 감축량 계산 시작 ---")
     
-    db_params = db_connection_params  # db_config.py에서 가져온 DB 연결 정보
-    conn = connect_to_db(db_params)
+    # 저장소: 기본은 PostgreSQL(db_config.py), --storage duckdb/sqlite로 DB 서버 없이 스냅샷에서 계산
+    storage = open_storage_from_args(args)
     
-    if conn:
+    if storage:
         # 1. 베이스라인 데이터 및 차량 마스터 데이터 로드
-        baseline_df = load_data_from_db(conn, 'bus_baseline_parameters')
-        vehicle_master_df = load_data_from_db(conn, 'bus_vehicle_master')
+        baseline_df = storage.load_table('bus_baseline_parameters')
+        vehicle_master_df = storage.load_table('bus_vehicle_master')
         
         if baseline_df.empty or vehicle_master_df.empty:
-            print("⚠️ 필요한 데이터(베이스라인 또는 차량 마스터)가 없습니다. 01, 02번 스크립트를 먼저 실행해주세요.")
-            conn.close()
+            logger.warning("⚠️ 필요한 데이터(베이스라인 또는 차량 마스터)가 없습니다. 01, 02번 스크립트를 먼저 실행해주세요.")
+            storage.close()
             return
 
         # 베이스라인 데이터와 차량 마스터 정보를 조인
@@ -95,7 +67,8 @@ def main():
         }
 
         # 2. 감축량 계산 (벡터화 방식 적용)
-        print("\n⏳ CO2 감축량을 계산합니다...")
+        logger.info("⏳ CO2 감축량을 계산합니다...")
+        compute_step = track_step('compute', 'reduction', rows_in=len(merged_df))
         
         # 배출 계수 매핑
         merged_df['baseline_emission_factor'] = merged_df['original_fuel_type'].map(emission_factors)
@@ -106,10 +79,15 @@ def main():
         valid_factor_mask = merged_df['baseline_emission_factor'].notna()
 
         # 계산용 컬럼 초기화
-        merged_df['calculated_year'] = datetime.now().year
+        calculated_year = datetime.now().year
+        merged_df['calculated_year'] = calculated_year
         merged_df['baseline_annual_fuel_l'] = 0.0
         merged_df['baseline_co2_emission_kg'] = 0.0
-        merged_df['ev_actual_co2_emission_kg'] = 0.0  # 전기차는 직접 배출 0
+
+        # 전기차는 직접 배출이 0이므로, 충전 전력량 기반 간접배출량(기록된 개월 수로 연환산)을 실제 배출량으로 사용
+        ev_emission_df = load_ev_annual_emissions(storage, calculated_year)
+        merged_df = merged_df.merge(ev_emission_df, on='vehicle_plate_no', how='left')
+        merged_df['ev_actual_co2_emission_kg'] = merged_df['ev_co2_emission_kg'].fillna(0.0)
         merged_df['co2_reduction_kg'] = 0.0
         merged_df['reduction_category'] = ''
 
@@ -119,20 +97,20 @@ def main():
         if calc_mask.any():
             merged_df.loc[calc_mask, 'baseline_annual_fuel_l'] = merged_df.loc[calc_mask, 'avg_annual_fuel_l']
             merged_df.loc[calc_mask, 'baseline_co2_emission_kg'] = merged_df.loc[calc_mask, 'baseline_annual_fuel_l'] * merged_df.loc[calc_mask, 'baseline_emission_factor']
-            merged_df.loc[calc_mask, 'co2_reduction_kg'] = merged_df.loc[calc_mask, 'baseline_co2_emission_kg']
+            merged_df.loc[calc_mask, 'co2_reduction_kg'] = merged_df.loc[calc_mask, 'baseline_co2_emission_kg'] - merged_df.loc[calc_mask, 'ev_actual_co2_emission_kg']
             merged_df.loc[calc_mask, 'reduction_category'] = '대체버스 감축'
-            print(f"✅ {calc_mask.sum()}개의 대체 버스 감축량을 계산했습니다.")
+            logger.info(f"✅ {calc_mask.sum()}개의 대체 버스 감축량을 계산했습니다.")
         
         # 배출 계수가 정의되지 않은 대체 버스
         no_factor_mask = replacement_buses_mask & ~valid_factor_mask
         if no_factor_mask.any():
             merged_df.loc[no_factor_mask, 'reduction_category'] = '대체버스 (계수 미정의)'
-            print(f"⚠️ {no_factor_mask.sum()}개의 대체 버스는 배출 계수가 정의되지 않아 감축량을 계산할 수 없습니다.")
+            logger.warning(f"⚠️ {no_factor_mask.sum()}개의 대체 버스는 배출 계수가 정의되지 않아 감축량을 계산할 수 없습니다.")
 
         # 4. 신규 버스 처리 (벡터화)
         if new_buses_mask.any():
             merged_df.loc[new_buses_mask, 'reduction_category'] = '신규버스 (감축 미산정)'
-            print(f"✅ {new_buses_mask.sum()}개의 신규 버스를 '미산정'으로 처리했습니다.")
+            logger.info(f"✅ {new_buses_mask.sum()}개의 신규 버스를 '미산정'으로 처리했습니다.")
 
         # 계산 후 NaN 값들을 0 또는 빈 문자열로 채움
         merged_df['baseline_emission_factor'] = merged_df['baseline_emission_factor'].fillna(0)
@@ -144,14 +122,15 @@ def main():
             'baseline_emission_factor', 'baseline_co2_emission_kg', 'ev_actual_co2_emission_kg',
             'co2_reduction_kg', 'reduction_category'
         ]].copy()
+        compute_step.finish(rows_out=len(final_reduction_df))
 
-        print("\n[계산된 감축량 데이터 (상위 5개 행)]")
-        print(final_reduction_df.head(10))
+        logger.info(f"[계산된 감축량 데이터 (상위 5개 행)]\n{final_reduction_df.head(10).to_string()}")
 
         # 5. 감축량 결과 데이터 적재
-        insert_or_update_emission_reductions(conn, final_reduction_df)
+        insert_or_update_emission_reductions(storage, final_reduction_df)
         
-        close_db_connection(conn)
+        storage.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    with track_stage():
+        main()
@@ -1,31 +1,54 @@
 import pandas as pd
 import numpy as np
-import psycopg2
-from psycopg2 import sql
-from psycopg2.extras import execute_values
 from datetime import datetime
 from db_config import db_connection_params
 from db_utils import connect_to_db, close_db_connection
+from metrics import track_stage, track_step
+from db_writer import bulk_upsert
 from constants import NET_CALORIFIC_VALUE, CO2_EMISSION_FACTOR, CNG_DENSITY_KG_PER_M3
+from log_config import logger
 
-def load_data_for_reduction_calc(conn):
-    """감축량 계산에 필요한 베이스라인 및 차량 마스터 데이터를 DB에서 로드하는 함수."""
+def load_data_for_reduction_calc(conn, calculated_year):
+    """
+    감축량 계산에 필요한 베이스라인 및 차량 마스터 데이터를 DB에서 로드하는 함수.
+    - 대체 차량의 베이스라인은 계보 테이블(bus_vehicle_lineage)에서 베이스라인이 있는 가장 먼 조상(최초 내연기관 차량)의 값을 사용합니다.
+      (내연기관 -> 전기버스 -> 새 전기버스처럼 여러 번 대체된 경우도 최초 내연기관 차량의 베이스라인으로 계산)
+    :param calculated_year: 전기버스 실제(간접) 배출량을 가져올 산정 연도 (기록된 개월 수로 연환산하여 베이스라인과 비교)
+    """
     if not conn: return pd.DataFrame()
-    print("⏳ 감축량 계산을 위해 'bus_baseline_parameters'와 'bus_vehicle_master' 테이블에서 데이터를 로드합니다...")
+    logger.info("⏳ 감축량 계산을 위해 'bus_baseline_parameters', 'bus_vehicle_master', 'bus_vehicle_lineage' 테이블에서 데이터를 로드합니다...")
+    step = track_step('load', 'reduction_targets')
     try:
         query = """
         SELECT
             vm.vehicle_plate_no,
             vm.business_type,
             vm.ev_registration_date,
-            vm.original_fuel_type,
+            COALESCE(bp.original_fuel_type, vm.original_fuel_type) AS original_fuel_type, -- 최초 내연기관 차량의 연료
             bp.avg_annual_fuel_l, -- 베이스라인 연간 연료 소비량
             
-            bmfd.distance_km AS ev_latest_month_distance_km -- 전기차의 최신 월별 주행 거리
+            bmfd.distance_km AS ev_latest_month_distance_km, -- 전기차의 최신 월별 주행 거리
+            -- 충전량 기반 연간 간접배출량. 진행 중인 연도는 기록된 달만 합산되어 있으므로 12개월 기준으로 연환산
+            COALESCE(ea.ev_co2_emission_kg * 12.0 / NULLIF(ea.months_reported, 0), 0) AS ev_actual_co2_emission_kg
         FROM
             bus_vehicle_master vm
-        JOIN
-            bus_baseline_parameters bp ON vm.original_ice_plate_no = bp.vehicle_plate_no -- 대체된 내연기관 차량의 베이스라인 조인
+        JOIN LATERAL (
+            SELECT
+                bp_sub.avg_annual_fuel_l,
+                root_vm.original_fuel_type
+            FROM
+                bus_vehicle_lineage vl -- (descendant_plate_no, depth) 인덱스로 조상 목록을 바로 조회
+            JOIN
+                bus_baseline_parameters bp_sub ON bp_sub.vehicle_plate_no = vl.ancestor_plate_no
+            JOIN
+                bus_vehicle_master root_vm ON root_vm.vehicle_plate_no = vl.ancestor_plate_no
+            WHERE
+                vl.descendant_plate_no = vm.vehicle_plate_no
+                AND vl.depth > 0
+            ORDER BY
+                vl.depth DESC
+            LIMIT 1
+        ) AS bp ON TRUE -- 대체된 최초 내연기관 차량의 베이스라인 조인
         LEFT JOIN LATERAL (
             SELECT
                 bmfd_sub.distance_km,
@@ -38,66 +61,52 @@ def load_data_for_reduction_calc(conn):
                 bmfd_sub.record_year_month DESC
             LIMIT 1
         ) AS bmfd ON vm.vehicle_plate_no IS NOT NULL -- 전기차량에 대해서만 조인 시도
+        LEFT JOIN
+            bus_ev_annual_emissions ea ON ea.vehicle_plate_no = vm.vehicle_plate_no
+            AND ea.emission_year = %(calculated_year)s
         WHERE
             vm.ev_registration_date IS NOT NULL
             AND vm.business_type = '대체도입';
         """
-        df = pd.read_sql_query(query, conn)
+        df = pd.read_sql_query(query, conn, params={'calculated_year': calculated_year})
+        step.finish(rows_out=len(df))
         if df.empty:
-            print("⚠️ 상세 감축량 계산 대상(CNG, 경유 대체도입 전기버스)이 없습니다.")
+            logger.warning("⚠️ 상세 감축량 계산 대상(CNG, 경유 대체도입 전기버스)이 없습니다.")
             return pd.DataFrame()
         
-        print(f"✅ {len(df)}개의 계산 대상 차량 데이터를 성공적으로 로드했습니다.")
+        logger.info(f"✅ {len(df)}개의 계산 대상 차량 데이터를 성공적으로 로드했습니다.")
         return df
     except Exception as e:
-        print(f"❌ 데이터 로드 중 오류 발생: {e}")
+        step.finish(status='error')
+        logger.error(f"❌ 데이터 로드 중 오류 발생: {e}")
         return pd.DataFrame()
 
 def insert_or_update_emission_reductions(conn, df):
-    """계산된 감축량 데이터를 DB에 저장하거나 업데이트하는 함수."""
+    """
+    계산된 감축량 데이터를 DB에 저장하거나 업데이트하는 함수 (bulk_upsert 사용).
+    :param conn: psycopg2 connection 객체
+    :param df: 저장할 감축량 데이터프레임
+    """
     if not conn or df.empty: return
-    
-    cols = df.columns.tolist()
-    values = [tuple(row) for row in df.to_numpy()]
-    
-    update_cols = [col for col in cols if col != 'vehicle_plate_no']
-    update_statement = ", ".join([f"{col}=EXCLUDED.{col}" for col in update_cols])
-    
-    insert_query = sql.SQL("""
-        INSERT INTO bus_emission_reductions ({}) 
-        VALUES %s
-        ON CONFLICT (vehicle_plate_no) DO UPDATE SET {}
-    """).format(
-        sql.SQL(', ').join(map(sql.Identifier, cols)),
-        sql.SQL(update_statement)
-    )
-    
-    with conn.cursor() as cur:
-        try:
-            print("⏳ 'bus_emission_reductions' 테이블에 상세 계산된 감축량 데이터를 저장/업데이트합니다...")
-            execute_values(cur, insert_query, values)
-            conn.commit()
-            print(f"✅ {cur.rowcount}개의 감축량 레코드가 성공적으로 저장/업데이트되었습니다.")
-        except psycopg2.Error as e:
-            print(f"❌ 감축량 데이터 저장 오류: {e}")
-            conn.rollback()
+    return bulk_upsert(conn, 'bus_emission_reductions', df, key_cols=['vehicle_plate_no'], label='상세 감축량')
 
 def main():
     """메인 실행 함수."""
-    print("\n--- [파일 5] 상세 CO2 감축량 계산 시작 (엑셀 로직 기반) ---")
+    logger.info("--- [파일 5] 상세 CO2 감축량 계산 시작 (엑셀 로직 기반) ---")
     
     db_params = db_connection_params
     conn = connect_to_db(db_params)
     
     if conn:
         # 1. 계산 대상 데이터 로드
-        calc_df = load_data_for_reduction_calc(conn)
+        current_year = datetime.now().year
+        calc_df = load_data_for_reduction_calc(conn, current_year)
         
         if not calc_df.empty:
-            print("\n⏳ CO2 감축량을 상세 로직에 따라 계산합니다...")
+            logger.info("⏳ CO2 감축량을 상세 로직에 따라 계산합니다...")
+            compute_step = track_step('compute', 'reduction', rows_in=len(calc_df))
             
             # 2. 이용연수 계산
-            current_year = datetime.now().year
             calc_df['ev_registration_date'] = pd.to_datetime(calc_df['ev_registration_date'])
             calc_df['start_year'] = calc_df['ev_registration_date'].dt.year
             calc_df['usage_year'] = current_year - calc_df['start_year'] + 1
@@ -120,7 +129,7 @@ def main():
             if cng_mask.any():
                 # 활동량 계산: DB의 'avg_annual_fuel_l' 컬럼이 CNG의 경우 질량(kg) 단위로 저장되었다고 가정.
                 # 질량(kg)을 밀도(kg/m³)로 나누어 부피(m³)로 변환 후, 다시 1000으로 나누어 '천m³' 단위로 변환.
-                print("\nℹ️  CNG 연료량은 DB의 'L' 단위 컬럼 값을 질량(kg)으로 간주하고, 밀도를 이용해 부피(m³)로 변환하여 계산합니다.")
+                logger.info("ℹ️  CNG 연료량은 DB의 'L' 단위 컬럼 값을 질량(kg)으로 간주하고, 밀도를 이용해 부피(m³)로 변환하여 계산합니다.")
                 activity_data_kg = calc_df.loc[cng_mask, 'avg_annual_fuel_l']
                 activity_data_m3 = activity_data_kg / CNG_DENSITY_KG_PER_M3
                 activity_data_1000m3 = activity_data_m3 / 1000
@@ -135,8 +144,9 @@ def main():
             calc_df['baseline_annual_fuel_l'] = calc_df['avg_annual_fuel_l']
             # 유효 배출계수(kg/L 또는 kg/m³) 계산하여 저장
             calc_df['baseline_emission_factor'] = (calc_df['baseline_co2_emission_kg'] / calc_df['baseline_annual_fuel_l']).fillna(0)
-            calc_df['ev_actual_co2_emission_kg'] = 0.0 # 전기차 직접배출량은 0
-            calc_df['co2_reduction_kg'] = calc_df['baseline_co2_emission_kg'] # 감축량 = 베이스라인 배출량
+            # 전기차 직접배출량은 0이며, 실제 배출량은 충전 전력량 기반 간접배출량(08번 스크립트)을 사용
+            # 감축량 = 베이스라인 배출량 - 전기차 실제 배출량
+            calc_df['co2_reduction_kg'] = calc_df['baseline_co2_emission_kg'] - calc_df['ev_actual_co2_emission_kg']
             calc_df['reduction_category'] = '대체버스 감축 (상세)'
 
             # DB 테이블 스키마에 맞게 컬럼 선택 및 정렬
@@ -145,9 +155,9 @@ def main():
                 'baseline_emission_factor', 'baseline_co2_emission_kg', 'ev_actual_co2_emission_kg',
                 'co2_reduction_kg', 'reduction_category'
             ]].copy()
+            compute_step.finish(rows_out=len(final_reduction_df))
 
-            print("\n[상세 계산된 감축량 데이터 (상위 5개 행)]")
-            print(final_reduction_df.head())
+            logger.info(f"[상세 계산된 감축량 데이터 (상위 5개 행)]\n{final_reduction_df.head().to_string()}")
 
             # 5. 감축량 결과 데이터 적재
             insert_or_update_emission_reductions(conn, final_reduction_df)
@@ -155,4 +165,5 @@ def main():
         close_db_connection(conn)
 
 if __name__ == '__main__':
-    main()
+    with track_stage():
+        main()
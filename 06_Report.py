@@ -1,74 +1,84 @@
+import argparse
+import hashlib
+import json
 import pandas as pd
 import os
 from datetime import datetime
 from db_config import db_connection_params
 from db_utils import connect_to_db, close_db_connection
+from metrics import track_stage, track_step
+from db_reader import fetch_frames_concurrently, iter_query_chunks, fetch_table_watermarks
+from report_writer import write_streaming_workbook, write_reports_in_parallel, assign_safe_filenames
+from db_partitions import year_month_bounds
+from log_config import logger
 
-def generate_excel_report(conn):
-    """
-    DB의 모든 관련 테이블을 조인하여 종합 보고서용 데이터를 생성하고 Excel 파일로 저장하는 함수.
-    - 시트 1: 종합 보고서 (마스터, 베이스라인, 감축량 정보 포함)
-    - 시트 2: 월별 운행기록 (베이스라인 계산의 원본 데이터)
-    - 시트 3: 베이스라인 계산결과 (차량별 베이스라인 요약)
+# 스트리밍 모드에서 월별 운행기록을 DB에서 한 번에 가져오는 행 수
+STREAMING_CHUNK_SIZE = 50000
+
+# 마지막으로 생성한 보고서와 그 시점의 DB 상태 지문을 기록하는 파일
+REPORT_CACHE_PATH = os.path.join('reports', '.report_cache.json')
+
+# 보고서 시트 구성이 바뀌면 올려서, DB 상태가 같아도 이전 구성의 캐시 보고서를 재사용하지 않도록 함
+REPORT_LAYOUT_VERSION = 3
+
+# 보고서 내용을 결정하는 테이블 (이 테이블들의 상태가 같으면 보고서 내용도 같음)
+REPORT_SOURCE_TABLES = [
+    'bus_vehicle_master',
+    'bus_baseline_parameters',
+    'bus_emission_reductions',
+    'bus_driving_records'
+]
+
+COMPREHENSIVE_QUERY = """
+    SELECT
+        vm.vehicle_plate_no,
+        vm.company_name,
+        vm.business_type,
+        vm.model_year,
+        vm.original_fuel_type,
+        vm.ev_registration_date,
+        bp.baseline_start_ym,
+        bp.baseline_end_ym,
+        bp.months_of_operation,
+        bp.avg_annual_distance_km,
+        bp.avg_annual_fuel_l,
+        bp.fuel_per_km,
+        er.calculated_year,
+        er.baseline_emission_factor,
+        er.baseline_co2_emission_kg,
+        er.co2_reduction_kg,
+        er.reduction_category
+    FROM
+        bus_vehicle_master vm
+    LEFT JOIN
+        bus_baseline_parameters bp ON vm.vehicle_plate_no = bp.vehicle_plate_no
+    LEFT JOIN
+        bus_emission_reductions er ON vm.vehicle_plate_no = er.vehicle_plate_no
+    ORDER BY
+        vm.company_name, vm.vehicle_plate_no;
     """
-    if not conn: return
 
-    try:
-        import openpyxl
-    except ImportError:
-        print("\n⚠️ 'openpyxl' 라이브러리가 필요합니다. 'pip install openpyxl' 명령으로 설치 후 다시 실행해주세요.")
-        return
+COMPREHENSIVE_RENAME_MAP = {
+    'vehicle_plate_no': '차량번호',
+    'company_name': '업체명',
+    'business_type': '사업구분',
+    'model_year': '연식',
+    'original_fuel_type': '기존연료',
+    'ev_registration_date': '전기차등록일',
+    'baseline_start_ym': '베이스라인_시작월',
+    'baseline_end_ym': '베이스라인_종료월',
+    'months_of_operation': '베이스라인_산정월수',
+    'avg_annual_distance_km': '베이스라인_연평균주행거리(km)',
+    'avg_annual_fuel_l': '베이스라인_연평균연료량(L)',
+    'fuel_per_km': '베이스라인_연비(L/km)',
+    'calculated_year': '감축량_계산연도',
+    'baseline_emission_factor': '감축량_적용배출계수(kg/L)',
+    'baseline_co2_emission_kg': '감축량_베이스라인CO2(kg)',
+    'co2_reduction_kg': '감축량_CO2감축량(kg)',
+    'reduction_category': '감축량_산정방식'
+}
 
-    comprehensive_query = """
-        SELECT
-            vm.vehicle_plate_no,
-            vm.company_name,
-            vm.business_type,
-            vm.model_year,
-            vm.original_fuel_type,
-            vm.ev_registration_date,
-            bp.baseline_start_ym,
-            bp.baseline_end_ym,
-            bp.months_of_operation,
-            bp.avg_annual_distance_km,
-            bp.avg_annual_fuel_l,
-            bp.fuel_per_km,
-            er.calculated_year,
-            er.baseline_emission_factor,
-            er.baseline_co2_emission_kg,
-            er.co2_reduction_kg,
-            er.reduction_category
-        FROM
-            bus_vehicle_master vm
-        LEFT JOIN
-            bus_baseline_parameters bp ON vm.vehicle_plate_no = bp.vehicle_plate_no
-        LEFT JOIN
-            bus_emission_reductions er ON vm.vehicle_plate_no = er.vehicle_plate_no
-        ORDER BY
-            vm.company_name, vm.vehicle_plate_no;
-        """
-    
-    comprehensive_rename_map = {
-            'vehicle_plate_no': '차량번호',
-            'company_name': '업체명',
-            'business_type': '사업구분',
-            'model_year': '연식',
-            'original_fuel_type': '기존연료',
-            'ev_registration_date': '전기차등록일',
-            'baseline_start_ym': '베이스라인_시작월',
-            'baseline_end_ym': '베이스라인_종료월',
-            'months_of_operation': '베이스라인_산정월수',
-            'avg_annual_distance_km': '베이스라인_연평균주행거리(km)',
-            'avg_annual_fuel_l': '베이스라인_연평균연료량(L)',
-            'fuel_per_km': '베이스라인_연비(L/km)',
-            'calculated_year': '감축량_계산연도',
-            'baseline_emission_factor': '감축량_적용배출계수(kg/L)',
-            'baseline_co2_emission_kg': '감축량_베이스라인CO2(kg)',
-            'co2_reduction_kg': '감축량_CO2감축량(kg)',
-            'reduction_category': '감축량_산정방식'
-        }
-
-    monthly_query = """
+MONTHLY_QUERY = """
     SELECT
         vm.company_name,
         dr.vehicle_plate_no,
@@ -80,19 +90,23 @@ def generate_excel_report(conn):
         bus_driving_records dr
     JOIN
         bus_vehicle_master vm ON dr.vehicle_plate_no = vm.vehicle_plate_no
+    WHERE
+        (%(from_ym)s IS NULL OR dr.year_month >= %(from_ym)s)
+        AND (%(to_ym)s IS NULL OR dr.year_month < %(to_ym)s)
     ORDER BY
         vm.company_name, dr.vehicle_plate_no, dr.year_month;
     """
-    monthly_rename_map = {
-        'company_name': '업체명',
-        'vehicle_plate_no': '차량번호',
-        'year_month': '운행년월',
-        'operating_days': '운행일수',
-        'driving_distance_km': '주행거리(km)',
-        'fuel_quantity_l': '연료사용량(L)'
-    }
 
-    baseline_query = """
+MONTHLY_RENAME_MAP = {
+    'company_name': '업체명',
+    'vehicle_plate_no': '차량번호',
+    'year_month': '운행년월',
+    'operating_days': '운행일수',
+    'driving_distance_km': '주행거리(km)',
+    'fuel_quantity_l': '연료사용량(L)'
+}
+
+BASELINE_QUERY = """
     SELECT
         vm.company_name,
         vm.business_type,
@@ -106,70 +120,483 @@ def generate_excel_report(conn):
     ORDER BY
         vm.company_name, bp.vehicle_plate_no;
     """
-    baseline_rename_map = {
-        'company_name': '업체명',
-        'business_type': '사업구분',
-        'model_year': '연식',
-        'original_fuel_type': '기존연료',
-        'vehicle_plate_no': '차량번호',
-        'baseline_start_ym': '베이스라인_시작월',
-        'baseline_end_ym': '베이스라인_종료월',
-        'months_of_operation': '산정월수',
-        'avg_annual_distance_km': '연평균주행거리(km)',
-        'avg_annual_fuel_l': '연평균연료량(L)',
-        'fuel_per_km': '연비(L/km)'
+
+# 업체별/연료별/사업구분별/계산연도별 합계와 전체 합계를 GROUPING SETS로 한 번의 스캔에서 계산
+# summary_level로 각 행이 어느 기준의 합계인지 구분합니다. (기준 컬럼 값 자체가 NULL인 경우와 구분하기 위해 GROUPING() 사용)
+SUMMARY_QUERY = """
+    SELECT
+        CASE
+            WHEN GROUPING(vm.company_name) = 0 THEN 'company'
+            WHEN GROUPING(vm.original_fuel_type) = 0 THEN 'fuel'
+            WHEN GROUPING(vm.business_type) = 0 THEN 'business_type'
+            WHEN GROUPING(er.calculated_year) = 0 THEN 'calculated_year'
+            ELSE 'total'
+        END AS summary_level,
+        vm.company_name,
+        vm.original_fuel_type,
+        vm.business_type,
+        er.calculated_year,
+        COUNT(*) AS vehicle_count,
+        COUNT(vm.ev_registration_date) AS ev_count,
+        COUNT(bp.vehicle_plate_no) AS baseline_count,
+        SUM(bp.avg_annual_distance_km) AS avg_annual_distance_km,
+        SUM(bp.avg_annual_fuel_l) AS avg_annual_fuel_l,
+        SUM(er.baseline_co2_emission_kg) AS baseline_co2_emission_kg,
+        SUM(er.ev_actual_co2_emission_kg) AS ev_actual_co2_emission_kg,
+        SUM(er.co2_reduction_kg) AS co2_reduction_kg
+    FROM
+        bus_vehicle_master vm
+    LEFT JOIN
+        bus_baseline_parameters bp ON vm.vehicle_plate_no = bp.vehicle_plate_no
+    LEFT JOIN
+        bus_emission_reductions er ON vm.vehicle_plate_no = er.vehicle_plate_no
+    GROUP BY GROUPING SETS (
+        (vm.company_name),
+        (vm.original_fuel_type),
+        (vm.business_type),
+        (er.calculated_year),
+        ()
+    )
+    ORDER BY
+        summary_level, vm.company_name, vm.original_fuel_type, vm.business_type, er.calculated_year;
+    """
+
+# 업체별 보고서의 요약 데이터: SUMMARY_QUERY와 같은 집계를 업체 안에서 기준별로 계산 (쿼리 1회로 모든 업체)
+# summary_level 값이 SUMMARY_QUERY와 같으므로 build_summary_sheets로 같은 형식의 시트를 만듭니다.
+COMPANY_SUMMARY_QUERY = """
+    SELECT
+        CASE
+            WHEN GROUPING(vm.original_fuel_type) = 0 THEN 'fuel'
+            WHEN GROUPING(vm.business_type) = 0 THEN 'business_type'
+            WHEN GROUPING(er.calculated_year) = 0 THEN 'calculated_year'
+            ELSE 'total'
+        END AS summary_level,
+        vm.company_name,
+        vm.original_fuel_type,
+        vm.business_type,
+        er.calculated_year,
+        COUNT(*) AS vehicle_count,
+        COUNT(vm.ev_registration_date) AS ev_count,
+        COUNT(bp.vehicle_plate_no) AS baseline_count,
+        SUM(bp.avg_annual_distance_km) AS avg_annual_distance_km,
+        SUM(bp.avg_annual_fuel_l) AS avg_annual_fuel_l,
+        SUM(er.baseline_co2_emission_kg) AS baseline_co2_emission_kg,
+        SUM(er.ev_actual_co2_emission_kg) AS ev_actual_co2_emission_kg,
+        SUM(er.co2_reduction_kg) AS co2_reduction_kg
+    FROM
+        bus_vehicle_master vm
+    LEFT JOIN
+        bus_baseline_parameters bp ON vm.vehicle_plate_no = bp.vehicle_plate_no
+    LEFT JOIN
+        bus_emission_reductions er ON vm.vehicle_plate_no = er.vehicle_plate_no
+    GROUP BY vm.company_name, GROUPING SETS (
+        (vm.original_fuel_type),
+        (vm.business_type),
+        (er.calculated_year),
+        ()
+    )
+    ORDER BY
+        vm.company_name, summary_level, vm.original_fuel_type, vm.business_type, er.calculated_year;
+    """
+
+# 요약 시트 구성: (summary_level, 시트명, 기준 컬럼, 기준 컬럼 한글명)
+SUMMARY_SHEETS = [
+    ('company', '요약_업체별', 'company_name', '업체명'),
+    ('fuel', '요약_연료별', 'original_fuel_type', '기존연료'),
+    ('business_type', '요약_사업구분별', 'business_type', '사업구분'),
+    ('calculated_year', '요약_계산연도별', 'calculated_year', '감축량_계산연도')
+]
+
+SUMMARY_RENAME_MAP = {
+    'vehicle_count': '차량수',
+    'ev_count': '전기차수',
+    'baseline_count': '베이스라인_산정차량수',
+    'avg_annual_distance_km': '연평균주행거리_합계(km)',
+    'avg_annual_fuel_l': '연평균연료량_합계(L)',
+    'baseline_co2_emission_kg': '베이스라인CO2_합계(kg)',
+    'ev_actual_co2_emission_kg': '전기차CO2_합계(kg)',
+    'co2_reduction_kg': 'CO2감축량_합계(kg)'
+}
+
+BASELINE_RENAME_MAP = {
+    'company_name': '업체명',
+    'business_type': '사업구분',
+    'model_year': '연식',
+    'original_fuel_type': '기존연료',
+    'vehicle_plate_no': '차량번호',
+    'baseline_start_ym': '베이스라인_시작월',
+    'baseline_end_ym': '베이스라인_종료월',
+    'months_of_operation': '산정월수',
+    'avg_annual_distance_km': '연평균주행거리(km)',
+    'avg_annual_fuel_l': '연평균연료량(L)',
+    'fuel_per_km': '연비(L/km)'
+}
+
+def monthly_query_params(year=None):
+    """
+    월별 운행기록 쿼리(MONTHLY_QUERY)의 운행년월 범위 파라미터를 만드는 함수.
+    - 값이 쿼리에 상수로 들어가므로 플래너가 해당 연도 파티션만 읽습니다. (year가 None이면 전체 기간)
+    """
+    if year is None:
+        return {'from_ym': None, 'to_ym': None}
+    from_ym, to_ym = year_month_bounds(year)
+    return {'from_ym': from_ym, 'to_ym': to_ym}
+
+def format_comprehensive_df(df):
+    """종합 보고서 데이터의 컬럼명을 한글로 바꾸고 전기차등록일을 문자열로 포맷팅하는 함수."""
+    df = df.rename(columns=COMPREHENSIVE_RENAME_MAP)
+    if '전기차등록일' in df.columns:
+        df['전기차등록일'] = pd.to_datetime(df['전기차등록일']).dt.strftime('%Y-%m-%d').replace('NaT', '')
+    return df
+
+def build_summary_sheets(summary_df, sheet_specs=SUMMARY_SHEETS):
+    """
+    GROUPING SETS 결과를 기준별 요약 시트로 나누는 함수. 각 시트 마지막에는 전체 합계 행을 붙입니다.
+    (요약 결과는 기준값 수만큼의 작은 표이므로 나누는 비용은 무시할 수 있습니다.)
+    :param sheet_specs: 만들 요약 시트 구성 (업체별 보고서는 업체 기준 시트를 뺀 구성을 사용)
+    :return: [(시트명, DataFrame)] 목록
+    """
+    metric_cols = list(SUMMARY_RENAME_MAP)
+    total_df = summary_df.loc[summary_df['summary_level'] == 'total', metric_cols]
+
+    sheets = []
+    for level, sheet_name, key_col, key_label in sheet_specs:
+        level_df = summary_df.loc[summary_df['summary_level'] == level, [key_col] + metric_cols]
+        # 기준 컬럼이 NULL인 그룹(예: 감축량 미산정 차량)은 '(미지정)'으로 표시
+        level_df = level_df.astype({key_col: object}).fillna({key_col: '(미지정)'})
+        total_row = total_df.assign(**{key_col: '전체'})[[key_col] + metric_cols]
+        sheet_df = pd.concat([level_df, total_row], ignore_index=True)
+        sheets.append((sheet_name, sheet_df.rename(columns={key_col: key_label, **SUMMARY_RENAME_MAP})))
+    return sheets
+
+def prepare_report_path(filename_prefix='bus_analysis_report'):
+    """reports 폴더를 준비하고 타임스탬프가 붙은 보고서 파일 경로를 반환하는 함수."""
+    output_dir = 'reports'
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        logger.info(f"✅ '{output_dir}' 폴더를 생성했습니다.")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(output_dir, f'{filename_prefix}_{timestamp}.xlsx')
+
+def report_filename_prefix(year=None):
+    """보고서 파일명 접두어를 반환하는 함수. 연도를 지정하면 파일명에 연도가 붙습니다."""
+    return 'bus_analysis_report' if year is None else f'bus_analysis_report_{year}'
+
+def prepare_report_dir(dirname_prefix='company_reports'):
+    """reports 폴더 아래에 타임스탬프가 붙은 하위 폴더를 만들고 경로를 반환하는 함수."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = os.path.join('reports', f'{dirname_prefix}_{timestamp}')
+    os.makedirs(output_dir, exist_ok=True)
+    logger.info(f"✅ '{output_dir}' 폴더를 생성했습니다.")
+    return output_dir
+
+def check_openpyxl():
+    """openpyxl 설치 여부를 확인하는 함수."""
+    try:
+        import openpyxl
+        return True
+    except ImportError:
+        logger.warning("⚠️ 'openpyxl' 라이브러리가 필요합니다. 'pip install openpyxl' 명령으로 설치 후 다시 실행해주세요.")
+        return False
+
+def compute_report_fingerprint(db_params):
+    """
+    보고서 원본 테이블의 행 수와 변경 워터마크(max(xmin))로 DB 상태 지문(SHA-256)을 계산하는 함수.
+    :return: 지문 문자열 (연결 또는 조회 실패 시 None)
+    """
+    conn = connect_to_db(db_params)
+    if not conn:
+        return None
+    try:
+        watermarks = fetch_table_watermarks(conn, REPORT_SOURCE_TABLES)
+    except Exception as e:
+        logger.warning(f"⚠️ DB 상태 지문 계산 중 오류가 발생하여 캐시를 사용하지 않습니다: {e}")
+        return None
+    finally:
+        close_db_connection(conn)
+
+    state = {table: list(watermarks[table]) for table in REPORT_SOURCE_TABLES}
+    state['layout_version'] = REPORT_LAYOUT_VERSION
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+def load_report_cache():
+    """보고서 캐시 파일을 읽어 {보고서 종류: 캐시 항목} 딕셔너리로 반환하는 함수."""
+    if not os.path.exists(REPORT_CACHE_PATH):
+        return {}
+    try:
+        with open(REPORT_CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ 보고서 캐시 파일을 읽지 못해 무시합니다: {e}")
+        return {}
+
+def find_cached_report(report_kind, fingerprint):
+    """
+    같은 종류의 마지막 보고서가 같은 DB 상태에서 만들어졌고 파일이 남아 있으면 그 경로를 반환하는 함수.
+    :return: 캐시된 보고서 경로 또는 None
+    """
+    if not fingerprint:
+        return None
+    entry = load_report_cache().get(report_kind)
+    if entry and entry.get('fingerprint') == fingerprint and os.path.exists(entry.get('path', '')):
+        return entry['path']
+    return None
+
+def save_report_cache(report_kind, fingerprint, report_path):
+    """생성한 보고서 경로와 DB 상태 지문을 캐시 파일에 기록하는 함수."""
+    if not fingerprint or not report_path:
+        return
+    cache = load_report_cache()
+    cache[report_kind] = {
+        'fingerprint': fingerprint,
+        'path': report_path,
+        'created_at': datetime.now().isoformat(timespec='seconds')
     }
+    os.makedirs(os.path.dirname(REPORT_CACHE_PATH), exist_ok=True)
+    with open(REPORT_CACHE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def generate_excel_report(db_params, year=None):
+    """
+    DB의 모든 관련 테이블을 조인하여 종합 보고서용 데이터를 생성하고 Excel 파일로 저장하는 함수.
+    - 시트 1: 종합 보고서 (마스터, 베이스라인, 감축량 정보 포함)
+    - 시트 2: 월별 운행기록 (베이스라인 계산의 원본 데이터)
+    - 시트 3: 베이스라인 계산결과 (차량별 베이스라인 요약)
+    - 요약 시트: 업체별/연료별/사업구분별/계산연도별 합계 (GROUPING SETS 쿼리 1회)
+    네 쿼리는 서로 독립적이므로 연결 풀을 통해 동시에 조회합니다.
+    :param year: 월별 운행기록 시트에 담을 연도 (None이면 전체 기간)
+    :return: 저장한 보고서 경로 (실패 시 None)
+    """
+    if not db_params: return None
+    if not check_openpyxl(): return None
 
     try:
-        # --- 데이터 로드 ---
-        print("⏳ [1/3] 종합 보고서 데이터를 로드합니다...")
-        comprehensive_df = pd.read_sql_query(comprehensive_query, conn)
-        print("⏳ [2/3] 월별 운행기록 데이터를 로드합니다...")
-        monthly_df = pd.read_sql_query(monthly_query, conn)
-        print("⏳ [3/3] 베이스라인 계산결과 데이터를 로드합니다...")
-        baseline_df = pd.read_sql_query(baseline_query, conn)
+        # --- 데이터 로드 (동시 조회) ---
+        logger.info("⏳ 종합 보고서, 월별 운행기록, 베이스라인 계산결과, 요약 데이터를 동시에 로드합니다...")
+        frames = fetch_frames_concurrently(db_params, {
+            '종합 보고서': COMPREHENSIVE_QUERY,
+            '월별 운행기록': (MONTHLY_QUERY, monthly_query_params(year)),
+            '베이스라인 계산결과': BASELINE_QUERY,
+            '요약': SUMMARY_QUERY
+        })
+        if frames is None:
+            return
+        comprehensive_df = frames['종합 보고서']
+        monthly_df = frames['월별 운행기록']
+        baseline_df = frames['베이스라인 계산결과']
+        summary_sheets = build_summary_sheets(frames['요약'])
 
         if comprehensive_df.empty:
-            print("⚠️ 보고서를 생성할 데이터가 없습니다. 01번부터 스크립트를 실행했는지 확인해주세요.")
+            logger.warning("⚠️ 보고서를 생성할 데이터가 없습니다. 01번부터 스크립트를 실행했는지 확인해주세요.")
             return
 
         # --- 데이터 가공 (컬럼명 변경 및 포맷팅) ---
-        comprehensive_df.rename(columns=comprehensive_rename_map, inplace=True)
-        if '전기차등록일' in comprehensive_df.columns:
-            comprehensive_df['전기차등록일'] = pd.to_datetime(comprehensive_df['전기차등록일']).dt.strftime('%Y-%m-%d').replace('NaT', '')
-
-        monthly_df.rename(columns=monthly_rename_map, inplace=True)
-        baseline_df.rename(columns=baseline_rename_map, inplace=True)
+        comprehensive_df = format_comprehensive_df(comprehensive_df)
+        monthly_df.rename(columns=MONTHLY_RENAME_MAP, inplace=True)
+        baseline_df.rename(columns=BASELINE_RENAME_MAP, inplace=True)
 
         # --- Excel 파일로 저장 ---
-        output_dir = 'reports'
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            print(f"✅ '{output_dir}' 폴더를 생성했습니다.")
+        report_path = prepare_report_path(report_filename_prefix(year))
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        report_filename = f'bus_analysis_report_{timestamp}.xlsx'
-        report_path = os.path.join(output_dir, report_filename)
+        logger.info(f"⏳ 생성된 보고서를 Excel 파일로 저장합니다: {report_path}")
+        total_rows = len(comprehensive_df) + len(monthly_df) + len(baseline_df) + sum(len(df) for _, df in summary_sheets)
+        with track_step('write', 'excel', rows_in=total_rows) as step:
+            with pd.ExcelWriter(report_path, engine='openpyxl') as writer:
+                comprehensive_df.to_excel(writer, sheet_name='종합 보고서', index=False)
+                monthly_df.to_excel(writer, sheet_name='월별 운행기록', index=False)
+                baseline_df.to_excel(writer, sheet_name='베이스라인 계산결과', index=False)
+                for sheet_name, sheet_df in summary_sheets:
+                    sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
+            step.rows_out = total_rows
 
-        print(f"\n⏳ 생성된 보고서를 Excel 파일로 저장합니다: {report_path}")
-        with pd.ExcelWriter(report_path, engine='openpyxl') as writer:
-            comprehensive_df.to_excel(writer, sheet_name='종합 보고서', index=False)
-            monthly_df.to_excel(writer, sheet_name='월별 운행기록', index=False)
-            baseline_df.to_excel(writer, sheet_name='베이스라인 계산결과', index=False)
+        logger.info(f"✅ 보고서 저장이 완료되었습니다: {report_path}")
+        return report_path
 
-        print(f"✅ 보고서 저장이 완료되었습니다: {report_path}")
+    except Exception as e:
+        logger.error(f"❌ 보고서 생성 중 오류 발생: {e}")
+        return None
+
+def iter_monthly_chunks(conn, chunk_size=STREAMING_CHUNK_SIZE, year=None):
+    """
+    월별 운행기록을 서버 측 커서로 chunk_size 단위 DataFrame으로 나눠 반환하는 제너레이터 (컬럼명 한글 변환 포함).
+    결과 전체가 클라이언트에 도착하기 전에 첫 청크부터 바로 기록을 시작할 수 있습니다.
+    """
+    for chunk in iter_query_chunks(conn, MONTHLY_QUERY, monthly_query_params(year), chunk_size=chunk_size, itersize=chunk_size):
+        yield chunk.rename(columns=MONTHLY_RENAME_MAP)
+
+def generate_streaming_excel_report(db_params, chunk_size=STREAMING_CHUNK_SIZE, year=None):
+    """
+    대규모 차량 데이터용 스트리밍 보고서 생성 함수.
+    - 차량 단위 시트(종합 보고서, 베이스라인 계산결과)는 한 번에 조회하고,
+      월별 운행기록은 DB에서 청크 단위로 받아 write-only 워크북에 바로 기록합니다.
+    - 월별 운행기록이 Excel 행 제한을 넘으면 '월별 운행기록 (1)', '(2)' ... 시트로 자동 분할됩니다.
+    :param year: 월별 운행기록 시트에 담을 연도 (None이면 전체 기간)
+    :return: 저장한 보고서 경로 (실패 시 None)
+    """
+    if not db_params: return None
+    if not check_openpyxl(): return None
+
+    try:
+        logger.info("⏳ 종합 보고서, 베이스라인 계산결과, 요약 데이터를 동시에 로드합니다...")
+        frames = fetch_frames_concurrently(db_params, {
+            '종합 보고서': COMPREHENSIVE_QUERY,
+            '베이스라인 계산결과': BASELINE_QUERY,
+            '요약': SUMMARY_QUERY
+        })
+        if frames is None:
+            return
+        if frames['종합 보고서'].empty:
+            logger.warning("⚠️ 보고서를 생성할 데이터가 없습니다. 01번부터 스크립트를 실행했는지 확인해주세요.")
+            return
+
+        comprehensive_df = format_comprehensive_df(frames['종합 보고서'])
+        baseline_df = frames['베이스라인 계산결과'].rename(columns=BASELINE_RENAME_MAP)
+        summary_sheets = build_summary_sheets(frames['요약'])
+
+        conn = connect_to_db(db_params)
+        if not conn:
+            return
+        try:
+            report_path = prepare_report_path(report_filename_prefix(year))
+            logger.info(f"⏳ 보고서를 스트리밍 방식으로 저장합니다: {report_path} (청크 크기: {chunk_size}행)")
+            # 월별 운행기록은 청크 단위로 읽으면서 기록하므로 읽기와 쓰기가 이 단계 하나로 측정됨
+            with track_step('write', 'excel_streaming'):
+                write_streaming_workbook(report_path, [
+                    ('종합 보고서', [comprehensive_df]),
+                    ('월별 운행기록', iter_monthly_chunks(conn, chunk_size, year)),
+                    ('베이스라인 계산결과', [baseline_df])
+                ] + [(sheet_name, [sheet_df]) for sheet_name, sheet_df in summary_sheets])
+            logger.info(f"✅ 보고서 저장이 완료되었습니다: {report_path}")
+            return report_path
+        finally:
+            close_db_connection(conn)
+
+    except Exception as e:
+        logger.error(f"❌ 보고서 생성 중 오류 발생: {e}")
+        return None
+
+def generate_company_reports(db_params, max_workers=None, year=None):
+    """
+    업체(company_name)별 보고서를 각각의 Excel 파일로 생성하는 함수.
+    - 테이블별 쿼리는 업체 수와 관계없이 한 번씩만 실행하고(업체명 순 정렬), 메모리에서 업체별로 나눕니다.
+    - 업체별 워크북 저장은 CPU 작업이므로 프로세스 풀에서 동시에 처리합니다.
+    - 통합 보고서와 같은 요약 시트(연료별/사업구분별/계산연도별)를 업체 안의 집계로 붙입니다. (업체별 시트는 제외)
+    - 업체명을 파일명으로 바꾼 결과가 겹치면 해시를 붙여 서로 덮어쓰지 않게 합니다.
+    - 생성된 파일 목록은 같은 폴더의 index.csv에 기록합니다.
+    :param max_workers: 작업자 프로세스 수 (None이면 CPU 코어 수)
+    :param year: 월별 운행기록 시트에 담을 연도 (None이면 전체 기간)
+    :return: index.csv 경로 (실패 시 None)
+    """
+    if not db_params: return None
+    if not check_openpyxl(): return None
+
+    try:
+        logger.info("⏳ 업체별 보고서용 데이터를 동시에 로드합니다...")
+        frames = fetch_frames_concurrently(db_params, {
+            '종합 보고서': COMPREHENSIVE_QUERY,
+            '월별 운행기록': (MONTHLY_QUERY, monthly_query_params(year)),
+            '베이스라인 계산결과': BASELINE_QUERY,
+            '요약': COMPANY_SUMMARY_QUERY
+        })
+        if frames is None:
+            return None
+        if frames['종합 보고서'].empty:
+            logger.warning("⚠️ 보고서를 생성할 데이터가 없습니다. 01번부터 스크립트를 실행했는지 확인해주세요.")
+            return None
+
+        comprehensive_df = format_comprehensive_df(frames['종합 보고서'])
+        monthly_df = frames['월별 운행기록'].rename(columns=MONTHLY_RENAME_MAP)
+        baseline_df = frames['베이스라인 계산결과'].rename(columns=BASELINE_RENAME_MAP)
+
+        # 업체별로 한 번에 나눠 두고, 데이터가 없는 시트는 컬럼만 있는 빈 DataFrame으로 채움
+        monthly_groups = dict(tuple(monthly_df.groupby('업체명', sort=False)))
+        baseline_groups = dict(tuple(baseline_df.groupby('업체명', sort=False)))
+        summary_groups = dict(tuple(frames['요약'].groupby('company_name', sort=False)))
+        company_sheet_specs = [spec for spec in SUMMARY_SHEETS if spec[0] != 'company']
+
+        output_dir = prepare_report_dir('company_reports' if year is None else f'company_reports_{year}')
+        company_groups = list(comprehensive_df.groupby('업체명', sort=True))
+        filenames = assign_safe_filenames([company for company, _ in company_groups])
+        jobs = {}
+        for company, company_df in company_groups:
+            report_path = os.path.join(output_dir, f'bus_analysis_report_{filenames[company]}.xlsx')
+            summary_sheets = build_summary_sheets(summary_groups.get(company, frames['요약'].iloc[0:0]), company_sheet_specs)
+            jobs[company] = (report_path, [
+                ('종합 보고서', company_df),
+                ('월별 운행기록', monthly_groups.get(company, monthly_df.iloc[0:0])),
+                ('베이스라인 계산결과', baseline_groups.get(company, baseline_df.iloc[0:0]))
+            ] + summary_sheets)
+
+        total_rows = sum(len(df) for _, sheets in jobs.values() for _, df in sheets)
+        with track_step('write', 'excel_per_company', rows_in=total_rows) as step:
+            results = write_reports_in_parallel(jobs, max_workers=max_workers)
+            step.rows_out = sum(len(df) for company in results for _, df in jobs[company][1])
+
+        index_rows = []
+        for company, (report_path, sheets) in jobs.items():
+            if company not in results:
+                continue
+            _, written_sheets, elapsed = results[company]
+            index_rows.append({
+                '업체명': company,
+                '파일명': os.path.basename(report_path),
+                '차량수': len(sheets[0][1]),
+                '월별기록수': len(sheets[1][1]),
+                '시트구성': ', '.join(title for title, _ in written_sheets),
+                '저장소요시간(초)': round(elapsed, 3)
+            })
+        index_path = os.path.join(output_dir, 'index.csv')
+        # Excel에서 한글이 깨지지 않도록 BOM 포함 UTF-8로 저장
+        pd.DataFrame(index_rows).to_csv(index_path, index=False, encoding='utf-8-sig')
+
+        failed = len(jobs) - len(results)
+        logger.info(f"✅ 업체별 보고서 {len(results)}건 생성 완료 (실패 {failed}건). 목록: {index_path}")
+        return index_path
 
     except Exception as e:
-        print(f"❌ 보고서 생성 중 오류 발생: {e}")
+        logger.error(f"❌ 업체별 보고서 생성 중 오류 발생: {e}")
+        return None
 
 def main():
     """메인 실행 함수."""
-    print("\n--- [파일 6] 종합 분석 보고서(Excel) 생성 시작 ---")
+    parser = argparse.ArgumentParser(description="종합 분석 보고서(Excel) 생성")
+    parser.add_argument('--streaming', action='store_true',
+                        help="월별 운행기록을 청크 단위로 기록하는 저메모리 스트리밍 모드로 생성합니다.")
+    parser.add_argument('--chunk-size', type=int, default=STREAMING_CHUNK_SIZE,
+                        help=f"스트리밍 모드의 DB 청크 크기 (기본값: {STREAMING_CHUNK_SIZE})")
+    parser.add_argument('--per-company', action='store_true',
+                        help="업체별로 보고서 파일을 나눠 생성하고 목록(index.csv)을 함께 저장합니다.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="업체별 보고서 저장에 사용할 작업자 프로세스 수 (기본값: CPU 코어 수)")
+    parser.add_argument('--force', action='store_true',
+                        help="DB 상태가 마지막 보고서와 같아도 캐시를 사용하지 않고 다시 생성합니다.")
+    parser.add_argument('--year', type=int, default=None,
+                        help="월별 운행기록 시트를 이 연도(YYYY)로 한정합니다. 해당 연도 파티션만 조회합니다. (기본값: 전체 기간)")
+    args = parser.parse_args()
+
+    logger.info("--- [파일 6] 종합 분석 보고서(Excel) 생성 시작 ---")
     db_params = db_connection_params
-    conn = connect_to_db(db_params)
-    if conn:
-        generate_excel_report(conn)
-        close_db_connection(conn)
+    report_kind = 'per_company' if args.per_company else ('streaming' if args.streaming else 'standard')
+    if args.year is not None:
+        report_kind = f"{report_kind}_{args.year}"
+
+    # --- DB 상태가 마지막 보고서와 같으면 조회/렌더링 없이 기존 파일을 재사용 ---
+    fingerprint = compute_report_fingerprint(db_params)
+    cached_path = None if args.force else find_cached_report(report_kind, fingerprint)
+    if cached_path:
+        logger.info(f"ℹ️ DB 상태가 마지막 보고서 생성 시점과 같아 기존 보고서를 재사용합니다: {cached_path}")
+        logger.info("   (다시 생성하려면 --force 옵션을 사용하세요.)")
+        return
+
+    if args.per_company:
+        report_path = generate_company_reports(db_params, max_workers=args.workers, year=args.year)
+    elif args.streaming:
+        report_path = generate_streaming_excel_report(db_params, chunk_size=args.chunk_size, year=args.year)
+    else:
+        report_path = generate_excel_report(db_params, year=args.year)
+    save_report_cache(report_kind, fingerprint, report_path)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    with track_stage():
+        main()
@@ -0,0 +1,207 @@
+import pandas as pd
+import psycopg2
+from db_config import db_connection_params
+from db_utils import connect_to_db, close_db_connection
+from metrics import track_stage, track_step
+from log_config import logger
+
+def execute_query(conn, query, message="쿼리 실행"):
+    """주어진 쿼리를 실행하는 함수."""
+    if not conn: return
+    with conn.cursor() as cur:
+        try:
+            cur.execute(query)
+            conn.commit()
+            logger.info(f"✅ {message} 성공적으로 실행되었습니다.")
+        except psycopg2.Error as e:
+            logger.error(f"❌ {message} 오류: {e}")
+            conn.rollback()
+
+def ensure_ev_period_table(conn):
+    """
+    전기버스 운행기간 결과 테이블이 없으면 생성하는 함수.
+    (00_edit_db.py로 DB를 초기화하지 않은 기존 환경에서도 실행할 수 있도록 함)
+    """
+    create_table_query = """
+    CREATE TABLE IF NOT EXISTS bus_ev_operation_periods (
+        vehicle_plate_no VARCHAR(20) PRIMARY KEY,
+        ev_registration_date DATE NOT NULL,
+        first_active_ym INT,
+        last_active_ym INT,
+        active_months INT NOT NULL,
+        gap_months INT NOT NULL,
+        run_count INT NOT NULL,
+        longest_run_months INT NOT NULL,
+        coverage_ratio DOUBLE PRECISION NOT NULL,
+
+        FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
+    );
+    """
+    execute_query(conn, create_table_query, message="테이블 확인: bus_ev_operation_periods")
+
+def refresh_ev_operation_periods(conn):
+    """
+    bus_driving_records로부터 전기버스별 운행기간 지표를 한 번의 쿼리로 계산하여 저장하는 함수.
+    - 운행년월(정수 YYYYMM)을 월 인덱스(연*12 + 월)로 바꾼 뒤, '인덱스 - 차량 내 순번'이 같은 행끼리 묶는
+      gaps-and-islands 방식으로 연속 운행 구간을 찾습니다. (차량별 루프 없음)
+    - 운행월: 주행거리 또는 충전량이 0보다 큰 월
+    - gap_months: 첫 운행월 ~ 마지막 운행월 사이에 기록이 없는 월 수
+    - coverage_ratio: 등록월 ~ 이번 달 전체 월 수 대비 운행월 비율
+    - 운행월이 없는 전기버스도 첫/마지막 운행월 NULL, 가동률 0인 행으로 저장하고,
+      더 이상 전기버스가 아닌(등록 해제, 차량 삭제) 차량의 행은 같은 트랜잭션에서 삭제합니다.
+    :return: 신규 저장, 변경 또는 삭제된 차량 수 (실패 시 None)
+    """
+    if not conn: return None
+
+    upsert_query = """
+        WITH active_months AS (
+            SELECT
+                dr.vehicle_plate_no,
+                vm.ev_registration_date,
+                dr.year_month,
+                dr.year_month / 100 * 12 + dr.year_month % 100 - 1 AS month_idx
+            FROM
+                bus_driving_records dr
+            JOIN
+                bus_vehicle_master vm ON dr.vehicle_plate_no = vm.vehicle_plate_no
+            WHERE
+                vm.ev_registration_date IS NOT NULL
+                AND (dr.driving_distance_km > 0 OR dr.charging_amount_kwh > 0)
+        ),
+        islands AS (
+            SELECT
+                vehicle_plate_no,
+                month_idx - ROW_NUMBER() OVER (PARTITION BY vehicle_plate_no ORDER BY month_idx) AS island_id
+            FROM
+                active_months
+        ),
+        runs AS (
+            SELECT
+                vehicle_plate_no,
+                COUNT(*) AS run_count,
+                MAX(run_length) AS longest_run_months
+            FROM (
+                SELECT vehicle_plate_no, COUNT(*) AS run_length
+                FROM islands
+                GROUP BY vehicle_plate_no, island_id
+            ) AS island_lengths
+            GROUP BY
+                vehicle_plate_no
+        ),
+        spans AS (
+            SELECT
+                vehicle_plate_no,
+                MIN(ev_registration_date) AS ev_registration_date,
+                MIN(year_month) AS first_active_ym,
+                MAX(year_month) AS last_active_ym,
+                COUNT(*) AS active_months,
+                MAX(month_idx) - MIN(month_idx) + 1 - COUNT(*) AS gap_months
+            FROM
+                active_months
+            GROUP BY
+                vehicle_plate_no
+        )
+        INSERT INTO bus_ev_operation_periods (
+            vehicle_plate_no, ev_registration_date, first_active_ym, last_active_ym,
+            active_months, gap_months, run_count, longest_run_months, coverage_ratio
+        )
+        SELECT
+            vm.vehicle_plate_no,
+            vm.ev_registration_date,
+            s.first_active_ym,
+            s.last_active_ym,
+            COALESCE(s.active_months, 0),
+            COALESCE(s.gap_months, 0),
+            COALESCE(r.run_count, 0),
+            COALESCE(r.longest_run_months, 0),
+            LEAST(1.0, COALESCE(s.active_months, 0)::DOUBLE PRECISION / GREATEST(1,
+                (EXTRACT(YEAR FROM CURRENT_DATE)::INT * 12 + EXTRACT(MONTH FROM CURRENT_DATE)::INT)
+                - (EXTRACT(YEAR FROM vm.ev_registration_date)::INT * 12 + EXTRACT(MONTH FROM vm.ev_registration_date)::INT)
+                + 1
+            ))
+        FROM
+            bus_vehicle_master vm
+        LEFT JOIN
+            spans s ON s.vehicle_plate_no = vm.vehicle_plate_no
+        LEFT JOIN
+            runs r ON r.vehicle_plate_no = vm.vehicle_plate_no
+        WHERE
+            vm.ev_registration_date IS NOT NULL
+        ON CONFLICT (vehicle_plate_no) DO UPDATE SET
+            ev_registration_date = EXCLUDED.ev_registration_date,
+            first_active_ym = EXCLUDED.first_active_ym,
+            last_active_ym = EXCLUDED.last_active_ym,
+            active_months = EXCLUDED.active_months,
+            gap_months = EXCLUDED.gap_months,
+            run_count = EXCLUDED.run_count,
+            longest_run_months = EXCLUDED.longest_run_months,
+            coverage_ratio = EXCLUDED.coverage_ratio
+        WHERE ROW(
+            bus_ev_operation_periods.ev_registration_date, bus_ev_operation_periods.first_active_ym,
+            bus_ev_operation_periods.last_active_ym, bus_ev_operation_periods.active_months,
+            bus_ev_operation_periods.gap_months, bus_ev_operation_periods.run_count,
+            bus_ev_operation_periods.longest_run_months, bus_ev_operation_periods.coverage_ratio
+        ) IS DISTINCT FROM ROW(
+            EXCLUDED.ev_registration_date, EXCLUDED.first_active_ym, EXCLUDED.last_active_ym,
+            EXCLUDED.active_months, EXCLUDED.gap_months, EXCLUDED.run_count,
+            EXCLUDED.longest_run_months, EXCLUDED.coverage_ratio
+        );
+    """
+    # 위 INSERT가 모든 등록 전기버스의 행을 만들므로, 등록 전기버스가 아닌 차량의 행만 남은 이전 결과
+    delete_query = """
+        DELETE FROM bus_ev_operation_periods p
+        WHERE NOT EXISTS (
+            SELECT 1 FROM bus_vehicle_master vm
+            WHERE vm.vehicle_plate_no = p.vehicle_plate_no AND vm.ev_registration_date IS NOT NULL
+        );
+    """
+    with conn.cursor() as cur:
+        try:
+            logger.info("⏳ 전기버스 운행기간(첫/마지막 운행월, 공백월, 최장 연속운행, 가동률)을 계산합니다...")
+            # 계산과 저장이 DB 안에서 처리되므로 쓰기 단계로 측정 (출력 행 = 신규/변경/삭제 행 수)
+            with track_step('write', 'bus_ev_operation_periods') as step:
+                cur.execute(upsert_query)
+                count = cur.rowcount
+                cur.execute(delete_query)
+                deleted = cur.rowcount
+                conn.commit()
+                step.rows_out = count + deleted
+            logger.info(f"✅ {count}대의 전기버스 운행기간 레코드가 신규 저장되거나 변경되었고, {deleted}대가 삭제되었습니다. (값이 같은 레코드는 건너뜀)")
+            return count + deleted
+        except psycopg2.Error as e:
+            logger.error(f"❌ 전기버스 운행기간 계산 오류: {e}")
+            conn.rollback()
+            return None
+
+def display_ev_period_summary(conn):
+    """저장된 운행기간 결과 중 공백월이 많은 차량 위주로 요약을 출력하는 함수."""
+    if not conn: return
+    query = """
+        SELECT vehicle_plate_no, first_active_ym, last_active_ym, active_months,
+               gap_months, longest_run_months, coverage_ratio
+        FROM bus_ev_operation_periods
+        ORDER BY gap_months DESC, coverage_ratio ASC
+        LIMIT 10;
+    """
+    try:
+        df = pd.read_sql_query(query, conn)
+        logger.info(f"[전기버스 운행기간 (공백월 상위 10대)]\n{df.to_string()}")
+    except Exception as e:
+        logger.error(f"❌ 운행기간 조회 중 오류 발생: {e}")
+
+def main():
+    """메인 실행 함수."""
+    logger.info("--- [파일 7] 전기버스 운행기간 계산 시작 ---")
+
+    db_params = db_connection_params
+    conn = connect_to_db(db_params)
+
+    if conn:
+        ensure_ev_period_table(conn)
+        if refresh_ev_operation_periods(conn) is not None:
+            display_ev_period_summary(conn)
+        close_db_connection(conn)
+
+if __name__ == '__main__':
+    with track_stage():
+        main()
@@ -0,0 +1,348 @@
+import argparse
+import json
+import os
+import psycopg2
+from psycopg2.extras import execute_values
+from db_config import db_connection_params
+from db_utils import connect_to_db, close_db_connection
+from db_reader import fetch_table_watermarks, fetch_table_change_counters
+from metrics import track_stage, track_step
+from constants import GRID_EMISSION_FACTOR_KG_PER_KWH
+from log_config import logger
+
+# 간접배출량의 원본 테이블 (충전량, 전기차 등록 여부)
+EMISSION_SOURCE_TABLES = ('bus_driving_records', 'bus_vehicle_master')
+
+# 마지막 산정 시점의 테이블 상태(행 수, max(xmin))를 기록하는 파일
+EMISSION_STATE_PATH = os.path.join('logs', 'ev_emission_state.json')
+
+def execute_query(conn, query, message="쿼리 실행"):
+    """주어진 쿼리를 실행하는 함수."""
+    if not conn: return
+    with conn.cursor() as cur:
+        try:
+            cur.execute(query)
+            conn.commit()
+            logger.info(f"✅ {message} 성공적으로 실행되었습니다.")
+        except psycopg2.Error as e:
+            logger.error(f"❌ {message} 오류: {e}")
+            conn.rollback()
+
+def ensure_ev_emission_tables(conn):
+    """
+    전기버스 간접배출량 산정에 필요한 테이블이 없으면 생성하는 함수.
+    (00_edit_db.py로 DB를 초기화하지 않은 기존 환경에서도 실행할 수 있도록 함)
+    """
+    create_queries = [
+        """
+        CREATE TABLE IF NOT EXISTS grid_emission_factors (
+            factor_year INT PRIMARY KEY,
+            kg_co2_per_kwh DOUBLE PRECISION NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS bus_ev_monthly_emissions (
+            vehicle_plate_no VARCHAR(20) NOT NULL,
+            year_month INT NOT NULL,
+            charging_amount_kwh DOUBLE PRECISION NOT NULL,
+            grid_emission_factor DOUBLE PRECISION NOT NULL,
+            ev_co2_emission_kg DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (vehicle_plate_no, year_month),
+            FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS bus_ev_annual_emissions (
+            vehicle_plate_no VARCHAR(20) NOT NULL,
+            emission_year INT NOT NULL,
+            months_reported INT NOT NULL,
+            charging_amount_kwh DOUBLE PRECISION NOT NULL,
+            ev_co2_emission_kg DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (vehicle_plate_no, emission_year),
+            FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
+        );
+        """
+    ]
+    for query in create_queries:
+        execute_query(conn, query, message=f"테이블 확인: {query.split()[5]}")
+
+def sync_grid_emission_factors(conn, factors):
+    """
+    constants.py의 연도별 전력 배출계수를 grid_emission_factors 테이블에 반영하는 함수.
+    :param factors: {적용 시작 연도: kgCO2/kWh} 딕셔너리
+    :return: 새로 추가되거나 값이 바뀐 계수의 개수 (실패 시 None)
+    """
+    if not conn or not factors: return None
+
+    values = [(int(year), float(factor)) for year, factor in sorted(factors.items())]
+    upsert_query = """
+        INSERT INTO grid_emission_factors (factor_year, kg_co2_per_kwh)
+        VALUES %s
+        ON CONFLICT (factor_year) DO UPDATE SET kg_co2_per_kwh = EXCLUDED.kg_co2_per_kwh
+        WHERE grid_emission_factors.kg_co2_per_kwh IS DISTINCT FROM EXCLUDED.kg_co2_per_kwh
+    """
+    with conn.cursor() as cur:
+        try:
+            execute_values(cur, upsert_query, values)
+            changed = cur.rowcount
+            conn.commit()
+            logger.info(f"✅ 전력 배출계수 {len(values)}건을 확인했습니다. (신규/변경 {changed}건)")
+            return changed
+        except psycopg2.Error as e:
+            logger.error(f"❌ 전력 배출계수 저장 오류: {e}")
+            conn.rollback()
+            return None
+
+def load_emission_state():
+    """마지막 산정 시점의 테이블 상태를 읽는 함수. (파일이 없거나 읽지 못하면 None)"""
+    if not os.path.exists(EMISSION_STATE_PATH):
+        return None
+    try:
+        with open(EMISSION_STATE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ 간접배출량 산정 상태 파일을 읽지 못해 전체 재산정합니다: {e}")
+        return None
+
+def save_emission_state(state):
+    """테이블 상태를 임시 파일에 쓴 뒤 교체하여 저장하는 함수."""
+    os.makedirs(os.path.dirname(EMISSION_STATE_PATH), exist_ok=True)
+    temp_path = f"{EMISSION_STATE_PATH}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, EMISSION_STATE_PATH)
+
+def fetch_source_counters(conn):
+    """원본 테이블의 {테이블명: 누적 변경 행 수}를 통계 뷰에서 조회하는 함수. (테이블을 스캔하지 않는 1차 판별용)"""
+    return fetch_table_change_counters(conn, EMISSION_SOURCE_TABLES)
+
+def fetch_emission_state(conn):
+    """원본/결과 테이블의 {테이블명: [행 수, max(xmin)]} 상태를 조회하는 함수. (테이블 전체를 스캔)"""
+    watermarks = fetch_table_watermarks(conn, EMISSION_SOURCE_TABLES + ('bus_ev_monthly_emissions',))
+    return {table: list(watermark) for table, watermark in watermarks.items()}
+
+def find_changed_from_month(conn, previous, current):
+    """
+    마지막 산정 이후 바뀐 운행 기록 중 가장 이른 운행년월을 찾는 함수.
+    - 운행년월이 아니라 변경 여부(행 수, max(xmin))로 판단하므로, 늦게 들어온 과거 월의 기록도 다시 산정됩니다.
+    :param previous: 마지막 산정 시점의 워터마크 (load_emission_state의 'watermarks')
+    :param current: 현재 워터마크 (fetch_emission_state)
+    :return: (재산정 시작 운행년월, 사유). 운행년월이 None이면 전체 재산정, 사유가 None이면 변경 없음
+    """
+    if not previous:
+        return None, "이전 산정 상태 없음"
+    if previous.get('bus_ev_monthly_emissions') != current['bus_ev_monthly_emissions']:
+        return None, "간접배출량 테이블이 다른 경로로 변경됨"
+    if previous.get('bus_vehicle_master') != current['bus_vehicle_master']:
+        return None, "차량 마스터 변경 (전기차 등록 여부)"
+
+    previous_count, previous_xmin = previous.get('bus_driving_records') or (None, None)
+    current_count, current_xmin = current['bus_driving_records']
+    if [previous_count, previous_xmin] == [current_count, current_xmin]:
+        return None, None
+    if previous_xmin is None or current_xmin is None or current_xmin < previous_xmin or current_count < previous_count:
+        return None, "운행 기록 삭제 또는 워터마크 초기화"
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT MIN(year_month) FROM bus_driving_records WHERE xmin::text::bigint > %s;", (previous_xmin,))
+        from_year_month = cur.fetchone()[0]
+    if from_year_month is None:
+        return None, "운행 기록 삭제"
+    return from_year_month, f"{from_year_month} 이후 운행 기록 변경"
+
+def refresh_ev_monthly_emissions(conn, from_year_month=None):
+    """
+    bus_driving_records의 충전량(charging_amount_kwh)으로 전기버스 월별 간접배출량을 산정하는 함수.
+    전체 테이블을 대상으로 하나의 GROUP BY 집계 쿼리로 계산하며, 차량별 루프를 돌지 않습니다.
+    재계산 범위 안에서 더 이상 집계되지 않는 레코드는 같은 트랜잭션에서 삭제합니다.
+    :param from_year_month: 이 운행년월(포함) 이후의 기록만 다시 계산 (None이면 전체 재계산)
+    :return: 신규 저장, 변경 또는 삭제된 레코드 수 (실패 시 None)
+    """
+    if not conn: return None
+
+    # 운행연도 이하에서 가장 최근에 고시된 계수를 적용하고,
+    # 계수 테이블의 첫 연도보다 이전 기록에는 가장 오래된 계수를 적용합니다.
+    upsert_query = """
+        INSERT INTO bus_ev_monthly_emissions (
+            vehicle_plate_no, year_month, charging_amount_kwh, grid_emission_factor, ev_co2_emission_kg
+        )
+        SELECT
+            agg.vehicle_plate_no,
+            agg.year_month,
+            agg.charging_amount_kwh,
+            agg.grid_emission_factor,
+            agg.charging_amount_kwh * agg.grid_emission_factor
+        FROM (
+            SELECT
+                dr.vehicle_plate_no,
+                dr.year_month,
+                SUM(dr.charging_amount_kwh) AS charging_amount_kwh,
+                COALESCE(
+                    (SELECT g.kg_co2_per_kwh FROM grid_emission_factors g
+                     WHERE g.factor_year <= dr.year_month / 100
+                     ORDER BY g.factor_year DESC LIMIT 1),
+                    (SELECT g.kg_co2_per_kwh FROM grid_emission_factors g
+                     ORDER BY g.factor_year LIMIT 1)
+                ) AS grid_emission_factor
+            FROM
+                bus_driving_records dr
+            JOIN
+                bus_vehicle_master vm ON dr.vehicle_plate_no = vm.vehicle_plate_no
+            WHERE
+                vm.ev_registration_date IS NOT NULL
+                AND dr.charging_amount_kwh > 0
+                AND (%(from_ym)s IS NULL OR dr.year_month >= %(from_ym)s)
+            GROUP BY
+                dr.vehicle_plate_no, dr.year_month
+        ) AS agg
+        ON CONFLICT (vehicle_plate_no, year_month) DO UPDATE SET
+            charging_amount_kwh = EXCLUDED.charging_amount_kwh,
+            grid_emission_factor = EXCLUDED.grid_emission_factor,
+            ev_co2_emission_kg = EXCLUDED.ev_co2_emission_kg
+        WHERE ROW(bus_ev_monthly_emissions.charging_amount_kwh, bus_ev_monthly_emissions.grid_emission_factor)
+            IS DISTINCT FROM ROW(EXCLUDED.charging_amount_kwh, EXCLUDED.grid_emission_factor);
+    """
+    # 재산정 범위 안에서 집계 결과에 없는 월(기록 삭제, 충전량 0, 전기차 등록 해제)은 삭제
+    delete_query = """
+        DELETE FROM bus_ev_monthly_emissions m
+        WHERE (%(from_ym)s IS NULL OR m.year_month >= %(from_ym)s)
+          AND NOT EXISTS (
+              SELECT 1
+              FROM bus_driving_records dr
+              JOIN bus_vehicle_master vm ON dr.vehicle_plate_no = vm.vehicle_plate_no
+              WHERE dr.vehicle_plate_no = m.vehicle_plate_no
+                AND dr.year_month = m.year_month
+                AND vm.ev_registration_date IS NOT NULL
+                AND dr.charging_amount_kwh > 0
+          );
+    """
+    with conn.cursor() as cur:
+        try:
+            scope = f"{from_year_month} 이후" if from_year_month else "전체"
+            logger.info(f"⏳ 전기버스 월별 간접배출량을 산정합니다. (대상 기간: {scope})")
+            # 계산과 저장이 DB 안에서 한 문장으로 처리되므로 쓰기 단계로 측정
+            with track_step('write', 'bus_ev_monthly_emissions') as step:
+                cur.execute(upsert_query, {'from_ym': from_year_month})
+                count = cur.rowcount
+                cur.execute(delete_query, {'from_ym': from_year_month})
+                deleted = cur.rowcount
+                conn.commit()
+                step.rows_out = count + deleted
+            logger.info(f"✅ {count}개의 월별 간접배출량 레코드가 신규 저장되거나 변경되었고, {deleted}개가 삭제되었습니다. (값이 같은 레코드는 건너뜀)")
+            return count + deleted
+        except psycopg2.Error as e:
+            logger.error(f"❌ 월별 간접배출량 산정 오류: {e}")
+            conn.rollback()
+            return None
+
+def refresh_ev_annual_emissions(conn, from_year=None):
+    """
+    월별 간접배출량을 차량·연도별로 합산하여 bus_ev_annual_emissions에 저장하는 함수.
+    재집계 범위 안에서 월별 레코드가 없는 차량·연도는 같은 트랜잭션에서 삭제합니다.
+    :param from_year: 이 연도(포함) 이후만 다시 집계 (None이면 전체 재집계)
+    :return: 신규 저장, 변경 또는 삭제된 레코드 수 (실패 시 None)
+    """
+    if not conn: return None
+
+    upsert_query = """
+        INSERT INTO bus_ev_annual_emissions (
+            vehicle_plate_no, emission_year, months_reported, charging_amount_kwh, ev_co2_emission_kg
+        )
+        SELECT
+            vehicle_plate_no,
+            year_month / 100 AS emission_year,
+            COUNT(*),
+            SUM(charging_amount_kwh),
+            SUM(ev_co2_emission_kg)
+        FROM
+            bus_ev_monthly_emissions
+        WHERE
+            %(from_year)s IS NULL OR year_month >= %(from_year)s * 100
+        GROUP BY
+            vehicle_plate_no, year_month / 100
+        ON CONFLICT (vehicle_plate_no, emission_year) DO UPDATE SET
+            months_reported = EXCLUDED.months_reported,
+            charging_amount_kwh = EXCLUDED.charging_amount_kwh,
+            ev_co2_emission_kg = EXCLUDED.ev_co2_emission_kg
+        WHERE ROW(bus_ev_annual_emissions.months_reported, bus_ev_annual_emissions.charging_amount_kwh,
+                  bus_ev_annual_emissions.ev_co2_emission_kg)
+            IS DISTINCT FROM ROW(EXCLUDED.months_reported, EXCLUDED.charging_amount_kwh, EXCLUDED.ev_co2_emission_kg);
+    """
+    # 재집계 범위 안에서 월별 레코드가 모두 사라진 차량·연도는 삭제
+    delete_query = """
+        DELETE FROM bus_ev_annual_emissions a
+        WHERE (%(from_year)s IS NULL OR a.emission_year >= %(from_year)s)
+          AND NOT EXISTS (
+              SELECT 1
+              FROM bus_ev_monthly_emissions m
+              WHERE m.vehicle_plate_no = a.vehicle_plate_no
+                AND m.year_month BETWEEN a.emission_year * 100 + 1 AND a.emission_year * 100 + 12
+          );
+    """
+    with conn.cursor() as cur:
+        try:
+            logger.info("⏳ 전기버스 연간 간접배출량을 집계합니다...")
+            with track_step('write', 'bus_ev_annual_emissions') as step:
+                cur.execute(upsert_query, {'from_year': from_year})
+                count = cur.rowcount
+                cur.execute(delete_query, {'from_year': from_year})
+                deleted = cur.rowcount
+                conn.commit()
+                step.rows_out = count + deleted
+            logger.info(f"✅ {count}개의 연간 간접배출량 레코드가 신규 저장되거나 변경되었고, {deleted}개가 삭제되었습니다. (값이 같은 레코드는 건너뜀)")
+            return count + deleted
+        except psycopg2.Error as e:
+            logger.error(f"❌ 연간 간접배출량 집계 오류: {e}")
+            conn.rollback()
+            return None
+
+def main():
+    """메인 실행 함수."""
+    parser = argparse.ArgumentParser(description="전기버스 충전량 기반 간접배출량 산정")
+    parser.add_argument('--full', action='store_true', help="증분 갱신 대신 전체 기간을 다시 산정합니다.")
+    args = parser.parse_args()
+
+    logger.info("--- [파일 8] 전기버스 간접배출량 산정 시작 ---")
+
+    db_params = db_connection_params
+    conn = connect_to_db(db_params)
+
+    if conn:
+        ensure_ev_emission_tables(conn)
+        changed_factors = sync_grid_emission_factors(conn, GRID_EMISSION_FACTOR_KG_PER_KWH)
+
+        # 산정 중에 들어온 기록은 다음 실행에서 다시 잡히도록 산정 전에 원본 테이블 상태를 읽음
+        previous = load_emission_state() or {}
+        counters = fetch_source_counters(conn)
+        watermarks = None
+        if args.full or changed_factors:
+            # 배출계수가 바뀌면 과거 월의 배출량도 달라지므로 전체 재산정
+            from_year_month, reason = None, "--full 옵션" if args.full else "전력 배출계수 변경"
+        elif previous.get('counters') == counters:
+            # 통계 뷰의 변경 행 수가 같으면 테이블을 스캔하지 않고 건너뜀
+            from_year_month, reason = None, None
+        else:
+            watermarks = fetch_emission_state(conn)
+            from_year_month, reason = find_changed_from_month(conn, previous.get('watermarks'), watermarks)
+
+        if reason is None:
+            logger.info("ℹ️  마지막 산정 이후 운행 기록과 차량 마스터가 바뀌지 않아 간접배출량 산정을 건너뜁니다.")
+            if watermarks is not None:
+                # 통계만 바뀐 경우(통계 초기화 등) 다음 실행에서 다시 스캔하지 않도록 변경 행 수를 갱신
+                save_emission_state({'counters': counters, 'watermarks': watermarks})
+        else:
+            if watermarks is None:
+                watermarks = fetch_emission_state(conn)
+            scope = f"{from_year_month}부터 증분 갱신" if from_year_month else "전체 재산정"
+            logger.info(f"ℹ️  {scope}합니다. (사유: {reason})")
+            if refresh_ev_monthly_emissions(conn, from_year_month=from_year_month) is not None \
+                    and refresh_ev_annual_emissions(conn, from_year=from_year_month // 100 if from_year_month else None) is not None:
+                # 결과 테이블은 방금 쓴 값으로 다시 읽어 기록 (다음 실행에서 다른 경로의 변경을 판별)
+                watermarks['bus_ev_monthly_emissions'] = list(fetch_table_watermarks(conn, ['bus_ev_monthly_emissions'])['bus_ev_monthly_emissions'])
+                save_emission_state({'counters': counters, 'watermarks': watermarks})
+
+        close_db_connection(conn)
+
+if __name__ == '__main__':
+    with track_stage():
+        main()
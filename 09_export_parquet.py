@@ -0,0 +1,294 @@
+import argparse
+import os
+import shutil
+import threading
+import time
+from io import BytesIO
+import psycopg2
+from psycopg2 import sql
+from db_config import db_connection_params
+from db_utils import connect_to_db, close_db_connection
+from metrics import track_stage
+from log_config import logger
+
+# Parquet 파일 기본 저장 폴더
+DEFAULT_OUTPUT_DIR = os.path.join('exports', 'parquet')
+
+# CSV를 Arrow 레코드 배치로 변환할 때 한 번에 읽는 바이트 수 (배치 크기)
+DEFAULT_BLOCK_SIZE_MB = 16
+
+# 내보낼 테이블: {테이블명: (SELECT 쿼리, 파티션 컬럼 목록)}
+# 파티션 컬럼은 쿼리에서 계산하여 Hive 방식 폴더(예: year=2023/)로 나눕니다.
+# 02, 04번 스크립트의 입력 테이블도 포함하여, 이 스냅샷만으로 DB 서버 없이 계산할 수 있습니다. (storage.py의 duckdb/sqlite 저장소)
+EXPORT_TABLES = {
+    'bus_vehicle_master': ("""
+        SELECT * FROM bus_vehicle_master ORDER BY vehicle_plate_no
+    """, []),
+    'bus_driving_records': ("""
+        SELECT
+            vehicle_plate_no,
+            year_month,
+            operating_days,
+            driving_distance_km,
+            fuel_quantity_l,
+            charging_amount_kwh,
+            year_month / 100 AS year
+        FROM bus_driving_records
+        ORDER BY year_month, vehicle_plate_no
+    """, ['year']),
+    'bus_monthly_fuel_data': ("""
+        SELECT
+            vehicle_plate_no,
+            record_year_month,
+            fuel_consumption_l,
+            distance_km,
+            record_year_month / 100 AS year
+        FROM bus_monthly_fuel_data
+        ORDER BY record_year_month, vehicle_plate_no
+    """, ['year']),
+    'bus_vehicle_lineage': ("""
+        SELECT * FROM bus_vehicle_lineage ORDER BY descendant_plate_no, depth
+    """, []),
+    'bus_monthly_quarantine': ("""
+        SELECT * FROM bus_monthly_quarantine ORDER BY record_year_month, vehicle_plate_no
+    """, []),
+    'bus_ev_annual_emissions': ("""
+        SELECT * FROM bus_ev_annual_emissions ORDER BY emission_year, vehicle_plate_no
+    """, []),
+    'bus_baseline_parameters': ("""
+        SELECT * FROM bus_baseline_parameters ORDER BY vehicle_plate_no
+    """, []),
+    'bus_emission_reductions': ("""
+        SELECT * FROM bus_emission_reductions ORDER BY calculated_year, vehicle_plate_no
+    """, ['calculated_year'])
+}
+
+def check_pyarrow():
+    """pyarrow 설치 여부를 확인하는 함수."""
+    try:
+        import pyarrow
+        return True
+    except ImportError:
+        logger.warning("⚠️ 'pyarrow' 라이브러리가 필요합니다. 'pip install pyarrow' 명령으로 설치 후 다시 실행해주세요.")
+        return False
+
+def arrow_schema_for_query(conn, query):
+    """
+    쿼리 결과 컬럼의 PostgreSQL 타입(OID)으로 Arrow 스키마를 만드는 함수.
+    - CSV 타입 추론을 쓰지 않으므로 스트리밍 모드에서도 배치마다 타입이 달라지지 않습니다.
+    """
+    import pyarrow as pa
+
+    pg_to_arrow = {
+        16: pa.bool_(),          # bool
+        20: pa.int64(),          # int8
+        21: pa.int16(),          # int2
+        23: pa.int32(),          # int4
+        700: pa.float32(),       # float4
+        701: pa.float64(),       # float8
+        1700: pa.float64(),      # numeric
+        1082: pa.date32(),       # date
+        1114: pa.timestamp('us'),                 # timestamp
+        1184: pa.timestamp('us', tz='UTC'),       # timestamptz
+    }
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("SELECT * FROM ({query}) AS q LIMIT 0").format(query=sql.SQL(query)))
+        fields = [pa.field(desc[0], pg_to_arrow.get(desc[1], pa.string())) for desc in cur.description]
+    conn.rollback()
+    return pa.schema(fields)
+
+def _csv_options(schema, block_size):
+    """COPY CSV 출력을 읽기 위한 pyarrow CSV 옵션을 만드는 함수."""
+    from pyarrow import csv
+
+    read_options = csv.ReadOptions(block_size=block_size)
+    # COPY CSV는 NULL을 따옴표 없는 빈 값으로, 빈 문자열은 ""로 출력하므로 둘을 구분하여 읽음
+    convert_options = csv.ConvertOptions(
+        column_types={field.name: field.type for field in schema},
+        null_values=[''],
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=False
+    )
+    return read_options, convert_options
+
+class _CountingWriter:
+    """copy_expert가 쓰는 바이트 수를 세면서 대상 파일로 전달하는 래퍼."""
+
+    def __init__(self, target):
+        self.target = target
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self.target.write(data)
+
+def _copy_query(query):
+    """SELECT 쿼리를 CSV(머리글 포함) COPY TO STDOUT 문으로 감싸는 함수."""
+    return sql.SQL("COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)").format(query=sql.SQL(query))
+
+def _write_dataset(data, output_dir, schema, partition_cols):
+    """Arrow 테이블 또는 레코드 배치 리더를 (파티션별) Parquet 파일로 저장하는 함수."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partitioning = None
+    if partition_cols:
+        partitioning = ds.partitioning(pa.schema([schema.field(col) for col in partition_cols]), flavor='hive')
+    ds.write_dataset(
+        data, output_dir, format='parquet', partitioning=partitioning,
+        existing_data_behavior='overwrite_or_ignore',
+        basename_template='part-{i}.parquet'
+    )
+
+def _replace_directory(staging_dir, target_dir):
+    """
+    임시 폴더에 다 쓴 결과로 대상 폴더를 교체하는 함수. (이전 폴더는 옆으로 옮긴 뒤 삭제)
+    - 임시 폴더가 없으면(저장할 행이 없음) 대상 폴더만 지웁니다.
+    """
+    previous_dir = f"{staging_dir}.old"
+    if os.path.exists(target_dir):
+        os.replace(target_dir, previous_dir)
+    try:
+        if os.path.exists(staging_dir):
+            os.replace(staging_dir, target_dir)
+    except OSError:
+        # 교체에 실패하면 이전 폴더를 되돌려 둠
+        if os.path.exists(previous_dir):
+            os.replace(previous_dir, target_dir)
+        raise
+    shutil.rmtree(previous_dir, ignore_errors=True)
+
+def export_table(conn, table_name, query, partition_cols, output_dir, streaming=False,
+                 block_size_mb=DEFAULT_BLOCK_SIZE_MB):
+    """
+    테이블 1개를 COPY ... TO STDOUT (CSV)으로 받아 Arrow로 바로 디코딩하고 Parquet으로 저장하는 함수.
+    - 파이썬 행 객체나 pandas object 컬럼을 거치지 않고, COPY 바이트를 pyarrow CSV 리더가 컬럼 배열로 변환합니다.
+    - 일반 모드: COPY 결과 전체를 메모리 버퍼에 받은 뒤 한 번에 변환합니다.
+    - 스트리밍 모드: COPY를 별도 스레드에서 파이프로 흘려보내고, 블록 단위 레코드 배치로 읽으면서 저장합니다.
+      (메모리 사용량이 테이블 크기와 관계없이 block_size_mb 수준으로 유지됩니다.)
+    - 같은 폴더 안의 임시 폴더에 저장한 뒤 성공했을 때만 테이블 폴더를 교체하므로, 실패해도 이전 스냅샷이 남습니다.
+    :return: {'table', 'rows', 'bytes', 'seconds', 'mb_per_sec'} (실패 시 None)
+    """
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as ds
+
+    table_dir = os.path.join(output_dir, table_name)
+    # 점으로 시작하는 임시 폴더는 스냅샷 테이블로 인식되지 않음 (storage.load_snapshot)
+    staging_dir = os.path.join(output_dir, f".{table_name}.tmp-{os.getpid()}")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    try:
+        schema = arrow_schema_for_query(conn, query)
+        read_options, convert_options = _csv_options(schema, block_size_mb * 1024 * 1024)
+        copy_query = _copy_query(query).as_string(conn)
+        logger.info(f"⏳ '{table_name}' 테이블을 내보냅니다... (방식: {'스트리밍' if streaming else '일괄'})")
+        started = time.perf_counter()
+
+        if streaming:
+            read_fd, write_fd = os.pipe()
+            reader_file = os.fdopen(read_fd, 'rb')
+            writer = _CountingWriter(os.fdopen(write_fd, 'wb'))
+            copy_error = []
+
+            def run_copy():
+                try:
+                    with conn.cursor() as cur:
+                        cur.copy_expert(copy_query, writer)
+                except Exception as e:
+                    copy_error.append(e)
+                finally:
+                    writer.target.close()
+
+            copy_thread = threading.Thread(target=run_copy, daemon=True)
+            copy_thread.start()
+            try:
+                batches = pacsv.open_csv(reader_file, read_options=read_options, convert_options=convert_options)
+                _write_dataset(batches, staging_dir, schema, partition_cols)
+            finally:
+                reader_file.close()
+                copy_thread.join()
+            if copy_error:
+                raise copy_error[0]
+            bytes_copied = writer.bytes_written
+        else:
+            buffer = BytesIO()
+            writer = _CountingWriter(buffer)
+            with conn.cursor() as cur:
+                cur.copy_expert(copy_query, writer)
+            buffer.seek(0)
+            table = pacsv.read_csv(buffer, read_options=read_options, convert_options=convert_options)
+            _write_dataset(table, staging_dir, schema, partition_cols)
+            bytes_copied = writer.bytes_written
+
+        conn.rollback()
+        elapsed = time.perf_counter() - started
+        rows = ds.dataset(staging_dir, format='parquet').count_rows() if os.path.exists(staging_dir) else 0
+        _replace_directory(staging_dir, table_dir)
+    except Exception as e:
+        kind = "DB 오류" if isinstance(e, psycopg2.Error) else "오류"
+        logger.error(f"❌ '{table_name}' 내보내기 중 {kind} 발생: {e}")
+        conn.rollback()
+        # 일부만 저장된 임시 폴더만 정리하고 이전 스냅샷은 그대로 둠
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return None
+
+    mb = bytes_copied / (1024 * 1024)
+    metrics = {
+        'table': table_name,
+        'rows': rows,
+        'bytes': bytes_copied,
+        'seconds': round(elapsed, 4),
+        'mb_per_sec': round(mb / elapsed, 2) if elapsed > 0 else None
+    }
+    logger.info(f"✅ '{table_name}' {rows}행 저장 완료: {table_dir}")
+    logger.info(f"⏱️  '{table_name}' COPY {mb:.2f}MB / {elapsed:.3f}초 = {metrics['mb_per_sec']} MB/s")
+    return metrics
+
+def export_all(db_params, tables=None, output_dir=DEFAULT_OUTPUT_DIR, streaming=False,
+               block_size_mb=DEFAULT_BLOCK_SIZE_MB):
+    """
+    EXPORT_TABLES의 테이블들을 Parquet으로 내보내는 함수.
+    :param tables: 내보낼 테이블명 목록 (None이면 전체)
+    :return: 테이블별 결과 목록 (연결 실패 시 None)
+    """
+    if not check_pyarrow(): return None
+    conn = connect_to_db(db_params)
+    if not conn: return None
+
+    results = []
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        started = time.perf_counter()
+        for table_name in tables or EXPORT_TABLES:
+            query, partition_cols = EXPORT_TABLES[table_name]
+            result = export_table(conn, table_name, query, partition_cols, output_dir,
+                                  streaming=streaming, block_size_mb=block_size_mb)
+            if result:
+                results.append(result)
+
+        elapsed = time.perf_counter() - started
+        total_mb = sum(r['bytes'] for r in results) / (1024 * 1024)
+        logger.info(f"⏱️  전체 {len(results)}개 테이블, {total_mb:.2f}MB / {elapsed:.3f}초 = "
+                    f"{total_mb / elapsed if elapsed > 0 else 0:.2f} MB/s")
+        return results
+    finally:
+        close_db_connection(conn)
+
+def main():
+    """메인 실행 함수."""
+    parser = argparse.ArgumentParser(description="분석용 Parquet 내보내기 (COPY -> Arrow -> Parquet)")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help=f"저장 폴더 (기본값: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('--tables', nargs='+', choices=list(EXPORT_TABLES), help="내보낼 테이블 (기본값: 전체)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="COPY 출력을 파이프로 받아 블록 단위로 변환/저장하는 저메모리 모드로 실행합니다.")
+    parser.add_argument('--block-size-mb', type=int, default=DEFAULT_BLOCK_SIZE_MB,
+                        help=f"Arrow 레코드 배치 1개로 읽는 CSV 크기(MB) (기본값: {DEFAULT_BLOCK_SIZE_MB})")
+    args = parser.parse_args()
+
+    logger.info("--- [파일 9] 분석용 Parquet 내보내기 시작 ---")
+    export_all(db_connection_params, tables=args.tables, output_dir=args.output_dir,
+               streaming=args.streaming, block_size_mb=args.block_size_mb)
+
+if __name__ == '__main__':
+    with track_stage():
+        main()
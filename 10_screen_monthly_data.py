@@ -0,0 +1,217 @@
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from storage import add_storage_arguments, open_storage_from_args
+from metrics import track_stage, track_step
+from log_config import logger, log_event
+
+# 검사에서 걸린 월별 행을 저장하는 격리 테이블 (02번 스크립트가 베이스라인 계산에서 제외)
+QUARANTINE_TABLE = 'bus_monthly_quarantine'
+QUARANTINE_KEY_COLS = ['vehicle_plate_no', 'record_year_month']
+
+# 검사에 사용하는 bus_monthly_fuel_data 컬럼 (다른 컬럼은 읽지 않음)
+SCREENING_COLUMNS = ['vehicle_plate_no', 'record_year_month', 'fuel_consumption_l', 'distance_km']
+
+# 검사 항목: {비트: (이름, 설명)}. 한 행이 여러 검사에 걸리면 비트를 OR로 합쳐 flags에 저장합니다.
+FLAG_FLEET_BOUNDS = 1
+FLAG_ROBUST_OUTLIER = 2
+FLAG_DISTANCE_SPIKE = 4
+FLAG_INVALID_MONTH = 8
+FLAG_FUTURE_MONTH = 16
+FLAG_OPERATING_DAYS = 32
+FLAG_DAILY_DISTANCE = 64
+CHECKS = {
+    FLAG_FLEET_BOUNDS: ('fleet_bounds', "km당 연료 소비량이 연료 종류별 물리적 범위를 벗어남"),
+    FLAG_ROBUST_OUTLIER: ('robust_outlier', "km당 연료 소비량이 차량 자체 분포(중앙값/MAD)에서 크게 벗어남"),
+    FLAG_DISTANCE_SPIKE: ('distance_spike', "주행거리가 차량 중앙값의 5배 이상"),
+    FLAG_INVALID_MONTH: ('invalid_month', "운행년월의 월이 1~12가 아님"),
+    FLAG_FUTURE_MONTH: ('future_month', "운행년월이 현재 월 이후"),
+    FLAG_OPERATING_DAYS: ('operating_days', "운행일수가 해당 월의 일수를 초과"),
+    FLAG_DAILY_DISTANCE: ('daily_distance', "운행일당 주행거리가 상한을 초과")
+}
+
+# 연료 종류별 km당 연료 소비량의 물리적 범위 (경유: L/km, CNG: kg/km)
+FUEL_PER_KM_BOUNDS = {
+    '경유': (0.15, 1.2),
+    'CNG': (0.15, 1.5)
+}
+
+# 차량별 수정 z 점수(0.6745 * (x - 중앙값) / MAD)의 이상치 기준 (Iglewicz-Hoaglin 권장값)
+ROBUST_Z_THRESHOLD = 3.5
+MAD_SCALE = 0.6745
+# 차량별 통계(중앙값/MAD, 주행거리 급증)를 적용할 최소 측정 개월 수 (개월 수가 적으면 중앙값이 불안정)
+MIN_MONTHS_FOR_VEHICLE_STATS = 6
+# 차량 주행거리 중앙값 대비 이 배수 이상이면 급증으로 판단
+DISTANCE_SPIKE_RATIO = 5.0
+# 운행일당 주행거리 상한 (km)
+MAX_DAILY_DISTANCE_KM = 800.0
+
+# 월별 일수 (2월은 윤년에 29일로 보정)
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+def days_in_month(year_month):
+    """정수 YYYYMM 배열의 월별 일수를 반환하는 함수. (월이 1~12가 아니면 0)"""
+    year, month = year_month // 100, year_month % 100
+    valid = (month >= 1) & (month <= 12)
+    days = np.where(valid, DAYS_IN_MONTH[np.clip(month, 1, 12) - 1], 0)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    return days + ((month == 2) & leap)
+
+def _vehicle_medians(codes, **columns):
+    """
+    차량 코드별 중앙값을 각 행에 펼쳐 반환하는 함수. (NaN은 제외하고 계산)
+    여러 컬럼을 한 번의 groupby로 계산하여 그룹 분할 비용을 한 번만 냅니다.
+    :return: {컬럼명: 행별 중앙값 배열}
+    """
+    medians = pd.DataFrame(columns).groupby(codes).median()
+    return {name: medians[name].to_numpy()[codes] for name in columns}
+
+def _vehicle_counts(codes, mask, vehicle_count):
+    """차량 코드별로 mask가 True인 행 수를 각 행에 펼쳐 반환하는 함수."""
+    return np.bincount(codes, weights=mask, minlength=vehicle_count)[codes]
+
+def screen_monthly_rows(fuel_df, vehicle_master_df, operating_days=None, current_year_month=None):
+    """
+    월별 연료 데이터 전체를 한 번의 벡터 연산으로 검사하는 함수. (행 단위 파이썬 반복 없음)
+    - 연료/거리가 모두 양수인 행만 연료 검사(범위, 중앙값/MAD)를 하고, 달력 검사는 모든 행에 적용합니다.
+    - 차량번호는 정수 코드로 바꿔 groupby하므로 수천만 행에서도 문자열 비교 비용이 없습니다.
+    :param fuel_df: bus_monthly_fuel_data (vehicle_plate_no, record_year_month, fuel_consumption_l, distance_km)
+    :param vehicle_master_df: bus_vehicle_master (vehicle_plate_no, original_fuel_type)
+    :param operating_days: fuel_df와 같은 순서의 운행일수 배열 (None이면 운행일수 검사 생략)
+    :param current_year_month: 현재 운행년월 (정수 YYYYMM, None이면 오늘 기준)
+    :return: fuel_df와 같은 순서의 DataFrame (flags, fuel_per_km, robust_z, distance_ratio)
+    """
+    current_year_month = current_year_month or int(datetime.now().strftime('%Y%m'))
+    codes, plates = pd.factorize(fuel_df['vehicle_plate_no'])
+    year_month = fuel_df['record_year_month'].to_numpy(dtype=np.int64)
+    fuel = pd.to_numeric(fuel_df['fuel_consumption_l'], errors='coerce').to_numpy(dtype=float)
+    distance = pd.to_numeric(fuel_df['distance_km'], errors='coerce').to_numpy(dtype=float)
+    flags = np.zeros(len(fuel_df), dtype=np.int64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        measured = (fuel > 0) & (distance > 0)
+        fuel_per_km = np.where(measured, fuel / distance, np.nan)
+
+        # 1. 연료 종류별 물리적 범위 (차량별 연료 종류를 코드 순서로 만든 뒤 행으로 펼침)
+        fuel_types = pd.Series(plates).map(vehicle_master_df.set_index('vehicle_plate_no')['original_fuel_type'])
+        lower = fuel_types.map({fuel_type: bounds[0] for fuel_type, bounds in FUEL_PER_KM_BOUNDS.items()}).to_numpy(dtype=float)[codes]
+        upper = fuel_types.map({fuel_type: bounds[1] for fuel_type, bounds in FUEL_PER_KM_BOUNDS.items()}).to_numpy(dtype=float)[codes]
+        flags |= np.where(measured & ((fuel_per_km < lower) | (fuel_per_km > upper)), FLAG_FLEET_BOUNDS, 0)
+
+        # 2. 차량별 중앙값/MAD 기반 수정 z 점수 (주행거리 중앙값도 같은 groupby에서 계산)
+        positive_distance = np.where(distance > 0, distance, np.nan)
+        medians = _vehicle_medians(codes, fuel_per_km=fuel_per_km, distance=positive_distance)
+        deviation = np.abs(fuel_per_km - medians['fuel_per_km'])
+        mad = _vehicle_medians(codes, deviation=deviation)['deviation']
+        enough_months = _vehicle_counts(codes, measured, len(plates)) >= MIN_MONTHS_FOR_VEHICLE_STATS
+        robust_z = np.where(enough_months & (mad > 0), MAD_SCALE * (fuel_per_km - medians['fuel_per_km']) / mad, np.nan)
+        flags |= np.where(np.abs(robust_z) > ROBUST_Z_THRESHOLD, FLAG_ROBUST_OUTLIER, 0)
+
+        # 3. 차량 주행거리 중앙값 대비 급증
+        enough_distance_months = _vehicle_counts(codes, distance > 0, len(plates)) >= MIN_MONTHS_FOR_VEHICLE_STATS
+        distance_ratio = np.where(enough_distance_months, positive_distance / medians['distance'], np.nan)
+        flags |= np.where(distance_ratio >= DISTANCE_SPIKE_RATIO, FLAG_DISTANCE_SPIKE, 0)
+
+        # 4. 달력 검사
+        month_days = days_in_month(year_month)
+        flags |= np.where(month_days == 0, FLAG_INVALID_MONTH, 0)
+        flags |= np.where(year_month > current_year_month, FLAG_FUTURE_MONTH, 0)
+        if operating_days is not None:
+            days = np.asarray(operating_days, dtype=float)
+            flags |= np.where((month_days > 0) & (days > month_days), FLAG_OPERATING_DAYS, 0)
+            flags |= np.where((days > 0) & (distance / days > MAX_DAILY_DISTANCE_KM), FLAG_DAILY_DISTANCE, 0)
+
+    return pd.DataFrame({
+        'flags': flags,
+        'fuel_per_km': fuel_per_km,
+        'robust_z': robust_z,
+        'distance_ratio': distance_ratio
+    }, index=fuel_df.index)
+
+def describe_flags(flags):
+    """flags 배열을 검사 이름 목록 문자열(예: 'fleet_bounds,robust_outlier')로 바꾸는 함수. (서로 다른 값만 한 번씩 변환)"""
+    unique_flags, inverse = np.unique(flags, return_inverse=True)
+    names = np.array([
+        ','.join(name for bit, (name, _) in CHECKS.items() if value & bit) for value in unique_flags
+    ], dtype=object)
+    return names[inverse]
+
+def build_quarantine(fuel_df, scores):
+    """검사에서 걸린 행만 격리 테이블 형식으로 만드는 함수."""
+    flagged = scores['flags'].to_numpy() != 0
+    quarantine_df = fuel_df.loc[flagged, QUARANTINE_KEY_COLS].copy()
+    flagged_scores = scores.loc[flagged]
+    quarantine_df['flags'] = flagged_scores['flags'].astype(int)
+    quarantine_df['reasons'] = describe_flags(flagged_scores['flags'].to_numpy())
+    quarantine_df['fuel_per_km'] = flagged_scores['fuel_per_km'].round(6)
+    quarantine_df['robust_z'] = flagged_scores['robust_z'].round(3)
+    quarantine_df['distance_ratio'] = flagged_scores['distance_ratio'].round(3)
+    return quarantine_df.reset_index(drop=True)
+
+def log_screening_summary(fuel_df, scores, quarantine_df):
+    """검사 항목별 건수와 격리 행/차량 수를 로그와 구조화 이벤트(screening.summary)로 남기는 함수."""
+    flags = scores['flags'].to_numpy()
+    counts = {name: int(np.count_nonzero(flags & bit)) for bit, (name, _) in CHECKS.items()}
+    lines = '\n'.join(f"   - {name}: {counts[name]}건 ({description})" for name, description in CHECKS.values())
+    vehicles = quarantine_df['vehicle_plate_no'].nunique()
+    log_event('screening.summary',
+              f"✅ 월별 데이터 검사 완료: {len(fuel_df)}행 중 {len(quarantine_df)}행 격리 (차량 {vehicles}대)\n{lines}",
+              rows_screened=len(fuel_df), rows_quarantined=len(quarantine_df), vehicles=vehicles, checks=counts)
+
+def main():
+    """메인 실행 함수."""
+    parser = argparse.ArgumentParser(description="월별 연료 데이터 품질 검사 및 격리")
+    add_storage_arguments(parser)
+    parser.add_argument('--dry-run', action='store_true', help="검사 결과만 출력하고 격리 테이블은 변경하지 않습니다.")
+    args = parser.parse_args()
+
+    logger.info("--- [파일 10] 월별 연료 데이터 품질 검사 시작 ---")
+
+    # 저장소: 기본은 PostgreSQL(db_config.py), --storage duckdb/sqlite로 DB 서버 없이 스냅샷에서 검사
+    storage = open_storage_from_args(args)
+    if not storage:
+        return
+
+    with storage:
+        # 검사에 쓰는 컬럼만 읽음 (PostgreSQL은 서버 측 커서로 청크 단위로 받음)
+        fuel_df = storage.load_table('bus_monthly_fuel_data', columns=SCREENING_COLUMNS)
+        vehicle_master_df = storage.load_table('bus_vehicle_master', columns=['vehicle_plate_no', 'original_fuel_type'])
+        if fuel_df.empty or vehicle_master_df.empty:
+            logger.warning("⚠️ 필요한 데이터(월별 연료 기록 또는 차량 마스터)가 없습니다. 01번 스크립트를 먼저 실행해주세요.")
+            return
+
+        # 운행일수는 운행기록 테이블에만 있으므로 같은 키로 붙임 (테이블이 없으면 운행일수 검사 생략)
+        operating_days = None
+        if storage.has_table('bus_driving_records'):
+            driving_df = storage.load_table('bus_driving_records', columns=['vehicle_plate_no', 'year_month', 'operating_days'])
+            if not driving_df.empty:
+                operating_days = fuel_df[['vehicle_plate_no', 'record_year_month']].merge(
+                    driving_df.rename(columns={'year_month': 'record_year_month'}).drop_duplicates(QUARANTINE_KEY_COLS),
+                    on=['vehicle_plate_no', 'record_year_month'], how='left'
+                )['operating_days'].to_numpy(dtype=float)
+        else:
+            logger.warning("⚠️ 'bus_driving_records' 테이블이 없어 운행일수 검사를 생략합니다.")
+
+        compute_step = track_step('compute', 'screening', rows_in=len(fuel_df))
+        scores = screen_monthly_rows(fuel_df, vehicle_master_df, operating_days)
+        quarantine_df = build_quarantine(fuel_df, scores)
+        compute_step.finish(rows_out=len(quarantine_df))
+        log_screening_summary(fuel_df, scores, quarantine_df)
+
+        if not quarantine_df.empty:
+            logger.info(f"[격리된 월별 데이터 (상위 10개 행)]\n{quarantine_df.head(10).to_string()}")
+        if args.dry_run:
+            logger.info("ℹ️  --dry-run: 격리 테이블을 변경하지 않습니다.")
+            return
+
+        # 이번 검사 결과로 격리 테이블을 맞춤: 걸린 행은 저장(값이 같으면 변경 없음), 더 이상 걸리지 않는 이전 행은 삭제
+        # 저장과 삭제는 한 트랜잭션이므로, 저장이 실패하면 이전 격리 행이 그대로 남아 베이스라인에서 계속 제외됩니다.
+        if storage.sync(QUARANTINE_TABLE, quarantine_df, key_cols=QUARANTINE_KEY_COLS, label='격리') is None:
+            logger.critical("❌ 격리 테이블을 갱신하지 못했습니다. 베이스라인 계산 전에 원인을 확인해주세요.")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    with track_stage():
+        main()
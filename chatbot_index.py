@@ -0,0 +1,345 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+import numpy as np
+
+# 색인 대상 문서 (챗봇 지식 기반 + 개발/ERD/테스트 문서)
+SOURCE_FILES = [
+    '00_chatbot_embeddings.md',
+    '00_develop.md',
+    '00_db_erd.md',
+    '00_test_scenario.md'
+]
+
+# 색인 저장 폴더
+DEFAULT_INDEX_DIR = '.chatbot_index'
+
+# 해시 특징 공간의 크기 (2의 거듭제곱). 토큰은 crc32 해시로 이 범위의 정수 ID에 대응됩니다.
+N_FEATURES = 2 ** 18
+
+# 청크 한 개의 최대 글자 수 (제목이 바뀌거나 Q&A가 새로 시작되면 이보다 짧아도 나눔)
+MAX_CHUNK_CHARS = 600
+
+# 색인 형식이 바뀌면 올려서 기존 캐시를 모두 다시 만들도록 함
+INDEX_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9_]+|[가-힣]+')
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*)$')
+
+def tokenize(text):
+    """
+    문서/질의 텍스트를 검색용 토큰으로 나누는 함수.
+    - 영문/숫자/밑줄 단어는 소문자 그대로 사용하고, 밑줄로 이어진 식별자는 각 부분도 토큰으로 추가합니다.
+    - 한글은 형태소 분석기 없이 조사/어미 변화에 강하도록 글자 2-gram으로 나눕니다.
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        word = match.group()
+        if word[0] >= '가':
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+            if '_' in word:
+                tokens.extend(part for part in word.split('_') if part)
+    return tokens
+
+def hash_features(tokens):
+    """토큰 목록을 (특징 ID 배열, 빈도 배열)로 변환하는 함수. 특징 ID는 실행 환경과 무관한 crc32 해시입니다."""
+    if not tokens:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    ids = np.fromiter((zlib.crc32(token.encode('utf-8')) & (N_FEATURES - 1) for token in tokens),
+                      dtype=np.int32, count=len(tokens))
+    features, counts = np.unique(ids, return_counts=True)
+    return features.astype(np.int32), counts.astype(np.float32)
+
+def chunk_markdown(text, source):
+    """
+    마크다운 문서를 제목(heading) 단위로 나누고, 긴 구간은 문단 단위로 MAX_CHUNK_CHARS 이하로 다시 나누는 함수.
+    - '**Q:**'로 시작하는 문단은 새 청크로 시작하여 Q&A 한 쌍이 한 청크가 되도록 합니다.
+    - 코드 블록 안의 빈 줄에서는 나누지 않습니다.
+    :return: [{'source', 'heading', 'text'}] 목록
+    """
+    chunks = []
+    headings = []
+    paragraphs, paragraph = [], []
+    in_fence = False
+
+    def flush_paragraph():
+        if paragraph:
+            paragraphs.append('\n'.join(paragraph).strip())
+            paragraph.clear()
+
+    def flush_chunk():
+        flush_paragraph()
+        body = '\n\n'.join(p for p in paragraphs if p)
+        if body:
+            chunks.append({'source': source, 'heading': ' > '.join(headings), 'text': body})
+        paragraphs.clear()
+
+    for line in text.splitlines():
+        if line.strip().startswith('```'):
+            in_fence = not in_fence
+        heading = None if in_fence else HEADING_PATTERN.match(line)
+        if heading:
+            flush_chunk()
+            level = len(heading.group(1))
+            del headings[level - 1:]
+            headings.extend([''] * (level - 1 - len(headings)))
+            headings.append(heading.group(2).strip())
+            continue
+        if not line.strip() and not in_fence:
+            flush_paragraph()
+            continue
+        if not paragraph and (line.startswith('**Q:**') or sum(len(p) for p in paragraphs) + len(line) > MAX_CHUNK_CHARS):
+            flush_chunk()
+        paragraph.append(line)
+    flush_chunk()
+    return [chunk for chunk in chunks if chunk['text'].strip('-* \n')]
+
+def _file_sha256(path):
+    """파일 내용의 SHA-256 해시를 반환하는 함수."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _cache_paths(index_dir, source):
+    """원본 파일별 청크/특징 캐시 파일 경로를 반환하는 함수."""
+    name = re.sub(r'[^0-9A-Za-z_.-]+', '_', source)
+    files_dir = os.path.join(index_dir, 'files')
+    return os.path.join(files_dir, f'{name}.json'), os.path.join(files_dir, f'{name}.npz')
+
+def _load_manifest(index_dir):
+    """색인 매니페스트를 읽는 함수. 없거나 형식 버전이 다르면 빈 매니페스트를 반환합니다."""
+    path = os.path.join(index_dir, 'manifest.json')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == INDEX_VERSION and manifest.get('n_features') == N_FEATURES:
+            return manifest
+    return {'version': INDEX_VERSION, 'n_features': N_FEATURES, 'files': {}}
+
+def _index_file(source, index_dir):
+    """
+    원본 파일 1개를 청크로 나누고 청크별 해시 특징을 계산하여 캐시 파일로 저장하는 함수.
+    :return: (청크 목록, 청크 경계 배열, 특징 ID 배열, 빈도 배열)
+    """
+    with open(source, encoding='utf-8') as f:
+        chunks = chunk_markdown(f.read(), source)
+
+    indptr, features, counts = [0], [], []
+    for chunk in chunks:
+        ids, tf = hash_features(tokenize(f"{chunk['heading']}\n{chunk['text']}"))
+        features.append(ids)
+        counts.append(tf)
+        indptr.append(indptr[-1] + len(ids))
+    indptr = np.asarray(indptr, dtype=np.int64)
+    features = np.concatenate(features) if features else np.empty(0, dtype=np.int32)
+    counts = np.concatenate(counts) if counts else np.empty(0, dtype=np.float32)
+
+    chunks_path, features_path = _cache_paths(index_dir, source)
+    with open(chunks_path, 'w', encoding='utf-8') as f:
+        json.dump(chunks, f, ensure_ascii=False)
+    np.savez(features_path, indptr=indptr, features=features, counts=counts)
+    return chunks, indptr, features, counts
+
+def _load_cached_file(source, index_dir):
+    """캐시된 파일별 청크/특징을 읽는 함수."""
+    chunks_path, features_path = _cache_paths(index_dir, source)
+    with open(chunks_path, encoding='utf-8') as f:
+        chunks = json.load(f)
+    cached = np.load(features_path)
+    return chunks, cached['indptr'], cached['features'], cached['counts']
+
+def build_index(sources=SOURCE_FILES, index_dir=DEFAULT_INDEX_DIR, force=False):
+    """
+    문서들로 TF-IDF 해시 벡터 색인과 역색인을 만들어 index_dir에 .npy 파일로 저장하는 함수.
+    - 내용 해시가 바뀐 파일만 다시 청크로 나누고 토큰화하며, 나머지는 파일별 캐시를 재사용합니다.
+    - IDF와 역색인은 전체 청크에 의존하므로 캐시된 특징으로부터 numpy 연산으로 다시 합칩니다. (토큰화 없음)
+    :param force: True이면 모든 파일을 다시 색인
+    :return: 전체 청크 수
+    """
+    started = time.perf_counter()
+    os.makedirs(os.path.join(index_dir, 'files'), exist_ok=True)
+    manifest = _load_manifest(index_dir)
+    new_manifest = {'version': INDEX_VERSION, 'n_features': N_FEATURES, 'files': {}}
+
+    all_chunks, chunk_ids, features, counts = [], [], [], []
+    for source in sources:
+        if not os.path.exists(source):
+            print(f"⚠️ '{source}' 파일이 없어 색인에서 제외합니다.")
+            continue
+        digest = _file_sha256(source)
+        previous = manifest['files'].get(source)
+        cache_exists = all(os.path.exists(path) for path in _cache_paths(index_dir, source))
+        if not force and previous and previous['sha256'] == digest and cache_exists:
+            chunks, indptr, file_features, file_counts = _load_cached_file(source, index_dir)
+            print(f"ℹ️ '{source}' 변경 없음: 캐시된 청크 {len(chunks)}개를 재사용합니다.")
+        else:
+            chunks, indptr, file_features, file_counts = _index_file(source, index_dir)
+            print(f"✅ '{source}'를 청크 {len(chunks)}개로 다시 색인했습니다.")
+
+        # 파일 내 청크 번호를 전체 청크 번호로 변환
+        offset = len(all_chunks)
+        chunk_ids.append(np.repeat(np.arange(offset, offset + len(chunks), dtype=np.int32), np.diff(indptr)))
+        features.append(file_features)
+        counts.append(file_counts)
+        all_chunks.extend(chunks)
+        new_manifest['files'][source] = {'sha256': digest, 'chunk_start': offset, 'chunk_count': len(chunks)}
+
+    chunk_ids = np.concatenate(chunk_ids) if chunk_ids else np.empty(0, dtype=np.int32)
+    features = np.concatenate(features) if features else np.empty(0, dtype=np.int32)
+    counts = np.concatenate(counts) if counts else np.empty(0, dtype=np.float32)
+    n_chunks = len(all_chunks)
+
+    # --- TF-IDF 가중치 (부드러운 IDF, 로그 TF, 청크별 L2 정규화) ---
+    doc_freq = np.bincount(features, minlength=N_FEATURES)
+    idf = (np.log((1 + n_chunks) / (1 + doc_freq)) + 1).astype(np.float32)
+    weights = (1 + np.log(counts)) * idf[features]
+    norms = np.sqrt(np.bincount(chunk_ids, weights=weights ** 2, minlength=n_chunks))
+    weights = (weights / np.where(norms > 0, norms, 1)[chunk_ids]).astype(np.float32)
+
+    # --- 역색인 (특징 ID별 청크 목록): 질의에 포함된 특징의 목록만 읽어 후보를 좁힘 ---
+    order = np.argsort(features, kind='stable')
+    inv_indptr = np.zeros(N_FEATURES + 1, dtype=np.int64)
+    inv_indptr[1:] = np.cumsum(doc_freq)
+
+    np.save(os.path.join(index_dir, 'idf.npy'), idf)
+    np.save(os.path.join(index_dir, 'inv_indptr.npy'), inv_indptr)
+    np.save(os.path.join(index_dir, 'inv_chunks.npy'), chunk_ids[order])
+    np.save(os.path.join(index_dir, 'inv_weights.npy'), weights[order])
+    with open(os.path.join(index_dir, 'chunks.json'), 'w', encoding='utf-8') as f:
+        json.dump(all_chunks, f, ensure_ascii=False)
+    new_manifest['n_chunks'] = n_chunks
+    with open(os.path.join(index_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(new_manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ 색인 저장 완료: 청크 {n_chunks}개, 특징 {int((doc_freq > 0).sum())}개 ({index_dir})")
+    print(f"⏱️  색인 소요 시간: {time.perf_counter() - started:.3f}초")
+    return n_chunks
+
+def stale_sources(index_dir=DEFAULT_INDEX_DIR, sources=SOURCE_FILES):
+    """색인 이후 내용이 바뀌었거나 새로 생긴 원본 파일 목록을 반환하는 함수."""
+    manifest = _load_manifest(index_dir)
+    return [
+        source for source in sources
+        if os.path.exists(source) and manifest['files'].get(source, {}).get('sha256') != _file_sha256(source)
+    ]
+
+class ChatbotIndex:
+    """
+    build_index로 만든 색인을 메모리 맵(.npy mmap)으로 열어 top-k 검색을 하는 클래스.
+    - 배열은 필요한 부분만 OS 페이지 캐시에서 읽으므로, 여러 프로세스가 같은 색인을 적은 메모리로 공유할 수 있습니다.
+    """
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        self.idf = np.load(os.path.join(index_dir, 'idf.npy'), mmap_mode='r')
+        self.inv_indptr = np.load(os.path.join(index_dir, 'inv_indptr.npy'), mmap_mode='r')
+        self.inv_chunks = np.load(os.path.join(index_dir, 'inv_chunks.npy'), mmap_mode='r')
+        self.inv_weights = np.load(os.path.join(index_dir, 'inv_weights.npy'), mmap_mode='r')
+        with open(os.path.join(index_dir, 'chunks.json'), encoding='utf-8') as f:
+            self.chunks = json.load(f)
+
+    def search(self, query, k=5):
+        """
+        질의와 코사인 유사도가 높은 청크 k개를 반환하는 함수.
+        :return: [(점수, 청크 번호, {'source', 'heading', 'text'})] 목록 (점수 내림차순)
+        """
+        features, counts = hash_features(tokenize(query))
+        if len(features) == 0 or not self.chunks:
+            return []
+        query_weights = (1 + np.log(counts)) * self.idf[features]
+        query_weights /= np.linalg.norm(query_weights) or 1
+
+        candidate_ids, candidate_scores = [], []
+        for feature, weight in zip(features, query_weights):
+            start, end = self.inv_indptr[feature], self.inv_indptr[feature + 1]
+            if start == end:
+                continue
+            candidate_ids.append(self.inv_chunks[start:end])
+            candidate_scores.append(self.inv_weights[start:end] * weight)
+        if not candidate_ids:
+            return []
+
+        scores = np.bincount(np.concatenate(candidate_ids), weights=np.concatenate(candidate_scores),
+                             minlength=len(self.chunks))
+        k = min(k, int((scores > 0).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(i), self.chunks[i]) for i in top]
+
+def run_benchmark(index, sources=SOURCE_FILES, repeat=20):
+    """
+    챗봇 문서의 질문(**Q:**)들로 검색 지연 시간과 정확도(질문이 포함된 청크가 1위인 비율)를 측정하는 함수.
+    """
+    questions = []
+    for source in sources:
+        if os.path.exists(source):
+            with open(source, encoding='utf-8') as f:
+                questions.extend(line[len('**Q:**'):].strip() for line in f if line.startswith('**Q:**'))
+    if not questions:
+        print("⚠️ 벤치마크에 사용할 질문(**Q:**)이 없습니다.")
+        return
+
+    hits = sum(1 for q in questions if (r := index.search(q, k=1)) and q in r[0][2]['text'])
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for q in questions:
+            index.search(q, k=5)
+    elapsed = time.perf_counter() - started
+    per_query_ms = elapsed / (repeat * len(questions)) * 1000
+    print(f"⏱️  질의 {repeat * len(questions)}건 평균 {per_query_ms:.3f}ms (top-5)")
+    print(f"✅ 질문 {len(questions)}개 중 {hits}개가 자기 Q&A 청크를 1위로 찾았습니다. ({hits / len(questions):.1%})")
+
+def main():
+    """메인 실행 함수."""
+    parser = argparse.ArgumentParser(description="챗봇 지식 기반 문서의 로컬 검색 색인 생성/조회")
+    parser.add_argument('--index-dir', default=DEFAULT_INDEX_DIR, help=f"색인 저장 폴더 (기본값: {DEFAULT_INDEX_DIR})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="색인을 생성합니다. (바뀐 파일만 다시 색인)")
+    build_parser.add_argument('--force', action='store_true', help="모든 파일을 다시 색인합니다.")
+
+    query_parser = subparsers.add_parser('query', help="질의와 관련된 문서 청크를 검색합니다.")
+    query_parser.add_argument('text', help="검색할 질의")
+    query_parser.add_argument('-k', type=int, default=5, help="반환할 청크 수 (기본값: 5)")
+
+    subparsers.add_parser('benchmark', help="검색 지연 시간과 정확도를 측정합니다.")
+    args = parser.parse_args()
+
+    print("\n--- [chatbot_index] 챗봇 문서 검색 색인 ---")
+    if args.command == 'build':
+        build_index(index_dir=args.index_dir, force=args.force)
+        return
+
+    if not os.path.exists(os.path.join(args.index_dir, 'manifest.json')):
+        print("⚠️ 색인이 없습니다. 먼저 'python chatbot_index.py build'를 실행해주세요.")
+        return
+    stale = stale_sources(args.index_dir)
+    if stale:
+        print(f"⚠️ 색인 이후 변경된 문서가 있습니다: {', '.join(stale)} ('build'로 갱신하세요)")
+
+    index = ChatbotIndex(args.index_dir)
+    if args.command == 'benchmark':
+        run_benchmark(index)
+        return
+
+    started = time.perf_counter()
+    results = index.search(args.text, k=args.k)
+    elapsed = time.perf_counter() - started
+    if not results:
+        print("ℹ️ 관련된 문서를 찾지 못했습니다.")
+    for rank, (score, _, chunk) in enumerate(results, start=1):
+        print(f"\n[{rank}] {score:.3f}  {chunk['source']} > {chunk['heading']}")
+        print(chunk['text'])
+    print(f"\n⏱️  검색 소요 시간: {elapsed * 1000:.3f}ms")
+
+if __name__ == '__main__':
+    main()
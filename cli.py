@@ -0,0 +1,201 @@
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+# 하위 명령: {명령: (실행할 단계 모듈, 설명)}
+# 단계 모듈은 해당 명령을 실행할 때만 불러오므로, 다른 명령은 pandas/psycopg2 등 무거운 모듈을 불러오지 않습니다.
+STAGE_COMMANDS = {
+    'ingest': ('01_insert_monthly_data', "차량 마스터/월별 운행 데이터 생성 및 적재"),
+    'screen': ('10_screen_monthly_data', "월별 연료 데이터 품질 검사 및 격리"),
+    'baseline': ('02_calculate_baseline', "베이스라인 인자 계산"),
+    'target': ('04_calculate_business_target', "사업 목표 감축량 계산 (단순)"),
+    'reduce': ('05_co2_reduction_calc', "CO2 감축량 상세 계산"),
+    'display': ('03_display_baseline', "베이스라인 인자 조회 및 출력"),
+    'report': ('06_Report', "종합 분석 보고서(Excel) 생성")
+}
+
+# 명령별 시작 시간(새 인터프리터에서 cli.py와 해당 명령의 모듈을 불러오는 시간, 초) 예산
+# 차량 1대 조회처럼 짧은 명령은 1초보다 충분히 빨리 시작해야 합니다.
+IMPORT_BUDGET_SECONDS = {
+    'help': 0.3,
+    'vehicle': 0.5
+}
+# 위에 없는 명령(단계 실행)의 예산
+DEFAULT_IMPORT_BUDGET_SECONDS = 3.0
+
+# benchmark에서 명령마다 반복 측정하는 횟수 (가장 빠른 값을 사용)
+BENCHMARK_REPEAT = 3
+
+def command_modules(command):
+    """명령 실행에 필요한 모듈 목록을 반환하는 함수. (benchmark에서 시작 시간 측정에 사용)"""
+    if command in STAGE_COMMANDS:
+        return [STAGE_COMMANDS[command][0]]
+    if command == 'vehicle':
+        return ['db_utils', 'query_service']
+    if command == 'run':
+        return ['run_all', '00_edit_db'] + [os.path.splitext(script)[0] for script in _pipeline_scripts()]
+    return []
+
+def _pipeline_scripts():
+    from run_all import PIPELINE_SCRIPTS
+    return PIPELINE_SCRIPTS
+
+def run_stage(module_name, argv=()):
+    """
+    단계 스크립트 1개를 현재 프로세스에서 실행하는 함수.
+    - 스크립트를 단독 실행한 것과 같도록 sys.argv와 단계명(metrics/로그 이벤트용)을 맞춘 뒤 main()을 호출합니다.
+    :return: 성공 시 True, 예외나 0이 아닌 종료 코드로 끝나면 False
+    """
+    from log_config import logger
+    from metrics import STAGE_ENV, track_stage
+
+    module = importlib.import_module(module_name)
+    os.environ[STAGE_ENV] = module_name
+    sys.argv = [f"{module_name}.py", *argv]
+    try:
+        with track_stage(module_name):
+            module.main()
+        return True
+    except SystemExit as e:
+        return e.code in (None, 0)
+    except Exception as e:
+        logger.exception(f"❌ '{module_name}' 실행 중 오류 발생: {e}")
+        return False
+
+def run_stage_script(script_name, args=None, profiler=None, capture=False):
+    """run_all.run_stages의 단계 실행 함수(runner)로 쓰는 함수. 스크립트 파일명을 받아 현재 프로세스에서 실행합니다."""
+    from log_config import logger
+    logger.info(f"🚀 Executing: {script_name}")
+    return run_stage(os.path.splitext(script_name)[0], args or [])
+
+def run_pipeline(reset_db=False, resume=False):
+    """
+    run_all.py와 같은 순서로 모든 단계를 한 프로세스에서 실행하는 함수.
+    - 단계마다 인터프리터를 새로 띄우지 않으므로 pandas/psycopg2 등을 한 번만 불러옵니다.
+    - 체크포인트(--resume), 측정 요약, 쿼리 캐시 정리는 run_all.execute_pipeline을 그대로 사용합니다.
+    - 단계가 sys.argv와 환경 변수를 바꾸므로 순서대로 1개씩 실행합니다. 동시 실행이나 프로파일링이 필요하면 run_all.py를 사용합니다.
+    :return: 모든 단계 성공 시 True
+    """
+    from log_config import logger
+    from metrics import RUN_ID
+    from run_all import build_script_list, execute_pipeline
+
+    logger.info("===== 🚌 Bus CO2 Reduction Calculation Pipeline Start (in-process) =====")
+    logger.info(f"run_id: {RUN_ID}")
+    failed = execute_pipeline(build_script_list(reset_db), workers=1, resume=resume, reset_db=reset_db,
+                              runner=run_stage_script)
+    if failed:
+        return False
+    logger.info("🎉 All stages finished successfully.")
+    return True
+
+def show_vehicle(plate):
+    """
+    차량 1대의 마스터, 베이스라인, 감축량 정보를 JSON으로 출력하는 함수. (조회 서비스의 /vehicles/<차량번호>와 같은 내용)
+    - pandas를 불러오지 않고 DB 연결 1개로 조회하므로 빠르게 시작합니다.
+    :return: 차량이 있으면 True
+    """
+    import json
+    from db_config import db_connection_params
+    from db_utils import connect_to_db, close_db_connection
+    from query_service import VEHICLE_QUERY
+
+    conn = connect_to_db(db_connection_params)
+    if not conn: return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(VEHICLE_QUERY, {'plate': plate})
+            row = cur.fetchone()
+            columns = [desc[0] for desc in cur.description]
+    finally:
+        close_db_connection(conn)
+    if row is None:
+        print(f"⚠️ 차량을 찾을 수 없습니다: {plate}")
+        return False
+    print(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str, indent=2))
+    return True
+
+def measure_startup(command, repeat=BENCHMARK_REPEAT):
+    """
+    새 인터프리터에서 cli.py와 명령에 필요한 모듈을 불러오는 데 걸리는 시간(초)을 측정하는 함수.
+    ('help'는 cli.py --help 실행 시간)
+    """
+    if command == 'help':
+        argv = [sys.executable, os.path.abspath(__file__), '--help']
+    else:
+        imports = '; '.join(f"importlib.import_module({name!r})" for name in command_modules(command))
+        argv = [sys.executable, '-c', f"import importlib, cli; {imports}"]
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit code {result.returncode}"
+        best = elapsed if best is None else min(best, elapsed)
+    return best, None
+
+def run_benchmark(commands=None):
+    """
+    명령별 시작 시간을 측정하여 IMPORT_BUDGET_SECONDS 예산과 비교하는 함수.
+    :return: 모든 명령을 측정했고 예산 안이면 True (측정하지 못한 명령은 실패로 봄)
+    """
+    commands = commands or ['help', 'vehicle', *STAGE_COMMANDS, 'run']
+    print(f"\n⏳ 명령별 시작 시간 측정 (새 인터프리터, {BENCHMARK_REPEAT}회 중 최솟값)")
+    print(f"{'명령':<10} {'시간(s)':>8} {'예산(s)':>8}  결과")
+    all_ok = True
+    for command in commands:
+        budget = IMPORT_BUDGET_SECONDS.get(command, DEFAULT_IMPORT_BUDGET_SECONDS)
+        seconds, error = measure_startup(command)
+        if error:
+            print(f"{command:<10} {'-':>8} {budget:>8.2f}  ❌ 측정 불가 ({error})")
+            all_ok = False
+            continue
+        ok = seconds <= budget
+        all_ok = all_ok and ok
+        print(f"{command:<10} {seconds:>8.3f} {budget:>8.2f}  {'✅' if ok else '❌ 예산 초과'}")
+    return all_ok
+
+def build_parser():
+    """명령행 인자 파서를 만드는 함수."""
+    parser = argparse.ArgumentParser(
+        description="버스 CO2 감축량 산정 파이프라인 통합 명령",
+        epilog="단계 명령 뒤의 인자는 해당 스크립트에 그대로 전달됩니다. (예: cli.py baseline --storage duckdb, cli.py display -h)"
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True, metavar='명령')
+    for command, (module_name, description) in STAGE_COMMANDS.items():
+        # 단계 스크립트의 인자(-h 포함)는 cli.py가 해석하지 않고 그대로 전달
+        subparsers.add_parser(command, help=f"{description} ({module_name}.py)", add_help=False)
+    run_parser = subparsers.add_parser('run', help="전체 파이프라인을 한 프로세스에서 실행")
+    run_parser.add_argument('--reset-db', action='store_true',
+                            help="모든 테이블을 재생성한 뒤 실행합니다. (기본값: 기존 데이터를 유지하고 마이그레이션만 적용)")
+    run_parser.add_argument('--resume', action='store_true',
+                            help="완료 체크포인트가 있고 입력이 그대로인 단계는 건너뜁니다. (run_all.py와 같은 체크포인트 사용)")
+    vehicle_parser = subparsers.add_parser('vehicle', help="차량 1대의 베이스라인/감축량 정보 조회 (빠른 시작)")
+    vehicle_parser.add_argument('plate', help="차량번호")
+    benchmark_parser = subparsers.add_parser('benchmark', help="명령별 시작(임포트) 시간을 측정하여 예산과 비교")
+    benchmark_parser.add_argument('commands', nargs='*', help="측정할 명령 (기본값: 전체)")
+    return parser
+
+def main(argv=None):
+    """메인 실행 함수. :return: 종료 코드"""
+    parser = build_parser()
+    args, stage_argv = parser.parse_known_args(argv)
+    if args.command not in STAGE_COMMANDS and stage_argv:
+        parser.error(f"알 수 없는 인자: {' '.join(stage_argv)}")
+    if args.command in STAGE_COMMANDS:
+        ok = run_stage(STAGE_COMMANDS[args.command][0], stage_argv)
+    elif args.command == 'run':
+        ok = run_pipeline(reset_db=args.reset_db, resume=args.resume)
+    elif args.command == 'vehicle':
+        ok = show_vehicle(args.plate)
+    else:
+        ok = run_benchmark(args.commands)
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,4 +24,14 @@ CO2_EMISSION_FACTOR = {
 # - DB의 'fuel_quantity_l' 컬럼이 CNG의 경우 질량(kg) 단위로 저장되었다고 가정합니다.
 # - 이 밀도 값은 질량(kg)을 부피(m³)로 변환하는 데 사용됩니다.
 # - 출처: 일반적인 CNG 밀도 값 (표준상태 기준, 실제 값은 온도/압력에 따라 변동 가능)
-CNG_DENSITY_KG_PER_M3 = 0.8
\ No newline at end of file
+CNG_DENSITY_KG_PER_M3 = 0.8
+
+# 4. 전력 간접배출계수 (Grid Emission Factor)
+# - 전기버스의 충전 전력량(kWh)으로부터 간접배출량을 산정하는 데 사용합니다.
+# - 단위: kgCO2 / kWh (= tCO2 / MWh)
+# - 키는 적용 시작 연도이며, 해당 연도에 값이 없으면 직전 연도의 값을 적용합니다.
+# - 출처: 온실가스종합정보센터 국가 전력 배출계수 (예시 값, 고시 변경 시 연도별로 추가)
+GRID_EMISSION_FACTOR_KG_PER_KWH = {
+    2019: 0.4594,
+    2022: 0.4781
+}
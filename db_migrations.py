@@ -0,0 +1,261 @@
+import time
+import psycopg2
+from db_partitions import PARTITIONED_TABLES, is_partitioned, convert_to_partitioned, create_partitioned_index_concurrently
+from vehicle_lineage import create_lineage_table, rebuild_lineage
+from log_config import logger
+
+# 마이그레이션 동시 실행을 막기 위한 advisory lock 키 (임의의 고정 값)
+MIGRATION_LOCK_KEY = 715_000_040
+
+# 운행년월 컬럼: 'YYYYMM' 문자열(VARCHAR) -> 정수 YYYYMM(INT)
+# 정수로 저장하면 연도/월 추출이 나눗셈/나머지 연산이 되고(year_month / 100, year_month % 100),
+# 비교/정렬/인덱스가 문자열보다 작고 빠릅니다.
+MONTH_COLUMNS = [
+    ('bus_driving_records', 'year_month'),
+    ('bus_monthly_fuel_data', 'record_year_month'),
+    ('bus_baseline_parameters', 'baseline_start_ym'),
+    ('bus_baseline_parameters', 'baseline_end_ym'),
+    ('bus_ev_monthly_emissions', 'year_month'),
+    ('bus_ev_operation_periods', 'first_active_ym'),
+    ('bus_ev_operation_periods', 'last_active_ym')
+]
+
+# 04, 05, 06의 조인/필터 조건과 08의 증분 갱신 범위 조건을 받쳐주는 인덱스: (인덱스명, 테이블, 컬럼 정의)
+SUPPORTING_INDEXES = [
+    ('idx_bus_vehicle_master_business_type', 'bus_vehicle_master', 'business_type'),
+    ('idx_bus_vehicle_master_original_fuel_type', 'bus_vehicle_master', 'original_fuel_type'),
+    ('idx_bus_vehicle_master_ev_registration_date', 'bus_vehicle_master', 'ev_registration_date'),
+    ('idx_bus_vehicle_master_original_ice_plate_no', 'bus_vehicle_master', 'original_ice_plate_no'),
+    ('idx_bus_vehicle_master_company_plate', 'bus_vehicle_master', 'company_name, vehicle_plate_no'),
+    ('idx_bus_baseline_parameters_plate_pattern', 'bus_baseline_parameters', 'vehicle_plate_no varchar_pattern_ops'),
+    ('idx_bus_driving_records_year_month', 'bus_driving_records', 'year_month')
+]
+
+def ensure_migrations_table(conn):
+    """적용된 스키마 버전을 기록하는 schema_migrations 테이블이 없으면 생성하는 함수."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description VARCHAR(200) NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                duration_ms INT
+            );
+        """)
+    conn.commit()
+
+def get_applied_versions(conn):
+    """적용된 마이그레이션 버전 집합을 반환하는 함수."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations;")
+        versions = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return versions
+
+def get_schema_version(conn):
+    """현재 스키마 버전(적용된 가장 큰 버전, 없으면 0)을 반환하는 함수."""
+    ensure_migrations_table(conn)
+    return max(get_applied_versions(conn), default=0)
+
+def _column_type(cur, table, column):
+    """컬럼의 데이터 타입을 반환하는 함수. 테이블이나 컬럼이 없으면 None."""
+    cur.execute("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = %s;
+    """, (table, column))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def migrate_month_columns_to_int(cur):
+    """
+    [버전 1] 운행년월 컬럼을 VARCHAR 'YYYYMM'(또는 'YYYY-MM')에서 INT YYYYMM으로 제자리 변환합니다.
+    - ALTER COLUMN ... TYPE ... USING은 테이블을 한 번 다시 쓰며 기존 값을 보존합니다. 연결된 인덱스/제약조건도 함께 재생성됩니다.
+    - 이미 정수이거나 아직 없는 테이블(07/08 미실행)은 건너뜁니다. 나중에 생성될 때 정수 타입으로 만들어집니다.
+    - 같은 테이블의 컬럼은 ALTER TABLE 한 문장으로 묶어 테이블 재작성이 한 번만 일어나도록 합니다.
+    """
+    by_table = {}
+    for table, column in MONTH_COLUMNS:
+        data_type = _column_type(cur, table, column)
+        if data_type in ('character varying', 'character', 'text'):
+            by_table.setdefault(table, []).append(column)
+
+    for table, columns in by_table.items():
+        alters = ', '.join(
+            f"ALTER COLUMN {column} TYPE INT USING NULLIF(REPLACE({column}, '-', ''), '')::INT" for column in columns
+        )
+        logger.info(f"   - {table}: {', '.join(columns)} -> INT")
+        cur.execute(f"ALTER TABLE {table} {alters};")
+
+def create_supporting_indexes(conn):
+    """
+    [버전 2] 조인/필터 컬럼 인덱스를 CREATE INDEX CONCURRENTLY로 생성합니다.
+    - CONCURRENTLY는 테이블 쓰기를 막지 않는 대신 트랜잭션 밖(autocommit)에서 실행해야 합니다.
+    - 이전 시도가 중단되어 INVALID 상태로 남은 인덱스는 지우고 다시 만듭니다.
+    """
+    with conn.cursor() as cur:
+        for index_name, table, columns in SUPPORTING_INDEXES:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+            if not cur.fetchone()[0]:
+                continue
+            if is_partitioned(cur, table):
+                # 파티션 테이블은 파티션별로 CONCURRENTLY 생성 후 부모 인덱스에 연결
+                create_partitioned_index_concurrently(conn, index_name, table, columns)
+                continue
+            cur.execute("""
+                SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = %s;
+            """, (index_name,))
+            row = cur.fetchone()
+            if row and row[0]:
+                continue
+            if row and not row[0]:
+                logger.info(f"   - {index_name}: 중단된(INVALID) 인덱스를 지우고 다시 생성합니다.")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};")
+            logger.info(f"   - {index_name} ON {table} ({columns})")
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table} ({columns});")
+
+def partition_monthly_tables(cur):
+    """
+    [버전 3] 월별 기록 테이블(bus_driving_records, bus_monthly_fuel_data)을 운행년월 기준 연도별 범위 파티션 테이블로 변환합니다.
+    - 베이스라인(최근 60개월)과 연도별 보고서 조회가 해당 연도 파티션만 읽게 되고, 오래된 연도는 파티션 단위로 분리/보관할 수 있습니다.
+    - 데이터 복사와 테이블 교체가 한 트랜잭션에서 이루어지므로, 실패하면 기존 테이블이 그대로 남습니다.
+    """
+    for table in PARTITIONED_TABLES:
+        index_definitions = [(name, columns) for name, index_table, columns in SUPPORTING_INDEXES if index_table == table]
+        convert_to_partitioned(cur, table, index_definitions)
+
+def create_monthly_quarantine_table(cur):
+    """
+    [버전 4] 월별 연료 데이터 품질 검사(10번 스크립트)의 격리 테이블을 생성합니다.
+    - 00_edit_db.py로 새로 만든 DB에는 이미 있으므로 IF NOT EXISTS로 작성합니다.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bus_monthly_quarantine (
+            vehicle_plate_no VARCHAR(20) NOT NULL,
+            record_year_month INT NOT NULL,
+            flags INT NOT NULL,
+            reasons VARCHAR(200) NOT NULL,
+            fuel_per_km DOUBLE PRECISION,
+            robust_z DOUBLE PRECISION,
+            distance_ratio DOUBLE PRECISION,
+            PRIMARY KEY (vehicle_plate_no, record_year_month),
+            FOREIGN KEY (vehicle_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
+        );
+    """)
+
+def create_vehicle_lineage_table(cur):
+    """
+    [버전 5] 차량 대체 계보 closure 테이블(bus_vehicle_lineage)을 생성하고, 기존 차량 마스터로 채웁니다.
+    - 이후에는 01번이 차량 마스터를 저장할 때 대체 관계가 바뀐 차량의 계보만 증분 갱신합니다.
+    """
+    create_lineage_table(cur)
+    vehicles, _, inserted = rebuild_lineage(cur)
+    logger.info(f"   - bus_vehicle_lineage: 차량 {vehicles}대, 경로 {inserted}건")
+
+def allow_inactive_ev_periods(cur):
+    """
+    [버전 6] 운행월이 없는 전기버스도 운행기간 행(가동률 0)을 가질 수 있도록 첫/마지막 운행월의 NOT NULL 제약을 없앱니다.
+    - 00_edit_db.py로 새로 만든 DB나 07번이 만든 테이블에는 이미 제약이 없으므로 멱등적으로 작성합니다.
+    """
+    cur.execute("""
+        ALTER TABLE IF EXISTS bus_ev_operation_periods
+            ALTER COLUMN first_active_ym DROP NOT NULL,
+            ALTER COLUMN last_active_ym DROP NOT NULL;
+    """)
+
+# 마이그레이션 목록: (버전, 설명, 실행 함수, 트랜잭션 사용 여부)
+# - 트랜잭션 사용: 함수가 cursor를 받고, 변경과 버전 기록이 한 트랜잭션으로 커밋됩니다. (실패 시 전체 롤백)
+# - 트랜잭션 미사용(CONCURRENTLY 등): 함수가 autocommit 연결을 받고, 성공한 뒤 버전을 기록합니다.
+#   이런 마이그레이션은 중간에 실패해도 다시 실행할 수 있도록 멱등적으로 작성해야 합니다.
+MIGRATIONS = [
+    (1, '운행년월 컬럼을 정수(YYYYMM)로 변환', migrate_month_columns_to_int, True),
+    (2, '조인/필터 컬럼 인덱스 생성 (CONCURRENTLY)', create_supporting_indexes, False),
+    (3, '월별 기록 테이블을 연도별 범위 파티션으로 변환', partition_monthly_tables, True),
+    (4, '월별 연료 데이터 격리 테이블 생성', create_monthly_quarantine_table, True),
+    (5, '차량 대체 계보(closure) 테이블 생성', create_vehicle_lineage_table, True),
+    (6, '운행월 없는 전기버스의 운행기간 허용 (첫/마지막 운행월 NULL)', allow_inactive_ev_periods, True),
+]
+
+def apply_migrations(conn, target_version=None):
+    """
+    아직 적용되지 않은 마이그레이션을 버전 순서대로 적용하는 함수. (기존 데이터는 유지)
+    :param conn: psycopg2 connection 객체
+    :param target_version: 이 버전까지만 적용 (None이면 최신 버전까지)
+    :return: 적용한 버전 목록 (실패 시 None)
+    """
+    if not conn: return None
+    ensure_migrations_table(conn)
+
+    with conn.cursor() as cur:
+        # 세션 단위 advisory lock으로 여러 곳에서 동시에 마이그레이션하지 않도록 함
+        cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
+    conn.commit()
+
+    applied_now = []
+    try:
+        applied = get_applied_versions(conn)
+        pending = [m for m in MIGRATIONS if m[0] not in applied and (target_version is None or m[0] <= target_version)]
+        if not pending:
+            logger.info(f"ℹ️ 적용할 마이그레이션이 없습니다. (현재 스키마 버전: {max(applied, default=0)})")
+            return applied_now
+
+        for version, description, migrate, transactional in pending:
+            logger.info(f"⏳ 마이그레이션 {version}: {description}")
+            started = time.perf_counter()
+            try:
+                if transactional:
+                    with conn.cursor() as cur:
+                        migrate(cur)
+                        cur.execute(
+                            "INSERT INTO schema_migrations (version, description, duration_ms) VALUES (%s, %s, %s);",
+                            (version, description, int((time.perf_counter() - started) * 1000))
+                        )
+                    conn.commit()
+                else:
+                    conn.autocommit = True
+                    try:
+                        migrate(conn)
+                    finally:
+                        conn.autocommit = False
+                    with conn.cursor() as cur:
+                        cur.execute(
+                            "INSERT INTO schema_migrations (version, description, duration_ms) VALUES (%s, %s, %s);",
+                            (version, description, int((time.perf_counter() - started) * 1000))
+                        )
+                    conn.commit()
+            except psycopg2.Error as e:
+                logger.error(f"❌ 마이그레이션 {version} 오류: {e}")
+                conn.rollback()
+                return None
+            applied_now.append(version)
+            logger.info(f"✅ 마이그레이션 {version} 적용 완료 ({time.perf_counter() - started:.3f}초)")
+
+        logger.info(f"✅ 현재 스키마 버전: {max(applied | set(applied_now))}")
+        return applied_now
+    finally:
+        # 예외로 빠져나온 경우 중단된(aborted) 트랜잭션에서는 잠금 해제 쿼리도 실패하므로 먼저 롤백
+        # 잠금 해제 실패는 경고만 남겨 원래 예외가 가려지지 않도록 함 (세션 잠금은 연결이 닫히면 해제됨)
+        try:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+        except psycopg2.Error as e:
+            logger.warning(f"⚠️ 마이그레이션 잠금을 해제하지 못했습니다. 연결을 닫으면 해제됩니다: {e}")
+
+def print_migration_status(conn):
+    """마이그레이션별 적용 여부와 적용 시각을 로그로 기록하는 함수."""
+    if not conn: return
+    ensure_migrations_table(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT version, applied_at, duration_ms FROM schema_migrations;")
+        applied = {row[0]: row[1:] for row in cur.fetchall()}
+    conn.commit()
+
+    logger.info("[스키마 마이그레이션 상태]")
+    for version, description, _, _ in MIGRATIONS:
+        if version in applied:
+            applied_at, duration_ms = applied[version]
+            logger.info(f"✅ {version}: {description} (적용: {applied_at:%Y-%m-%d %H:%M:%S}, {duration_ms}ms)")
+        else:
+            logger.info(f"⏳ {version}: {description} (미적용)")
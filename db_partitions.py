@@ -0,0 +1,301 @@
+import argparse
+import re
+from datetime import datetime
+import psycopg2
+from psycopg2 import sql
+from log_config import logger
+
+# 연도별 범위(RANGE) 파티션 대상: {테이블명: (파티션 키 컬럼, 기본 키 컬럼 목록)}
+# 파티션 테이블의 기본 키/UNIQUE 제약은 파티션 키를 포함해야 하므로 (차량번호, 운행년월)을 기본 키로 사용합니다.
+PARTITIONED_TABLES = {
+    'bus_driving_records': ('year_month', ['vehicle_plate_no', 'year_month']),
+    'bus_monthly_fuel_data': ('record_year_month', ['vehicle_plate_no', 'record_year_month'])
+}
+
+# 현재 연도 이후 미리 만들어 둘 파티션 연도 수 (적재 시점에 파티션이 없어 INSERT가 실패하지 않도록)
+FUTURE_PARTITION_YEARS = 1
+
+# 분리(detach)한 과거 파티션을 옮겨 보관하는 스키마
+ARCHIVE_SCHEMA = 'archive'
+
+PARTITION_NAME_PATTERN = re.compile(r'_y(\d{4})$')
+
+def year_month_bounds(from_year, to_year=None):
+    """
+    연도 범위를 정수 운행년월(YYYYMM) 구간 [시작, 끝)으로 바꾸는 함수.
+    - 파티션 경계와 조회 조건에 같은 구간을 사용하므로, 플래너가 해당 연도 파티션만 읽습니다(파티션 프루닝).
+    - 'year_month / 100 = 연도'처럼 컬럼에 연산을 씌운 조건은 프루닝되지 않으므로 이 구간 비교를 사용합니다.
+    :return: (from_ym, to_ym) 튜플. 예: 2023 -> (202300, 202400)
+    """
+    to_year = from_year if to_year is None else to_year
+    return from_year * 100, (to_year + 1) * 100
+
+def partition_name(table, year):
+    """연도 파티션 테이블명을 반환하는 함수. 예: bus_driving_records_y2023"""
+    return f"{table}_y{year}"
+
+def default_partition_years(years=None, future_years=FUTURE_PARTITION_YEARS):
+    """주어진 연도들과 현재 연도부터 future_years년 뒤까지의 연도를 합쳐 정렬된 목록으로 반환하는 함수."""
+    current_year = datetime.now().year
+    return sorted(set(years or []) | set(range(current_year, current_year + future_years + 1)))
+
+def is_partitioned(cur, table):
+    """테이블이 파티션 테이블(PARTITION BY)인지 확인하는 함수. 테이블이 없으면 False."""
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s));", (table,))
+    return cur.fetchone()[0]
+
+def list_partitions(cur, table):
+    """
+    파티션 테이블에 연결된 연도 파티션 목록을 반환하는 함수.
+    :return: [(파티션명, 연도)] 목록 (연도 순)
+    """
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s);
+    """, (table,))
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = PARTITION_NAME_PATTERN.search(name)
+        if match:
+            partitions.append((name, int(match.group(1))))
+    return sorted(partitions, key=lambda p: p[1])
+
+def create_year_partitions(cur, table, years):
+    """
+    파티션 테이블에 없는 연도 파티션을 생성하는 함수. (트랜잭션은 호출 측에서 커밋)
+    - 부모 테이블의 인덱스/제약조건은 새 파티션에도 자동으로 만들어집니다.
+    :return: 새로 만든 파티션명 목록
+    """
+    key_col = PARTITIONED_TABLES[table][0]
+    existing = {year for _, year in list_partitions(cur, table)}
+    created = []
+    for year in sorted(set(years) - existing):
+        from_ym, to_ym = year_month_bounds(year)
+        name = partition_name(table, year)
+        cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s);").format(
+            partition=sql.Identifier(name), table=sql.Identifier(table)
+        ), (from_ym, to_ym))
+        created.append(name)
+    if created:
+        logger.info(f"   - {table}: 연도 파티션 {len(created)}개 생성 ({key_col}: {', '.join(created)})")
+    return created
+
+def ensure_year_partitions(conn, years=None, tables=None, future_years=FUTURE_PARTITION_YEARS):
+    """
+    적재할 데이터의 연도와 현재~미래 연도의 파티션이 있는지 확인하고, 없으면 생성하는 함수.
+    - 01번처럼 파티션 테이블에 쓰는 단계는 저장 전에 이 함수를 호출합니다.
+    - 아직 파티션 테이블로 변환되지 않은(마이그레이션 전) 테이블은 건너뜁니다.
+    :param years: 적재할 데이터의 연도 목록 (None이면 현재~미래 연도만)
+    :param tables: 대상 테이블 목록 (None이면 PARTITIONED_TABLES 전체)
+    :return: 새로 만든 파티션명 목록 (실패 시 None)
+    """
+    if not conn: return None
+    target_years = default_partition_years(years, future_years)
+    created = []
+    with conn.cursor() as cur:
+        try:
+            for table in tables or PARTITIONED_TABLES:
+                if is_partitioned(cur, table):
+                    created += create_year_partitions(cur, table, target_years)
+            conn.commit()
+        except psycopg2.Error as e:
+            logger.error(f"❌ 연도 파티션 생성 오류: {e}")
+            conn.rollback()
+            return None
+    if created:
+        logger.info(f"✅ 연도 파티션 {len(created)}개를 생성했습니다.")
+    return created
+
+def convert_to_partitioned(cur, table, index_definitions=()):
+    """
+    일반 테이블을 같은 컬럼의 연도별 범위 파티션 테이블로 제자리 변환하는 함수. (트랜잭션은 호출 측에서 커밋)
+    - 새 파티션 테이블과 (기존 데이터 연도 + 현재~미래 연도) 파티션을 만들고, 데이터를 옮긴 뒤 기존 테이블과 교체합니다.
+    - 파티션 키가 없는 대리 키(bus_driving_records.id)는 파티션 테이블의 기본 키가 될 수 없어 제거합니다.
+    - 외래 키는 기존 정의를 그대로 옮기고, index_definitions의 인덱스를 다시 만듭니다.
+    - 이미 파티션 테이블이면 빠진 연도 파티션만 만들고, 테이블이 없으면 건너뜁니다.
+    :param index_definitions: 다시 만들 인덱스 목록 [(인덱스명, 컬럼 정의)]
+    :return: 옮긴 행 수 (변환하지 않은 경우 None)
+    """
+    key_col, pk_cols = PARTITIONED_TABLES[table]
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+    if not cur.fetchone()[0]:
+        return None
+    if is_partitioned(cur, table):
+        create_year_partitions(cur, table, default_partition_years())
+        return None
+
+    new_table = f"{table}_partitioned"
+    table_id, new_table_id, key_id = sql.Identifier(table), sql.Identifier(new_table), sql.Identifier(key_col)
+
+    cur.execute(sql.SQL("SELECT DISTINCT {key} / 100 FROM {table} WHERE {key} IS NOT NULL;").format(key=key_id, table=table_id))
+    data_years = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype = 'f';
+    """, (table,))
+    foreign_keys = [row[0] for row in cur.fetchall()]
+
+    # LIKE는 컬럼/NOT NULL만 복사하고 기존 제약조건/인덱스 이름과 충돌하지 않음
+    cur.execute(sql.SQL("CREATE TABLE {new} (LIKE {table}) PARTITION BY RANGE ({key});").format(
+        new=new_table_id, table=table_id, key=key_id
+    ))
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'id';
+    """, (new_table,))
+    if cur.fetchone():
+        cur.execute(sql.SQL("ALTER TABLE {new} DROP COLUMN id;").format(new=new_table_id))
+
+    for year in default_partition_years(data_years):
+        from_ym, to_ym = year_month_bounds(year)
+        cur.execute(sql.SQL("CREATE TABLE {partition} PARTITION OF {new} FOR VALUES FROM (%s) TO (%s);").format(
+            partition=sql.Identifier(partition_name(table, year)), new=new_table_id
+        ), (from_ym, to_ym))
+
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position;
+    """, (new_table,))
+    columns = sql.SQL(', ').join(sql.Identifier(row[0]) for row in cur.fetchall())
+    cur.execute(sql.SQL("INSERT INTO {new} ({cols}) SELECT {cols} FROM {table};").format(
+        new=new_table_id, cols=columns, table=table_id
+    ))
+    moved_rows = cur.rowcount
+
+    cur.execute(sql.SQL("DROP TABLE {table};").format(table=table_id))
+    cur.execute(sql.SQL("ALTER TABLE {new} RENAME TO {table};").format(new=new_table_id, table=table_id))
+    cur.execute(sql.SQL("ALTER TABLE {table} ADD PRIMARY KEY ({cols});").format(
+        table=table_id, cols=sql.SQL(', ').join(sql.Identifier(col) for col in pk_cols)
+    ))
+    for definition in foreign_keys:
+        cur.execute(sql.SQL("ALTER TABLE {table} ADD {definition};").format(table=table_id, definition=sql.SQL(definition)))
+    for index_name, index_columns in index_definitions:
+        cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {index} ON {table} ({cols});").format(
+            index=sql.Identifier(index_name), table=table_id, cols=sql.SQL(index_columns)
+        ))
+    cur.execute(sql.SQL("ANALYZE {table};").format(table=table_id))
+    logger.info(f"   - {table}: 연도별 파티션 테이블로 변환 ({moved_rows}행, 파티션 {len(default_partition_years(data_years))}개)")
+    return moved_rows
+
+def create_partitioned_index_concurrently(conn, index_name, table, columns):
+    """
+    파티션 테이블에 쓰기를 막지 않고 인덱스를 만드는 함수. (conn은 autocommit 상태여야 함)
+    - 파티션 테이블에는 CREATE INDEX CONCURRENTLY를 직접 쓸 수 없으므로,
+      부모에 ON ONLY로 빈 인덱스를 만든 뒤 파티션마다 CONCURRENTLY로 만들어 ATTACH 합니다.
+    - 모든 파티션이 연결되면 부모 인덱스가 자동으로 유효(VALID) 상태가 되며, 이후 생성되는 파티션에는 자동으로 만들어집니다.
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {index} ON ONLY {table} ({cols});").format(
+            index=sql.Identifier(index_name), table=sql.Identifier(table), cols=sql.SQL(columns)
+        ))
+        for partition, year in list_partitions(cur, table):
+            # 이미 부모 인덱스에 연결된 파티션 인덱스가 있으면 건너뜀
+            cur.execute("""
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid
+                    WHERE i.inhparent = to_regclass(%s) AND x.indrelid = to_regclass(%s)
+                );
+            """, (index_name, partition))
+            if cur.fetchone()[0]:
+                continue
+            child_index = f"{index_name}_y{year}"
+            cur.execute("SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(%s);", (child_index,))
+            row = cur.fetchone()
+            if row and not row[0]:
+                logger.info(f"   - {child_index}: 중단된(INVALID) 인덱스를 지우고 다시 생성합니다.")
+                cur.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {index};").format(index=sql.Identifier(child_index)))
+            logger.info(f"   - {child_index} ON {partition} ({columns})")
+            cur.execute(sql.SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {partition} ({cols});").format(
+                index=sql.Identifier(child_index), partition=sql.Identifier(partition), cols=sql.SQL(columns)
+            ))
+            cur.execute(sql.SQL("ALTER INDEX {index} ATTACH PARTITION {child};").format(
+                index=sql.Identifier(index_name), child=sql.Identifier(child_index)
+            ))
+
+def detach_partitions_before(conn, before_year, tables=None, drop=False):
+    """
+    before_year 이전 연도의 파티션을 부모 테이블에서 분리하는 함수.
+    - 분리된 파티션은 ARCHIVE_SCHEMA 스키마로 옮겨 그대로 조회/백업(pg_dump -n archive)할 수 있습니다.
+      다시 붙이려면 public 스키마로 옮긴 뒤 ALTER TABLE ... ATTACH PARTITION을 실행합니다.
+    - drop=True이면 분리한 파티션을 삭제합니다. (복구 불가)
+    - 분리 후 베이스라인/보고서 조회는 남은 연도 파티션만 읽습니다.
+    :return: 분리한 파티션명 목록 (실패 시 None)
+    """
+    if not conn: return None
+    detached = []
+    with conn.cursor() as cur:
+        try:
+            if not drop:
+                cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {schema};").format(schema=sql.Identifier(ARCHIVE_SCHEMA)))
+            for table in tables or PARTITIONED_TABLES:
+                if not is_partitioned(cur, table):
+                    continue
+                for partition, year in list_partitions(cur, table):
+                    if year >= before_year:
+                        continue
+                    partition_id = sql.Identifier(partition)
+                    cur.execute(sql.SQL("ALTER TABLE {table} DETACH PARTITION {partition};").format(
+                        table=sql.Identifier(table), partition=partition_id
+                    ))
+                    if drop:
+                        cur.execute(sql.SQL("DROP TABLE {partition};").format(partition=partition_id))
+                    else:
+                        cur.execute(sql.SQL("ALTER TABLE {partition} SET SCHEMA {schema};").format(
+                            partition=partition_id, schema=sql.Identifier(ARCHIVE_SCHEMA)
+                        ))
+                    detached.append(partition)
+            conn.commit()
+        except psycopg2.Error as e:
+            logger.error(f"❌ 파티션 분리 오류: {e}")
+            conn.rollback()
+            return None
+
+    if not detached:
+        logger.info(f"ℹ️ {before_year}년 이전 파티션이 없습니다.")
+    else:
+        action = "삭제" if drop else f"'{ARCHIVE_SCHEMA}' 스키마로 보관"
+        logger.info(f"✅ {before_year}년 이전 파티션 {len(detached)}개를 분리하여 {action}했습니다: {', '.join(detached)}")
+    return detached
+
+def print_partition_status(conn):
+    """파티션 테이블별 연도 파티션과 행 수(통계 기준 추정치)를 로그로 기록하는 함수."""
+    if not conn: return
+    with conn.cursor() as cur:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(cur, table):
+                logger.warning(f"⚠️ {table}: 파티션 테이블이 아닙니다. ('00_edit_db.py --migrate'로 변환하세요.)")
+                continue
+            logger.info(f"[{table}]")
+            for partition, year in list_partitions(cur, table):
+                cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s);", (partition,))
+                logger.info(f"   - {partition}: {year}년, 약 {max(cur.fetchone()[0], 0)}행")
+    conn.rollback()
+
+def main():
+    """메인 실행 함수."""
+    from db_config import db_connection_params
+    from db_utils import connect_to_db, close_db_connection
+
+    parser = argparse.ArgumentParser(description="월별 기록 테이블의 연도 파티션 관리")
+    parser.add_argument('--ensure', action='store_true',
+                        help=f"현재 연도부터 {FUTURE_PARTITION_YEARS}년 뒤까지의 파티션을 미리 생성합니다.")
+    parser.add_argument('--detach-before', type=int, metavar='YEAR',
+                        help=f"이 연도 이전 파티션을 분리하여 '{ARCHIVE_SCHEMA}' 스키마로 옮깁니다.")
+    parser.add_argument('--drop', action='store_true', help="--detach-before로 분리한 파티션을 보관하지 않고 삭제합니다.")
+    args = parser.parse_args()
+
+    logger.info("--- [파티션 관리] 시작 ---")
+    conn = connect_to_db(db_connection_params)
+    if not conn:
+        return
+    try:
+        if args.ensure:
+            ensure_year_partitions(conn)
+        if args.detach_before:
+            detach_partitions_before(conn, args.detach_before, drop=args.drop)
+        print_partition_status(conn)
+    finally:
+        close_db_connection(conn)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool
+from db_utils import CountingConnection
+from metrics import track_step
+from log_config import logger
+
+# 한 번의 fetchmany로 가져오는 행 수 (결과를 이 단위로 나눠 DataFrame으로 변환)
+DEFAULT_FETCH_SIZE = 10000
+
+# 서버 측 커서가 네트워크 왕복 한 번에 가져오는 행 수 (psycopg2 itersize)
+DEFAULT_ITERSIZE = 10000
+
+# 동시에 실행할 최대 쿼리 수 (= 풀의 최대 연결 수)
+DEFAULT_MAX_WORKERS = 4
+
+# PostgreSQL 타입 OID -> pandas dtype 매핑
+# - 정수는 NULL이 섞여도 청크마다 dtype이 바뀌지 않도록 nullable 정수(Int64)를 사용합니다.
+# - 나머지(문자열 등)는 object로 둡니다.
+PG_TYPE_DTYPES = {
+    16: 'boolean',      # bool
+    20: 'Int64',        # int8
+    21: 'Int64',        # int2
+    23: 'Int64',        # int4
+    700: 'float64',     # float4
+    701: 'float64',     # float8
+    1700: 'float64',    # numeric
+}
+PG_DATETIME_TYPES = {1082, 1114, 1184}  # date, timestamp, timestamptz
+
+def _typed_frame(rows, description):
+    """커서 결과 행을 컬럼 타입(OID)에 맞는 dtype의 DataFrame으로 변환하는 함수."""
+    # pandas는 DataFrame이 필요할 때만 불러옴 (조회 서비스나 cli.py vehicle처럼 pandas 없이 쓰는 경우 시작 시간 단축)
+    import pandas as pd
+    columns = [desc[0] for desc in description]
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    for desc in description:
+        if desc[1] in PG_TYPE_DTYPES:
+            df[desc[0]] = df[desc[0]].astype(PG_TYPE_DTYPES[desc[1]])
+        elif desc[1] in PG_DATETIME_TYPES:
+            df[desc[0]] = pd.to_datetime(df[desc[0]])
+    return df
+
+def iter_query_chunks(conn, query, params=None, chunk_size=DEFAULT_FETCH_SIZE, itersize=DEFAULT_ITERSIZE):
+    """
+    psycopg2 서버 측(named) 커서로 쿼리 결과를 chunk_size 단위의 DataFrame으로 나눠 반환하는 제너레이터.
+    - 결과 전체를 클라이언트 메모리에 올리지 않으므로, 수백만 행도 일정한 메모리로 처리할 수 있습니다.
+    - 첫 청크가 도착하는 즉시 반환하므로, 호출 측은 쿼리가 끝나기 전에 출력을 시작할 수 있습니다.
+    - 각 청크는 PostgreSQL 컬럼 타입에 맞춘 dtype을 가지며, 청크 간 dtype이 일정합니다.
+    :param conn: psycopg2 connection 객체 (autocommit이 아니어야 함)
+    :param query: 실행할 SELECT 쿼리
+    :param params: 쿼리 파라미터 (선택)
+    :param chunk_size: 반환할 DataFrame 한 개의 행 수
+    :param itersize: 서버 측 커서가 한 번에 가져오는 행 수
+    """
+    # 호출 전 트랜잭션이 없었다면, 다 읽은 뒤 이 함수가 연 트랜잭션을 정리합니다.
+    was_idle = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+    cur.itersize = itersize
+    try:
+        cur.execute(query, params)
+        yielded = False
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yielded = True
+            yield _typed_frame(rows, cur.description)
+        if not yielded:
+            # 결과가 없어도 컬럼 구성을 알 수 있도록 빈 DataFrame 한 개를 반환
+            yield _typed_frame([], cur.description)
+    finally:
+        cur.close()
+        if was_idle:
+            conn.rollback()
+
+def fetch_frame(conn, query, params=None, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    쿼리 결과를 서버 측 커서로 fetch_size 단위씩 가져와 하나의 DataFrame으로 만드는 함수.
+    :param conn: psycopg2 connection 객체
+    :param query: 실행할 SELECT 쿼리
+    :param params: 쿼리 파라미터 (선택)
+    :return: 결과 DataFrame (결과가 없으면 컬럼만 있는 빈 DataFrame)
+    """
+    import pandas as pd
+    chunks = list(iter_query_chunks(conn, query, params, chunk_size=fetch_size))
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+def fetch_table_watermarks(conn, tables):
+    """
+    테이블별 행 수와 변경 워터마크(가장 최근에 쓰인 행의 트랜잭션 ID, max(xmin))를 한 번의 쿼리로 조회하는 함수.
+    - INSERT/UPDATE가 일어나면 xmin이 커지고, DELETE가 일어나면 행 수가 바뀌므로 둘을 합쳐 테이블 상태를 판별합니다.
+    - 값이 같은 행을 건너뛰는 upsert(IS DISTINCT FROM)는 xmin을 바꾸지 않으므로 재실행해도 워터마크가 유지됩니다.
+    :param conn: psycopg2 connection 객체
+    :param tables: 테이블명 목록
+    :return: {테이블명: (행 수, max(xmin))} 딕셔너리 (빈 테이블의 max(xmin)은 None)
+    """
+    query = sql.SQL(' UNION ALL ').join(
+        sql.SQL("SELECT {name}, COUNT(*), MAX(xmin::text::bigint) FROM {table}").format(
+            name=sql.Literal(table), table=sql.Identifier(table)
+        )
+        for table in tables
+    )
+    with conn.cursor() as cur:
+        cur.execute(query)
+        return {name: (row_count, max_xmin) for name, row_count, max_xmin in cur.fetchall()}
+
+def fetch_table_change_counters(conn, tables):
+    """
+    테이블별 누적 변경 행 수(pg_stat_user_tables의 n_tup_ins + n_tup_upd + n_tup_del)를 조회하는 함수.
+    - 통계 뷰만 읽으므로 테이블 크기와 관계없이 빠르며, 파티션 테이블은 파티션의 값을 합칩니다.
+    - 통계는 트랜잭션이 끝난 뒤 조금 늦게 반영될 수 있으므로, 같은 실행 안의 쓰기는 query_cache의 테이블 버전으로 함께 판별합니다.
+    :param conn: psycopg2 connection 객체
+    :param tables: 테이블명 목록
+    :return: {테이블명: 누적 변경 행 수} 딕셔너리
+    """
+    query = """
+        SELECT t.name, COALESCE(SUM(s.n_tup_ins + s.n_tup_upd + s.n_tup_del), 0)
+        FROM unnest(%s::text[]) AS t(name)
+        CROSS JOIN LATERAL pg_partition_tree(t.name::regclass) AS p
+        LEFT JOIN pg_stat_user_tables s ON s.relid = p.relid
+        GROUP BY t.name;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (list(tables),))
+        return {name: int(changes) for name, changes in cur.fetchall()}
+
+def create_connection_pool(db_params, max_connections=DEFAULT_MAX_WORKERS):
+    """
+    스레드 간에 공유할 수 있는 PostgreSQL 연결 풀을 만드는 함수.
+    :return: ThreadedConnectionPool 객체 또는 연결 실패 시 None
+    """
+    try:
+        logger.info(f"⏳ 데이터베이스 연결 풀을 생성합니다... (최대 {max_connections}개)")
+        pool = ThreadedConnectionPool(1, max_connections, connection_factory=CountingConnection, **db_params)
+        logger.info("✅ 데이터베이스 연결 풀 생성에 성공했습니다!")
+        return pool
+    except psycopg2.OperationalError as e:
+        logger.error(f"❌ 데이터베이스 연결 풀 생성 오류: {e}")
+        return None
+
+def _run_pooled_query(pool, name, query, params, fetch_size):
+    """풀에서 연결을 빌려 읽기 전용으로 쿼리를 실행하고, (이름, DataFrame, 소요 시간)을 반환하는 함수."""
+    conn = pool.getconn()
+    autocommit = conn.autocommit
+    try:
+        # 서버 측 커서는 트랜잭션 안에서만 동작하므로 autocommit 없이 사용하고,
+        # 읽기 전용은 세션이 아니라 이번 트랜잭션에만 적용 (풀의 연결을 다른 호출자가 쓰기용으로 빌릴 수 있음)
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION READ ONLY;")
+        started = time.perf_counter()
+        df = fetch_frame(conn, query, params, fetch_size)
+        return name, df, time.perf_counter() - started
+    finally:
+        # 트랜잭션을 끝내고 빌려올 때의 설정으로 되돌린 뒤 반납
+        if not conn.closed:
+            conn.rollback()
+            conn.autocommit = autocommit
+        pool.putconn(conn)
+
+def fetch_frames_concurrently(db_params, queries, max_workers=DEFAULT_MAX_WORKERS, fetch_size=DEFAULT_FETCH_SIZE, pool=None):
+    """
+    서로 독립적인 여러 조회 쿼리를 동시에 실행하여 DataFrame으로 반환하는 함수.
+    - psycopg2는 네트워크 대기 중 GIL을 놓기 때문에 스레드 풀로도 DB 왕복 시간이 겹쳐집니다.
+    - 전체 소요 시간은 쿼리 시간의 합이 아니라 가장 느린 쿼리 시간에 가까워집니다.
+    :param db_params: host, dbname, user, password, port를 포함하는 딕셔너리
+    :param queries: {이름: 쿼리} 또는 {이름: (쿼리, 파라미터)} 딕셔너리
+    :param max_workers: 동시에 실행할 최대 쿼리 수
+    :param pool: 재사용할 연결 풀 (None이면 이 호출 동안만 사용할 풀을 생성)
+    :return: {이름: DataFrame} 딕셔너리 (연결 또는 조회 실패 시 None)
+    """
+    if not queries: return {}
+
+    own_pool = pool is None
+    if own_pool:
+        pool = create_connection_pool(db_params, max_connections=min(max_workers, len(queries)))
+        if pool is None:
+            return None
+
+    step = track_step('load', ', '.join(queries))
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+            futures = []
+            for name, query in queries.items():
+                query, params = query if isinstance(query, tuple) else (query, None)
+                futures.append(executor.submit(_run_pooled_query, pool, name, query, params, fetch_size))
+            results = {}
+            for future in futures:
+                name, df, elapsed = future.result()
+                results[name] = df
+                logger.info(f"✅ [{name}] {len(df)}건 조회 완료 ({elapsed:.3f}초)")
+        logger.info(f"⏱️  동시 조회 {len(queries)}건 전체 소요 시간: {time.perf_counter() - started:.3f}초")
+        step.finish(rows_out=sum(len(df) for df in results.values()))
+        return results
+    except psycopg2.Error as e:
+        logger.error(f"❌ 동시 조회 중 오류 발생: {e}")
+        step.finish(status='error')
+        return None
+    finally:
+        if own_pool:
+            pool.closeall()
+
+def main():
+    """
+    로컬 PostgreSQL에서 동시 조회 계층을 확인하는 점검용 함수.
+    0.5초씩 걸리는 쿼리 3개를 동시에 실행하여 전체 시간이 약 0.5초인지 확인합니다.
+    """
+    from db_config import db_connection_params
+
+    logger.info("--- [db_reader] 동시 조회 점검 시작 ---")
+    queries = {f"sleep_{i}": f"SELECT {i} AS query_no, pg_sleep(0.5)" for i in range(3)}
+    started = time.perf_counter()
+    results = fetch_frames_concurrently(db_connection_params, queries, max_workers=3)
+    elapsed = time.perf_counter() - started
+    if results is None:
+        return
+    ok = all(len(df) == 1 for df in results.values()) and elapsed < 1.0
+    print(f"{'✅' if ok else '❌'} 동시 조회 점검 결과: {elapsed:.3f}초 (순차 실행 시 약 1.5초)")
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,55 @@
-import sys
 import psycopg2
+import psycopg2.extensions
+from psycopg2 import sql
+from metrics import count_round_trip
+from log_config import logger
 
-sys.stdout.reconfigure(encoding='utf-8')
-sys.stderr.reconfigure(encoding='utf-8')
+class CountingCursor(psycopg2.extensions.cursor):
+    """
+    DB 왕복 횟수를 metrics에 집계하는 커서.
+    - 쿼리 실행(execute_values의 페이지 단위 실행 포함)과 COPY를 한 번의 왕복으로 셉니다.
+    - 서버 측(named) 커서는 fetch 호출마다 서버에서 행을 가져오므로 fetch도 셉니다.
+    """
+
+    def execute(self, query, vars=None):
+        count_round_trip()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        count_round_trip(len(vars_list))
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        count_round_trip()
+        return super().copy_expert(sql, file, size)
+
+    def fetchone(self):
+        if self.name: count_round_trip()
+        return super().fetchone()
+
+    def fetchmany(self, size=None):
+        if self.name: count_round_trip()
+        return super().fetchmany(self.arraysize if size is None else size)
+
+    def fetchall(self):
+        if self.name: count_round_trip()
+        return super().fetchall()
+
+class CountingConnection(psycopg2.extensions.connection):
+    """기본 커서를 CountingCursor로 쓰고, commit/rollback도 왕복으로 세는 연결."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CountingCursor
+
+    def commit(self):
+        count_round_trip()
+        return super().commit()
+
+    def rollback(self):
+        count_round_trip()
+        return super().rollback()
 
 def connect_to_db(db_params):
     """
@@ -12,11 +59,11 @@ def connect_to_db(db_params):
     """
     conn = None
     try:
-        print("⏳ 데이터베이스에 연결을 시도합니다...")
-        conn = psycopg2.connect(**db_params)
-        print("✅ 데이터베이스 연결에 성공했습니다!")
+        logger.info("⏳ 데이터베이스에 연결을 시도합니다...")
+        conn = psycopg2.connect(connection_factory=CountingConnection, **db_params)
+        logger.info("✅ 데이터베이스 연결에 성공했습니다!")
     except psycopg2.OperationalError as e:
-        print(f"❌ 데이터베이스 연결 오류: {e}")
+        logger.error(f"❌ 데이터베이스 연결 오류: {e}")
     return conn
 
 def close_db_connection(conn):
@@ -25,5 +72,49 @@ def close_db_connection(conn):
     """
     if conn:
         conn.close()
-        print("\n✅ 데이터베이스 연결을 닫았습니다.")
-        
\ No newline at end of file
+        logger.info("✅ 데이터베이스 연결을 닫았습니다.")
+
+def build_change_aware_upsert_query(table_name, cols, key_cols, source=None):
+    """
+    값이 실제로 바뀐 행만 갱신하는 INSERT ... ON CONFLICT 쿼리를 만드는 함수.
+    - 기존 행과 모든 값이 같으면 UPDATE를 건너뛰므로 dead tuple, WAL, 인덱스 갱신이 발생하지 않습니다.
+    - RETURNING (xmax = 0)으로 신규 삽입(True)과 갱신(False)을 구분합니다. 건너뛴 행은 반환되지 않습니다.
+    :param table_name: 대상 테이블명
+    :param cols: 저장할 컬럼 목록
+    :param key_cols: 충돌 판정(ON CONFLICT)에 사용할 키 컬럼 목록
+    :param source: 입력 행을 제공하는 SQL (기본값: execute_values용 'VALUES %s')
+    :return: psycopg2.sql.Composed 쿼리
+    """
+    update_cols = [col for col in cols if col not in key_cols]
+    set_clause = sql.SQL(', ').join(
+        sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(col)) for col in update_cols
+    )
+    current_values = sql.SQL(', ').join(sql.SQL("t.{}").format(sql.Identifier(col)) for col in update_cols)
+    new_values = sql.SQL(', ').join(sql.SQL("EXCLUDED.{}").format(sql.Identifier(col)) for col in update_cols)
+
+    return sql.SQL("""
+        INSERT INTO {table} AS t ({cols})
+        {source}
+        ON CONFLICT ({keys}) DO UPDATE SET {set_clause}
+        WHERE ROW({current_values}) IS DISTINCT FROM ROW({new_values})
+        RETURNING (xmax = 0) AS inserted
+    """).format(
+        table=sql.Identifier(table_name),
+        cols=sql.SQL(', ').join(map(sql.Identifier, cols)),
+        source=source if source is not None else sql.SQL("VALUES %s"),
+        keys=sql.SQL(', ').join(map(sql.Identifier, key_cols)),
+        set_clause=set_clause,
+        current_values=current_values,
+        new_values=new_values
+    )
+
+def summarize_upsert_result(returned_rows, total_count):
+    """
+    build_change_aware_upsert_query의 RETURNING 결과로 삽입/갱신/변경없음 건수를 집계하는 함수.
+    :param returned_rows: execute_values(..., fetch=True)의 반환값
+    :param total_count: 저장을 시도한 전체 행 수
+    :return: {'inserted': int, 'updated': int, 'unchanged': int}
+    """
+    inserted = sum(1 for (is_inserted,) in returned_rows if is_inserted)
+    updated = len(returned_rows) - inserted
+    return {'inserted': inserted, 'updated': updated, 'unchanged': total_count - inserted - updated}
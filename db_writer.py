@@ -0,0 +1,231 @@
+import time
+import uuid
+from io import StringIO
+import numpy as np
+import pandas as pd
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+from db_utils import build_change_aware_upsert_query, summarize_upsert_result
+from metrics import track_step
+from query_cache import invalidate_table
+from log_config import logger
+
+# 이 행 수 이상이면 COPY(임시 테이블) + 병합 경로를 사용하고, 미만이면 execute_values를 사용합니다.
+# 소량 데이터는 임시 테이블 생성 비용이 COPY의 이득보다 크기 때문입니다.
+COPY_THRESHOLD_ROWS = 2000
+
+# execute_values 한 번에 보내는 행 수 기본값 (psycopg2 기본값 100은 왕복 횟수가 많음)
+# - COPY 기준 행 수와 같게 두어 기본 설정에서는 execute_values 경로가 항상 한 문장으로 실행됩니다.
+#   (bus_vehicle_master의 자기참조 외래 키는 DEFERRABLE이 아니라 문장 단위로 검사되므로,
+#    내연기관차-전기차 쌍이 서로 다른 페이지로 나뉘면 저장이 실패함)
+DEFAULT_PAGE_SIZE = COPY_THRESHOLD_ROWS
+
+# 정수형 컬럼의 PostgreSQL 타입 OID (int2, int4, int8)
+INTEGER_TYPE_OIDS = (21, 23, 20)
+
+# COPY 입력에서 NULL을 나타내는 표식 (빈 문자열과 구분하기 위해 PostgreSQL 기본 표식 사용)
+COPY_NULL_MARKER = '\\N'
+
+def _to_frame(data, columns=None):
+    """DataFrame, {컬럼: 배열} 딕셔너리, numpy 구조화 배열을 DataFrame으로 변환하는 함수."""
+    if isinstance(data, pd.DataFrame):
+        df = data
+    elif isinstance(data, np.ndarray) and data.dtype.names:
+        df = pd.DataFrame.from_records(data)
+    else:
+        df = pd.DataFrame(data)
+    return df[columns] if columns else df
+
+def _temp_table_name(table_name, purpose):
+    """
+    호출마다 다른 임시 테이블 이름을 만드는 함수.
+    - commit=False로 같은 트랜잭션에서 여러 번 호출해도 커밋 전까지 남아 있는 이전 임시 테이블과 이름이 겹치지 않습니다.
+    """
+    return f"tmp_{table_name}_{purpose}_{uuid.uuid4().hex[:8]}"
+
+def _copy_to_temp_table(cur, temp_table, table_name, df, cols):
+    """
+    대상 테이블과 같은 컬럼 타입의 임시 테이블(커밋 시 삭제)을 만들고 DataFrame을 CSV 텍스트로 한 번에 COPY하는 함수.
+    - NaN/NaT/None은 to_csv의 na_rep로 일괄 NULL 처리되며, 셀 단위 파이썬 변환이 없습니다.
+    - NaN 때문에 float가 된 정수 컬럼(sequence_no, model_year 등)은 '3.0'으로 쓰이면 INT 컬럼 COPY가 실패하므로,
+      임시 테이블에서 정수형인 컬럼을 Int64로 바꾼 뒤 CSV로 만듭니다.
+    """
+    cur.execute(sql.SQL("""
+        CREATE TEMP TABLE {temp} ON COMMIT DROP AS
+        SELECT {cols} FROM {table} WITH NO DATA
+    """).format(
+        temp=sql.Identifier(temp_table),
+        cols=sql.SQL(', ').join(map(sql.Identifier, cols)),
+        table=sql.Identifier(table_name)
+    ))
+
+    cur.execute(sql.SQL("SELECT * FROM {temp} LIMIT 0").format(temp=sql.Identifier(temp_table)))
+    integer_cols = [column.name for column in cur.description
+                    if column.type_code in INTEGER_TYPE_OIDS and pd.api.types.is_float_dtype(df[column.name])]
+    if integer_cols:
+        df = df.astype({column: 'Int64' for column in integer_cols})
+
+    buffer = StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL_MARKER, date_format='%Y-%m-%d')
+    buffer.seek(0)
+    copy_query = sql.SQL("COPY {temp} ({cols}) FROM STDIN WITH (FORMAT csv, NULL {null})").format(
+        temp=sql.Identifier(temp_table),
+        cols=sql.SQL(', ').join(map(sql.Identifier, cols)),
+        null=sql.Literal(COPY_NULL_MARKER)
+    )
+    cur.copy_expert(copy_query.as_string(cur), buffer)
+
+def _copy_and_merge(cur, table_name, df, cols, key_cols):
+    """
+    DataFrame을 임시 테이블로 COPY한 뒤, 변경된 행만 대상 테이블에 병합하는 함수.
+    :return: (inserted, updated) 건수
+    """
+    temp_table = _temp_table_name(table_name, 'load')
+    _copy_to_temp_table(cur, temp_table, table_name, df, cols)
+
+    source = sql.SQL("SELECT {cols} FROM {temp}").format(
+        cols=sql.SQL(', ').join(map(sql.Identifier, cols)),
+        temp=sql.Identifier(temp_table)
+    )
+    merge_query = sql.SQL("""
+        WITH upserted AS ({upsert})
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+    """).format(upsert=build_change_aware_upsert_query(table_name, cols, key_cols, source=source))
+    cur.execute(merge_query)
+    inserted, updated = cur.fetchone()
+    return inserted, updated
+
+def _execute_values_upsert(cur, table_name, df, cols, key_cols, page_size):
+    """
+    execute_values로 변경된 행만 저장하는 함수 (소량 데이터용).
+    - NaN/NaT는 컬럼 단위 where()로 한 번에 None으로 바꿉니다.
+    :return: (inserted, updated) 건수
+    """
+    values = list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+    insert_query = build_change_aware_upsert_query(table_name, cols, key_cols)
+    returned_rows = execute_values(cur, insert_query, values, page_size=page_size, fetch=True)
+    result = summarize_upsert_result(returned_rows, len(values))
+    return result['inserted'], result['updated']
+
+def bulk_upsert(conn, table_name, data, key_cols, columns=None, label=None,
+                copy_threshold=COPY_THRESHOLD_ROWS, page_size=DEFAULT_PAGE_SIZE, commit=True):
+    """
+    모든 결과 테이블이 공통으로 사용하는 대량 저장(upsert) 함수.
+    - 데이터 크기에 따라 COPY + 병합 또는 execute_values(page_size 조정) 중 빠른 경로를 선택합니다.
+    - 값이 바뀐 행만 갱신하고, 신규/변경/변경 없음 건수와 소요 시간을 함께 반환합니다.
+    :param conn: psycopg2 connection 객체
+    :param table_name: 대상 테이블명
+    :param data: DataFrame, {컬럼: 배열} 딕셔너리 또는 numpy 구조화 배열
+    :param key_cols: ON CONFLICT에 사용할 키 컬럼 목록
+    :param columns: 저장할 컬럼 목록 (None이면 data의 모든 컬럼)
+    :param label: 출력 메시지에 사용할 데이터 이름 (None이면 테이블명)
+    :param copy_threshold: 이 행 수 이상이면 COPY 경로 사용
+    :param page_size: execute_values 경로의 페이지 크기 (copy_threshold 이상이면 한 문장으로 실행되고,
+                      더 작으면 여러 문장으로 나뉘므로 자기참조 외래 키가 있는 테이블에는 기본값을 사용)
+    :param commit: False면 커밋하지 않음 (호출 측이 다른 작업과 한 트랜잭션으로 커밋, 실패 시에는 롤백)
+    :return: {'inserted', 'updated', 'unchanged', 'rows', 'method', 'seconds', 'rows_per_sec'} 또는 실패 시 None
+    """
+    if not conn: return None
+    df = _to_frame(data, columns)
+    if df.empty: return None
+
+    label = label or table_name
+    cols = df.columns.tolist()
+    # 같은 키가 한 배치에 두 번 나오면 ON CONFLICT가 같은 행을 두 번 갱신할 수 없으므로 마지막 값만 사용
+    df = df.drop_duplicates(subset=key_cols, keep='last')
+    method = 'copy' if len(df) >= copy_threshold else 'execute_values'
+    step = track_step('write', table_name, rows_in=len(df))
+
+    with conn.cursor() as cur:
+        try:
+            logger.info(f"⏳ '{table_name}' 테이블에 {label} 데이터 {len(df)}건을 저장/업데이트합니다... (방식: {method})")
+            started = time.perf_counter()
+            if method == 'copy':
+                inserted, updated = _copy_and_merge(cur, table_name, df, cols, key_cols)
+            else:
+                inserted, updated = _execute_values_upsert(cur, table_name, df, cols, key_cols, page_size)
+            if commit:
+                conn.commit()
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            # DB 오류뿐 아니라 데이터 변환(CSV/타입) 오류에서도 트랜잭션을 남기지 않음
+            logger.error(f"❌ {label} 데이터 저장 오류: {e}")
+            conn.rollback()
+            step.finish(status='error')
+            return None
+
+    metrics = {
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': len(df) - inserted - updated,
+        'rows': len(df),
+        'method': method,
+        'seconds': round(elapsed, 4),
+        'rows_per_sec': round(len(df) / elapsed, 1) if elapsed > 0 else None
+    }
+    step.finish(rows_out=inserted + updated)
+    if inserted or updated:
+        invalidate_table(table_name)
+    logger.info(f"✅ {label} 레코드 저장 완료: 신규 {metrics['inserted']}건, 변경 {metrics['updated']}건, 변경 없음 {metrics['unchanged']}건")
+    logger.info(f"⏱️  {label} 저장 소요 시간: {metrics['seconds']}초 ({metrics['rows_per_sec']} rows/s, {method})")
+    return metrics
+
+def delete_missing_keys(conn, table_name, keys, key_cols, label=None, commit=True):
+    """
+    keys에 없는 키의 행을 대상 테이블에서 삭제하는 함수.
+    - 매 실행 전체를 다시 판정하는 결과 테이블(예: 격리 테이블)에서, 이번에 해당되지 않은 이전 행을 정리할 때 bulk_upsert와 함께 사용합니다.
+    - 남길 키를 임시 테이블로 COPY한 뒤 DELETE ... WHERE NOT EXISTS 한 번으로 삭제합니다.
+    :param keys: 남길 키 (DataFrame 등, key_cols 컬럼 포함, 비어 있으면 전체 삭제)
+    :param commit: False면 커밋하지 않음 (bulk_upsert와 같음)
+    :return: 삭제한 행 수 (실패 시 None)
+    """
+    if not conn: return None
+    label = label or table_name
+    df = _to_frame(keys, key_cols).drop_duplicates()
+    temp_table = _temp_table_name(table_name, 'keep')
+    key_match = sql.SQL(' AND ').join(
+        sql.SQL("k.{col} = t.{col}").format(col=sql.Identifier(col)) for col in key_cols
+    )
+    with conn.cursor() as cur:
+        try:
+            _copy_to_temp_table(cur, temp_table, table_name, df, key_cols)
+            cur.execute(sql.SQL("DELETE FROM {table} t WHERE NOT EXISTS (SELECT 1 FROM {temp} k WHERE {match})").format(
+                table=sql.Identifier(table_name), temp=sql.Identifier(temp_table), match=key_match
+            ))
+            deleted = cur.rowcount
+            if commit:
+                conn.commit()
+        except Exception as e:
+            logger.error(f"❌ {label} 이전 데이터 정리 오류: {e}")
+            conn.rollback()
+            return None
+    if deleted:
+        invalidate_table(table_name)
+    logger.info(f"✅ {label} 이전 데이터 정리 완료: 해당되지 않는 {deleted}건 삭제")
+    return deleted
+
+def sync_table(conn, table_name, data, key_cols, label=None):
+    """
+    대상 테이블을 data와 같게 맞추는 함수. (bulk_upsert + delete_missing_keys를 한 트랜잭션으로 실행)
+    - 매 실행 전체를 다시 판정하는 결과 테이블(격리 테이블)에 사용합니다. 저장이 실패하면 이전 행도 삭제하지 않고 그대로 둡니다.
+    :param data: 저장할 데이터 (비어 있으면 전체 삭제)
+    :return: bulk_upsert 결과에 'deleted'(삭제한 행 수)를 더한 딕셔너리 또는 실패 시 None
+    """
+    if not conn: return None
+    df = _to_frame(data)
+    if df.empty:
+        deleted = delete_missing_keys(conn, table_name, pd.DataFrame(columns=key_cols), key_cols, label=label)
+        return None if deleted is None else {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rows': 0, 'deleted': deleted}
+    metrics = bulk_upsert(conn, table_name, df, key_cols=key_cols, label=label, commit=False)
+    if metrics is None:
+        return None
+    deleted = delete_missing_keys(conn, table_name, df, key_cols, label=label, commit=False)
+    if deleted is None:
+        return None
+    try:
+        conn.commit()
+    except Exception as e:
+        logger.error(f"❌ {label or table_name} 데이터 저장 오류 (커밋): {e}")
+        conn.rollback()
+        return None
+    return {**metrics, 'deleted': deleted}
@@ -1,14 +1,85 @@
+import atexit
+import json
 import logging
 import logging.handlers
 import os
+import queue
+import sys
 
-def setup_logging():
-    """프로젝트 전반에 걸쳐 사용할 표준 로깅을 설정합니다."""
-    log_dir = 'logs'
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+LOG_DIR = 'logs'
+LOG_FILE_PATH = os.path.join(LOG_DIR, 'project.log')
+# 구조화 이벤트(log_event)를 한 줄에 JSON 1개씩 누적하는 파일
+EVENTS_PATH = os.path.join(LOG_DIR, 'events.jsonl')
+
+# run_all.py가 자식 스크립트에 넘기는 실행 ID/단계명 환경 변수 (metrics.py는 이 정의를 가져와 사용)
+RUN_ID_ENV = 'PIPELINE_RUN_ID'
+STAGE_ENV = 'PIPELINE_STAGE'
+
+# 반복 경고를 집계할 때 로그에 함께 남길 예시 키(차량번호 등) 개수
+AGGREGATE_SAMPLE_SIZE = 5
+
+# 로그 레코드를 실제 핸들러(콘솔/파일)로 보내는 백그라운드 리스너 (setup_logging에서 시작)
+_listener = None
+
+class JsonEventFormatter(logging.Formatter):
+    """log_event로 남긴 레코드를 JSON 한 줄로 만드는 포매터."""
+
+    def format(self, record):
+        payload = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'event': record.event,
+            'run_id': os.environ.get(RUN_ID_ENV),
+            'stage': os.environ.get(STAGE_ENV),
+            'message': record.getMessage()
+        }
+        payload.update(getattr(record, 'fields', None) or {})
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+def _is_event(record):
+    """log_event로 남긴(event 속성이 있는) 레코드만 통과시키는 필터."""
+    return hasattr(record, 'event')
+
+def configure_console_encoding():
+    """
+    콘솔 출력 인코딩을 UTF-8로 맞추는 함수.
+    Windows 콘솔의 기본 인코딩(cp949)이 특정 유니코드 문자(예: ⏳)를 지원하지 않아 발생하는 오류를 방지합니다.
+    이미 UTF-8이면 아무것도 하지 않습니다.
+    """
+    for stream in (sys.stdout, sys.stderr):
+        if hasattr(stream, 'reconfigure') and (stream.encoding or '').lower().replace('-', '') != 'utf8':
+            stream.reconfigure(encoding='utf-8')
+
+def _build_handlers(formatter):
+    """콘솔/텍스트 파일/JSON 이벤트 파일 핸들러를 만드는 함수."""
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+
+    if os.environ.get(RUN_ID_ENV):
+        # run_all.py의 자식 프로세스: 여러 프로세스가 같은 파일을 교체(rotate)하면 충돌하므로 추가 쓰기만 하고, 교체는 부모가 맡음
+        file_handler = logging.FileHandler(LOG_FILE_PATH, encoding='utf-8')
+    else:
+        # 파일 핸들러 설정 (TimedRotatingFileHandler로 매일 자정 로그 파일 교체, 7일치 보관)
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE_PATH, when='midnight', interval=1, backupCount=7, encoding='utf-8'
+        )
+    file_handler.setFormatter(formatter)
 
-    log_file_path = os.path.join(log_dir, 'project.log')
+    event_handler = logging.FileHandler(EVENTS_PATH, encoding='utf-8')
+    event_handler.setFormatter(JsonEventFormatter())
+    event_handler.addFilter(_is_event)
+
+    return [console_handler, file_handler, event_handler]
+
+def setup_logging():
+    """
+    프로젝트 전반에 걸쳐 사용할 표준 로깅을 설정합니다.
+    - 로거에는 QueueHandler만 붙이고, 콘솔/파일 쓰기는 QueueListener의 백그라운드 스레드가 처리합니다.
+      (반복문 안에서 로그를 남겨도 호출한 스레드는 큐에 넣기만 하고 바로 돌아옴)
+    - 프로그램 종료 시(atexit) 큐에 남은 레코드를 모두 기록한 뒤 리스너를 멈춥니다.
+    """
+    global _listener
+    os.makedirs(LOG_DIR, exist_ok=True)
 
     # 로거 생성 (프로젝트의 최상위 로거)
     logger = logging.getLogger('GHGERC_BUS_PROJECT')
@@ -18,22 +89,77 @@ def setup_logging():
     if logger.hasHandlers():
         return logger
 
+    configure_console_encoding()
+
     # 포매터 생성 (로그 메시지 형식 정의)
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = _build_handlers(formatter)
 
-    # 콘솔 핸들러 설정
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
 
-    # 파일 핸들러 설정 (TimedRotatingFileHandler로 매일 자정 로그 파일 교체, 7일치 보관)
-    file_handler = logging.handlers.TimedRotatingFileHandler(
-        log_file_path, when='midnight', interval=1, backupCount=7, encoding='utf-8'
-    )
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    if hasattr(os, 'register_at_fork'):
+        # fork로 만든 자식 프로세스(ProcessPoolExecutor 작업자 등)에는 리스너 스레드가 복제되지 않으므로 핸들러를 직접 연결
+        def _use_handlers_directly():
+            logger.removeHandler(queue_handler)
+            for handler in handlers:
+                logger.addHandler(handler)
+        os.register_at_fork(after_in_child=_use_handlers_directly)
 
     return logger
 
 # 다른 모듈에서 `from log_config import logger`로 가져다 쓸 전역 로거 인스턴스
-logger = setup_logging()
\ No newline at end of file
+logger = setup_logging()
+
+def log_event(event, message=None, level=logging.INFO, **fields):
+    """
+    구조화 이벤트를 기록하는 함수. 텍스트 로그에는 message가, EVENTS_PATH에는 event와 fields가 JSON으로 남습니다.
+    :param event: 이벤트 이름 (예: 'baseline.skipped')
+    :param message: 텍스트 로그 메시지 (None이면 이벤트 이름)
+    :param level: 로그 레벨
+    :param fields: JSON에 함께 기록할 값 (예: vehicle_count=12)
+    """
+    # 로그 레벨이 꺼져 있으면 메시지/필드를 만들지 않음
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, message or event, extra={'event': event, 'fields': fields})
+
+class WarningAggregator:
+    """
+    반복문에서 대상(차량 등)마다 나오는 같은 경고를 모아 사유별 건수와 예시 키로 한 번만 기록하는 객체.
+        skipped = WarningAggregator('baseline.skipped')
+        for vehicle_plate_no, group in ...:
+            skipped.add("데이터 부족", vehicle_plate_no, detail=len(group))
+        skipped.flush()
+    """
+
+    def __init__(self, event, level=logging.WARNING, sample_size=AGGREGATE_SAMPLE_SIZE):
+        self.event = event
+        self.level = level
+        self.sample_size = sample_size
+        self._counts = {}
+        self._samples = {}
+
+    def add(self, reason, key, detail=None):
+        """경고 1건을 사유별로 집계하는 함수. 예시는 사유마다 처음 sample_size건만 보관합니다."""
+        self._counts[reason] = self._counts.get(reason, 0) + 1
+        samples = self._samples.setdefault(reason, [])
+        if len(samples) < self.sample_size:
+            samples.append(key if detail is None else f"{key}({detail})")
+
+    def flush(self):
+        """집계한 경고를 사유별로 기록하고 초기화하는 함수. :return: 집계된 전체 건수"""
+        total = sum(self._counts.values())
+        for reason, count in self._counts.items():
+            samples = self._samples[reason]
+            more = ' 외' if count > len(samples) else ''
+            log_event(self.event, f"⚠️ {reason}: {count}건 (예: {', '.join(map(str, samples))}{more})",
+                      level=self.level, reason=reason, count=count, samples=samples)
+        self._counts.clear()
+        self._samples.clear()
+        return total
@@ -0,0 +1,196 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from log_config import logger, RUN_ID_ENV, STAGE_ENV
+
+try:
+    import resource  # Unix 전용 (Windows에서는 최대 RSS를 기록하지 않음)
+except ImportError:
+    resource = None
+
+# 단계/세부 단계 측정 결과를 한 줄에 JSON 1개씩 누적하는 파일
+METRICS_PATH = os.path.join('logs', 'metrics.jsonl')
+
+# 세부 단계 종류: 읽기 / 계산 / 쓰기
+STEP_KINDS = ('load', 'compute', 'write')
+
+def new_run_id():
+    """파이프라인 실행 ID(시각 + 임의 6자리)를 만드는 함수."""
+    return datetime.now().strftime('%Y%m%d_%H%M%S_') + uuid.uuid4().hex[:6]
+
+# run_all.py에서 실행되면 부모의 실행 ID를, 단독 실행이면 새 실행 ID를 사용
+RUN_ID = os.environ.get(RUN_ID_ENV) or new_run_id()
+
+_lock = threading.Lock()
+_round_trips = 0
+# 현재 단계에서 끝난 세부 단계들의 읽은/쓴 행 수 합계 (단계 레코드에 기록)
+_stage_rows = {'load': 0, 'write': 0}
+
+def count_round_trip(count=1):
+    """DB 왕복 횟수를 늘리는 함수. (db_utils의 CountingCursor/CountingConnection이 호출)"""
+    global _round_trips
+    with _lock:
+        _round_trips += count
+
+def db_round_trips():
+    """지금까지 이 프로세스에서 발생한 DB 왕복 횟수를 반환하는 함수."""
+    return _round_trips
+
+def peak_rss_mb():
+    """프로세스의 최대 RSS(MB)를 반환하는 함수. 측정할 수 없는 환경(Windows)에서는 None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 바이트 단위
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+def current_stage():
+    """현재 단계명을 반환하는 함수. (run_all.py가 넘긴 값, 없으면 실행 중인 스크립트 파일명)"""
+    return os.environ.get(STAGE_ENV) or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+
+def emit(record):
+    """측정 레코드를 로거(JSON 문자열)와 METRICS_PATH(JSONL)에 기록하는 함수."""
+    line = json.dumps(record, ensure_ascii=False)
+    logger.info(f"[metrics] {line}")
+    try:
+        os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+        with _lock, open(METRICS_PATH, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    except OSError as e:
+        logger.warning(f"metrics 파일에 기록하지 못했습니다: {e}")
+
+class StepMetrics:
+    """
+    세부 단계(또는 단계 전체)의 벽시계 시간, 입력/출력 행 수, DB 왕복 횟수, 최대 RSS를 측정하는 객체.
+    - 생성 시점에 측정을 시작하고 finish()에서 레코드를 기록합니다. with 문으로도 사용할 수 있습니다.
+    - 코드 블록이 길어 with 문으로 감싸기 어려운 경우: step = track_step(...) ... step.finish(rows_out=...)
+    """
+
+    def __init__(self, kind, name=None, rows_in=None, stage=None):
+        self.kind = kind
+        self.name = name
+        self.stage = stage or current_stage()
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.status = 'ok'
+        self.record = None
+        self._started = time.perf_counter()
+        self._round_trips = db_round_trips()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is SystemExit:
+            self.status = 'ok' if exc.code in (None, 0) else 'error'
+        elif exc_type is not None:
+            self.status = 'error'
+        self.finish()
+        return False
+
+    def finish(self, rows_out=None, status=None):
+        """측정을 끝내고 레코드를 기록하는 함수. 두 번째 호출부터는 무시됩니다."""
+        if self.record is not None:
+            return self.record
+        if rows_out is not None:
+            self.rows_out = rows_out
+        if status is not None:
+            self.status = status
+        wall = time.perf_counter() - self._started
+        # 처리량은 입력/출력 중 큰 쪽 기준 (저장 단계는 변경 없는 행도 처리한 행으로 봄)
+        rows = max((r for r in (self.rows_in, self.rows_out) if r is not None), default=None)
+        self.record = {
+            'run_id': RUN_ID,
+            'ts': datetime.now().isoformat(timespec='seconds'),
+            'stage': self.stage,
+            'step': self.kind if self.name is None else f"{self.kind}:{self.name}",
+            'status': self.status,
+            'wall_s': round(wall, 4),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rows_per_sec': round(rows / wall, 1) if rows and wall > 0 else None,
+            'db_round_trips': db_round_trips() - self._round_trips,
+            'peak_rss_mb': peak_rss_mb()
+        }
+        if self.kind in _stage_rows and self.rows_out is not None:
+            with _lock:
+                _stage_rows[self.kind] += int(self.rows_out)
+        emit(self.record)
+        return self.record
+
+def track_step(kind, name=None, rows_in=None):
+    """
+    세부 단계 측정을 시작하는 함수.
+    :param kind: 'load', 'compute', 'write' 중 하나
+    :param name: 세부 단계 이름 (예: 테이블명)
+    :param rows_in: 입력 행 수 (선택)
+    :return: StepMetrics 객체
+    """
+    return StepMetrics(kind, name, rows_in)
+
+class StageMetrics(StepMetrics):
+    """스크립트 전체(단계)를 측정하는 객체. 입력/출력 행 수는 세부 단계의 읽은/쓴 행 수 합계입니다."""
+
+    def __init__(self, stage=None):
+        super().__init__('stage', stage=stage)
+        with _lock:
+            _stage_rows.update(load=0, write=0)
+
+    def finish(self, rows_out=None, status=None):
+        if self.record is None:
+            self.rows_in = _stage_rows['load']
+            self.rows_out = _stage_rows['write'] if rows_out is None else rows_out
+        return super().finish(status=status)
+
+def track_stage(stage=None):
+    """
+    스크립트 전체를 단계로 측정하는 함수. 각 스크립트의 진입점에서 사용합니다.
+        if __name__ == '__main__':
+            with track_stage():
+                main()
+    """
+    return StageMetrics(stage)
+
+def load_run_records(run_id, path=METRICS_PATH):
+    """METRICS_PATH에서 주어진 실행 ID의 레코드를 기록 순서대로 읽는 함수."""
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('run_id') == run_id:
+                records.append(record)
+    return records
+
+def format_summary(records):
+    """
+    단계/세부 단계 레코드를 표 형식 문자열로 만드는 함수.
+    단계 행 아래에 그 단계의 세부 단계 행을 들여써서 표시합니다.
+    """
+    def fmt(value, spec=''):
+        return '-' if value is None else format(value, spec)
+
+    header = f"{'단계':<36} {'상태':<5} {'시간(s)':>9} {'입력행':>9} {'출력행':>9} {'rows/s':>11} {'DB왕복':>7} {'RSS(MB)':>8}"
+    lines = [header, '-' * len(header)]
+    stages = [r for r in records if r['step'] == 'stage']
+    for stage in stages:
+        rows = [stage] + [r for r in records if r['stage'] == stage['stage'] and r['step'] != 'stage']
+        for r in rows:
+            label = r['stage'] if r is stage else f"  {r['step']}"
+            lines.append(
+                f"{label[:36]:<36} {r['status']:<5} {fmt(r['wall_s'], '.3f'):>9} {fmt(r['rows_in']):>9} "
+                f"{fmt(r['rows_out']):>9} {fmt(r['rows_per_sec'], ',.1f'):>11} {fmt(r['db_round_trips']):>7} "
+                f"{fmt(r['peak_rss_mb']):>8}"
+            )
+    total = sum(r['wall_s'] for r in stages)
+    lines.append('-' * len(header))
+    lines.append(f"{'합계':<36} {'':<5} {total:>9.3f}")
+    return '\n'.join(lines)
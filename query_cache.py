@@ -0,0 +1,246 @@
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import threading
+from log_config import logger, log_event, EVENTS_PATH, RUN_ID_ENV
+
+# 결과를 메모이제이션하는 참조 테이블 (행 수가 적고 여러 단계가 같은 내용을 반복해서 읽는 테이블)
+# - bus_vehicle_master: 10, 02, 04 단계가 각각 전체를 읽음
+MEMOIZED_TABLES = ('bus_vehicle_master',)
+
+# 디스크 캐시(Parquet) 폴더. 실행 ID별 하위 폴더를 사용하며, run_all.py가 실행을 마치면 삭제합니다.
+QUERY_CACHE_DIR = os.path.join('logs', 'query_cache')
+
+# 캐시를 끌 때 사용하는 환경 변수 (예: PIPELINE_QUERY_CACHE=off)
+QUERY_CACHE_ENV = 'PIPELINE_QUERY_CACHE'
+
+# 이 행 수보다 큰 결과는 캐시하지 않음 (메모리/디스크 사용량 제한)
+MAX_CACHED_ROWS = 500000
+
+_lock = threading.Lock()
+# 메모리 캐시: {캐시 키: (관련 테이블 목록, DataFrame)}
+_memory = {}
+# 단독 실행(디스크 캐시 없음)의 테이블 버전: {테이블명: 버전}
+_versions = {}
+_stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'invalidated': 0}
+_stats_registered = False
+_parquet_warned = False
+
+def is_enabled():
+    """캐시 사용 여부를 반환하는 함수. (QUERY_CACHE_ENV가 off/0/false이면 사용하지 않음)"""
+    return os.environ.get(QUERY_CACHE_ENV, '').lower() not in ('off', '0', 'false', 'no')
+
+def run_cache_dir(run_id=None):
+    """
+    실행 ID의 디스크 캐시 폴더를 반환하는 함수.
+    run_all.py의 자식 프로세스(실행 ID 환경 변수가 있는 경우)만 디스크 캐시를 공유하고, 단독 실행은 None(메모리 캐시만 사용)입니다.
+    """
+    run_id = run_id or os.environ.get(RUN_ID_ENV)
+    return os.path.join(QUERY_CACHE_DIR, run_id) if run_id else None
+
+def normalize_query(query, conn=None):
+    """쿼리를 캐시 키용 문자열로 만드는 함수. (psycopg2 sql.Composed는 문자열로 변환, 공백/끝의 세미콜론 정리)"""
+    if hasattr(query, 'as_string'):
+        query = query.as_string(conn)
+    return ' '.join(query.split()).rstrip(';').strip()
+
+def make_cache_key(query, params, watermarks):
+    """정규화된 쿼리, 파라미터, 관련 테이블 상태(변경 통계, 테이블 버전)로 캐시 키(SHA-256)를 만드는 함수."""
+    payload = json.dumps({'query': query, 'params': params, 'watermarks': watermarks}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _disk_path(cache_dir, tables, key):
+    """디스크 캐시 파일 경로. 파일명 앞부분에 관련 테이블을 넣어 테이블 단위로 무효화할 수 있게 합니다."""
+    return os.path.join(cache_dir, f"{'+'.join(sorted(tables))}.{key}.parquet")
+
+def _version_path(cache_dir, table_name):
+    """테이블 버전 파일 경로. (.parquet가 아니므로 캐시 결과 파일로 취급되지 않음)"""
+    return os.path.join(cache_dir, f"{table_name}.version")
+
+def table_version(table_name):
+    """
+    테이블 버전을 반환하는 함수. invalidate_table이 호출될 때마다 1씩 올라갑니다.
+    run_all.py의 자식 프로세스는 실행 ID의 디스크 캐시 폴더에 있는 버전 파일을 공유하고, 단독 실행은 프로세스 안의 값을 사용합니다.
+    """
+    cache_dir = run_cache_dir()
+    if not cache_dir:
+        with _lock:
+            return _versions.get(table_name, 0)
+    try:
+        with open(_version_path(cache_dir, table_name), encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def _bump_version(table_name):
+    """테이블 버전을 1 올리는 함수. (다른 단계가 동시에 올려도 이전 값과 달라지기만 하면 됨)"""
+    cache_dir = run_cache_dir()
+    if not cache_dir:
+        with _lock:
+            _versions[table_name] = _versions.get(table_name, 0) + 1
+        return
+    version = table_version(table_name) + 1
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{_version_path(cache_dir, table_name)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(version))
+        os.replace(tmp_path, _version_path(cache_dir, table_name))
+    except OSError as e:
+        logger.warning(f"⚠️ 쿼리 캐시 테이블 버전을 저장하지 못했습니다: {table_name} ({e})")
+
+def _file_tables(file_name):
+    """디스크 캐시 파일명에서 관련 테이블 목록을 읽는 함수."""
+    return file_name.split('.', 1)[0].split('+')
+
+def _read_disk(path):
+    import pandas as pd
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        logger.warning(f"⚠️ 쿼리 캐시 파일을 읽지 못했습니다: {path} ({e})")
+        return None
+
+def _write_disk(path, df):
+    """Parquet 파일로 저장하는 함수. 다른 단계가 같은 파일을 동시에 읽을 수 있으므로 임시 파일에 쓴 뒤 교체합니다."""
+    global _parquet_warned
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except ImportError:
+        if not _parquet_warned:
+            logger.warning("⚠️ pyarrow가 설치되어 있지 않아 쿼리 캐시를 메모리에만 보관합니다. (pip install pyarrow)")
+            _parquet_warned = True
+    except Exception as e:
+        logger.warning(f"⚠️ 쿼리 캐시 파일을 저장하지 못했습니다: {path} ({e})")
+
+def _count(name):
+    global _stats_registered
+    with _lock:
+        _stats[name] += 1
+        if not _stats_registered:
+            # 프로세스 종료 시 이 프로세스(단계)의 캐시 적중률을 이벤트로 기록
+            atexit.register(log_cache_stats)
+            _stats_registered = True
+
+def cached_query(conn, query, params, tables, loader):
+    """
+    쿼리 결과를 메모이제이션하여 반환하는 함수.
+    - 캐시 키는 정규화된 쿼리 + 파라미터 + 관련 테이블의 상태이므로, 테이블이 바뀌면 키가 달라져 이전 결과를 사용하지 않습니다.
+      테이블 상태는 테이블을 읽지 않는 값만 사용합니다. (적중할 때마다 COUNT(*)/max(xmin)로 전체를 훑지 않음)
+      - 변경 통계(pg_stat_user_tables의 누적 변경 행 수): 다른 프로그램의 쓰기
+      - 테이블 버전(db_writer 저장 후 invalidate_table이 올림): 이번 실행의 쓰기 (통계 반영 지연과 관계없이 바로 바뀜)
+    - 메모리 캐시(같은 프로세스) -> 디스크 캐시(같은 실행의 다른 단계) -> DB 순서로 찾습니다.
+    - 테이블 상태를 먼저 읽은 뒤 결과를 읽으므로, 그 사이에 쓰기가 있어도 오래된 결과가 새 상태로 저장되지 않습니다.
+    :param conn: psycopg2 connection 객체
+    :param query: 실행할 SELECT 쿼리 (문자열 또는 sql.Composed)
+    :param params: 쿼리 파라미터
+    :param tables: 쿼리가 읽는 테이블 목록
+    :param loader: 캐시에 없을 때 결과 DataFrame을 만드는 함수 (인자 없음)
+    :return: 결과 DataFrame (캐시 결과는 복사본이므로 호출 측에서 수정해도 됨)
+    """
+    if not is_enabled():
+        return loader()
+    from db_reader import fetch_table_change_counters
+
+    changes = fetch_table_change_counters(conn, tables)
+    watermarks = {table: [changes.get(table), table_version(table)] for table in tables}
+    key = make_cache_key(normalize_query(query, conn), params, watermarks)
+    with _lock:
+        entry = _memory.get(key)
+    if entry is not None:
+        _count('memory_hits')
+        return entry[1].copy()
+
+    cache_dir = run_cache_dir()
+    path = _disk_path(cache_dir, tables, key) if cache_dir else None
+    df = _read_disk(path) if path and os.path.exists(path) else None
+    if df is not None:
+        _count('disk_hits')
+    else:
+        _count('misses')
+        df = loader()
+        if len(df) > MAX_CACHED_ROWS:
+            return df
+        if path:
+            _write_disk(path, df)
+    with _lock:
+        _memory[key] = (tuple(tables), df)
+    return df.copy()
+
+def invalidate_table(table_name):
+    """
+    테이블 버전을 올리고, 테이블을 읽은 캐시 결과를 메모리/디스크에서 삭제하는 함수. (db_writer가 테이블에 쓴 직후 호출)
+    버전이 키에 들어 있어 오래된 결과가 다시 쓰이지는 않지만, 더는 맞지 않을 결과를 바로 정리합니다.
+    :return: 삭제한 캐시 결과 수
+    """
+    _bump_version(table_name)
+    with _lock:
+        stale = [key for key, (tables, _) in _memory.items() if table_name in tables]
+        for key in stale:
+            del _memory[key]
+    removed = len(stale)
+    cache_dir = run_cache_dir()
+    if cache_dir and os.path.isdir(cache_dir):
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith('.parquet') and table_name in _file_tables(file_name):
+                try:
+                    os.remove(os.path.join(cache_dir, file_name))
+                    removed += 1
+                except OSError:
+                    pass  # 다른 단계가 먼저 삭제한 경우
+    if removed:
+        with _lock:
+            _stats['invalidated'] += removed
+    return removed
+
+def _with_hit_rate(stats):
+    """통계 딕셔너리에 적중률(%)을 추가하는 함수. (조회가 없었으면 None)"""
+    lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups * 100, 1) if lookups else None
+    return stats
+
+def cache_stats():
+    """이 프로세스의 캐시 통계(메모리/디스크 적중, 미스, 무효화 수, 적중률 %)를 반환하는 함수."""
+    with _lock:
+        return _with_hit_rate(dict(_stats))
+
+def log_cache_stats():
+    """캐시 통계를 'query_cache.stats' 이벤트로 기록하는 함수."""
+    stats = cache_stats()
+    hits = stats['memory_hits'] + stats['disk_hits']
+    log_event('query_cache.stats',
+              f"🗃️ 쿼리 캐시: 적중 {hits}건 (메모리 {stats['memory_hits']}, 디스크 {stats['disk_hits']}), "
+              f"미스 {stats['misses']}건, 적중률 {stats['hit_rate']}%", **stats)
+
+def load_run_cache_stats(run_id, path=EVENTS_PATH):
+    """
+    EVENTS_PATH에서 주어진 실행 ID의 단계별 캐시 통계를 모아 합계를 반환하는 함수.
+    :return: cache_stats()와 같은 형식의 딕셔너리 (기록이 없으면 None)
+    """
+    if not os.path.exists(path):
+        return None
+    totals = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'invalidated': 0}
+    found = False
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('event') != 'query_cache.stats' or record.get('run_id') != run_id:
+                continue
+            found = True
+            for name in totals:
+                totals[name] += record.get(name) or 0
+    return _with_hit_rate(totals) if found else None
+
+def clear_run_cache(run_id):
+    """실행 ID의 디스크 캐시 폴더를 삭제하는 함수. (run_all.py가 실행을 마친 뒤 호출)"""
+    cache_dir = run_cache_dir(run_id)
+    if cache_dir and os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir, ignore_errors=True)
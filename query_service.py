@@ -0,0 +1,430 @@
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import quote, unquote, urlsplit
+from urllib.request import Request, urlopen
+import psycopg2
+from db_reader import create_connection_pool, fetch_table_watermarks
+from log_config import logger
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# 동시에 DB를 사용할 수 있는 요청 수 (= 풀의 최대 연결 수)
+DEFAULT_POOL_SIZE = 8
+
+# 메모리에 보관할 최대 응답 수 (0이면 캐시 사용 안 함)
+DEFAULT_CACHE_SIZE = 1024
+
+# 테이블 변경 워터마크를 다시 조회하기 전까지의 최소 간격(초)
+# 요청마다 워터마크를 조회하지 않도록, 이 시간 동안은 직전 조회 결과를 재사용합니다.
+WATERMARK_TTL_SECONDS = 1.0
+
+# 서비스 응답을 만드는 원본 테이블 (이 테이블들의 워터마크가 바뀌면 캐시가 무효화됨)
+SERVICE_TABLES = [
+    'bus_vehicle_master',
+    'bus_baseline_parameters',
+    'bus_emission_reductions'
+]
+
+VEHICLE_QUERY = """
+    SELECT
+        vm.vehicle_plate_no,
+        vm.company_name,
+        vm.business_type,
+        vm.model_year,
+        vm.original_fuel_type,
+        vm.ev_registration_date,
+        bp.baseline_start_ym,
+        bp.baseline_end_ym,
+        bp.months_of_operation,
+        bp.avg_annual_distance_km,
+        bp.avg_annual_fuel_l,
+        bp.fuel_per_km,
+        er.calculated_year,
+        er.baseline_co2_emission_kg,
+        er.ev_actual_co2_emission_kg,
+        er.co2_reduction_kg,
+        er.reduction_category
+    FROM
+        bus_vehicle_master vm
+    LEFT JOIN
+        bus_baseline_parameters bp ON vm.vehicle_plate_no = bp.vehicle_plate_no
+    LEFT JOIN
+        bus_emission_reductions er ON vm.vehicle_plate_no = er.vehicle_plate_no
+    WHERE
+        vm.vehicle_plate_no = %(plate)s;
+"""
+
+COMPANY_VEHICLES_QUERY = """
+    SELECT
+        vm.vehicle_plate_no,
+        vm.business_type,
+        vm.original_fuel_type,
+        vm.ev_registration_date,
+        bp.avg_annual_fuel_l,
+        er.baseline_co2_emission_kg,
+        er.ev_actual_co2_emission_kg,
+        er.co2_reduction_kg
+    FROM
+        bus_vehicle_master vm
+    LEFT JOIN
+        bus_baseline_parameters bp ON vm.vehicle_plate_no = bp.vehicle_plate_no
+    LEFT JOIN
+        bus_emission_reductions er ON vm.vehicle_plate_no = er.vehicle_plate_no
+    WHERE
+        vm.company_name = %(company)s
+    ORDER BY
+        vm.vehicle_plate_no;
+"""
+
+FLEET_QUERY = """
+    SELECT
+        vm.company_name,
+        COUNT(*) AS vehicle_count,
+        COUNT(vm.ev_registration_date) AS ev_count,
+        COUNT(bp.vehicle_plate_no) AS baseline_count,
+        SUM(er.baseline_co2_emission_kg) AS baseline_co2_emission_kg,
+        SUM(er.ev_actual_co2_emission_kg) AS ev_actual_co2_emission_kg,
+        SUM(er.co2_reduction_kg) AS co2_reduction_kg
+    FROM
+        bus_vehicle_master vm
+    LEFT JOIN
+        bus_baseline_parameters bp ON vm.vehicle_plate_no = bp.vehicle_plate_no
+    LEFT JOIN
+        bus_emission_reductions er ON vm.vehicle_plate_no = er.vehicle_plate_no
+    GROUP BY
+        vm.company_name
+    ORDER BY
+        vm.company_name;
+"""
+
+# 합계를 낼 숫자 컬럼 (업체/전체 합계 응답에 사용)
+TOTAL_COLUMNS = ['baseline_co2_emission_kg', 'ev_actual_co2_emission_kg', 'co2_reduction_kg']
+
+class WatermarkLRUCache:
+    """
+    DB 상태(워터마크)와 함께 응답을 보관하는 스레드 안전 LRU 캐시.
+    - 저장 당시의 워터마크와 현재 워터마크가 다르면 해당 항목은 무효로 보고 버립니다.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, state):
+        """현재 워터마크(state)에서 유효한 항목이면 (본문, ETag)를, 아니면 None을 반환합니다."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != state:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, state, body, etag):
+        """응답을 저장하고, 최대 개수를 넘으면 가장 오래 사용하지 않은 항목을 버립니다."""
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (state, body, etag)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """모든 항목과 적중 통계를 지웁니다."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """캐시 크기와 적중률을 딕셔너리로 반환합니다."""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else None
+            }
+
+class QueryService:
+    """
+    조회 전용 HTTP/JSON 서비스의 요청 처리부.
+    - 공유 연결 풀에서 연결을 빌려 쿼리를 실행하고, 응답은 워터마크 기반 LRU 캐시에 보관합니다.
+    - 모든 응답에 본문 해시로 만든 ETag를 붙이며, If-None-Match가 같으면 304를 반환합니다.
+    """
+
+    def __init__(self, db_params, pool_size=DEFAULT_POOL_SIZE, cache_size=DEFAULT_CACHE_SIZE,
+                 watermark_ttl=WATERMARK_TTL_SECONDS):
+        self.pool = create_connection_pool(db_params, max_connections=pool_size)
+        if self.pool is None:
+            raise RuntimeError("데이터베이스 연결 풀을 생성하지 못했습니다.")
+        # ThreadingHTTPServer는 요청마다 스레드를 만들므로, 풀 크기를 넘는 요청은 여기서 대기
+        self.pool_slots = threading.BoundedSemaphore(pool_size)
+        self.cache = WatermarkLRUCache(cache_size)
+        self.watermark_ttl = watermark_ttl
+        self.watermark_lock = threading.Lock()
+        self.watermark_state = None
+        self.watermark_checked_at = 0.0
+
+    def close(self):
+        """연결 풀을 닫습니다."""
+        self.pool.closeall()
+
+    def run_query(self, query, params=None):
+        """풀에서 연결을 빌려 읽기 전용으로 쿼리를 실행하고, 결과를 딕셔너리 목록으로 반환합니다."""
+        with self.pool_slots:
+            conn = self.pool.getconn()
+            try:
+                conn.set_session(readonly=True, autocommit=True)
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    columns = [desc[0] for desc in cur.description]
+                    return [dict(zip(columns, row)) for row in cur.fetchall()]
+            finally:
+                self.pool.putconn(conn)
+
+    def current_state(self):
+        """
+        원본 테이블의 워터마크 지문을 반환합니다.
+        WATERMARK_TTL_SECONDS 안에서는 직전 값을 재사용하여 요청마다 DB를 조회하지 않습니다.
+        """
+        with self.watermark_lock:
+            now = time.monotonic()
+            if self.watermark_state is None or now - self.watermark_checked_at >= self.watermark_ttl:
+                with self.pool_slots:
+                    conn = self.pool.getconn()
+                    try:
+                        conn.set_session(readonly=True, autocommit=True)
+                        watermarks = fetch_table_watermarks(conn, SERVICE_TABLES)
+                    finally:
+                        self.pool.putconn(conn)
+                state = json.dumps({table: list(watermarks[table]) for table in SERVICE_TABLES}, sort_keys=True)
+                self.watermark_state = hashlib.sha256(state.encode('utf-8')).hexdigest()
+                self.watermark_checked_at = now
+            return self.watermark_state
+
+    def vehicle(self, plate):
+        """차량 1대의 마스터, 베이스라인, 감축량 정보를 반환합니다."""
+        rows = self.run_query(VEHICLE_QUERY, {'plate': plate})
+        return rows[0] if rows else None
+
+    def company(self, company_name):
+        """업체 1곳의 차량 목록과 합계를 반환합니다."""
+        vehicles = self.run_query(COMPANY_VEHICLES_QUERY, {'company': company_name})
+        if not vehicles:
+            return None
+        totals = {col: sum(v[col] or 0 for v in vehicles) for col in TOTAL_COLUMNS}
+        return {
+            'company_name': company_name,
+            'vehicle_count': len(vehicles),
+            'ev_count': sum(1 for v in vehicles if v['ev_registration_date']),
+            'totals': totals,
+            'vehicles': vehicles
+        }
+
+    def fleet(self):
+        """전체 차량의 업체별 합계와 총합계를 반환합니다."""
+        companies = self.run_query(FLEET_QUERY)
+        totals = {col: sum(c[col] or 0 for c in companies) for col in TOTAL_COLUMNS}
+        totals['vehicle_count'] = sum(c['vehicle_count'] for c in companies)
+        totals['ev_count'] = sum(c['ev_count'] for c in companies)
+        return {'totals': totals, 'companies': companies}
+
+    def build_payload(self, path):
+        """요청 경로에 맞는 응답 데이터를 만듭니다. 알 수 없는 경로나 없는 대상은 None을 반환합니다."""
+        parts = [unquote(part) for part in path.strip('/').split('/') if part]
+        if parts == ['fleet']:
+            return self.fleet()
+        if len(parts) == 2 and parts[0] == 'vehicles':
+            return self.vehicle(parts[1])
+        if len(parts) == 2 and parts[0] == 'companies':
+            return self.company(parts[1])
+        return None
+
+    def handle(self, path, if_none_match=None):
+        """
+        GET 요청 1건을 처리합니다.
+        :return: (HTTP 상태 코드, 본문 bytes, ETag 또는 None)
+        """
+        path = urlsplit(path).path
+        if path.rstrip('/') == '/health':
+            body = json.dumps({'status': 'ok', 'cache': self.cache.stats()}).encode('utf-8')
+            return 200, body, None
+
+        state = self.current_state()
+        cached = self.cache.get(path, state)
+        if cached:
+            body, etag = cached
+        else:
+            payload = self.build_payload(path)
+            if payload is None:
+                return 404, json.dumps({'error': 'not found', 'path': path}).encode('utf-8'), None
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            self.cache.put(path, state, body, etag)
+
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return 304, b'', etag
+        return 200, body, etag
+
+class QueryServiceHandler(BaseHTTPRequestHandler):
+    """QueryService에 GET 요청을 전달하는 HTTP 요청 처리기."""
+    protocol_version = 'HTTP/1.1'
+    verbose = False
+
+    def do_GET(self):
+        try:
+            status, body, etag = self.server.service.handle(self.path, self.headers.get('If-None-Match'))
+        except psycopg2.Error as e:
+            status, body, etag = 503, json.dumps({'error': str(e).strip()}).encode('utf-8'), None
+        except Exception as e:
+            # 처리기 스레드가 응답 없이 끝나지 않도록 예상하지 못한 오류도 JSON 오류 응답으로 돌려줌
+            logger.exception(f"❌ 요청 처리 중 오류 발생: {self.path}")
+            status, body, etag = 500, json.dumps({'error': 'internal server error', 'detail': str(e)}).encode('utf-8'), None
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if status != 304:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 요청마다 출력하면 처리량이 떨어지므로 --verbose일 때만 출력
+        if self.verbose:
+            super().log_message(format, *args)
+
+def create_server(db_params, host=DEFAULT_HOST, port=DEFAULT_PORT, pool_size=DEFAULT_POOL_SIZE,
+                  cache_size=DEFAULT_CACHE_SIZE, verbose=False):
+    """
+    조회 서비스 HTTP 서버를 생성하는 함수. (서버 실행은 호출 측에서 serve_forever()로 시작)
+    :return: ThreadingHTTPServer 객체 (server.service로 QueryService에 접근)
+    """
+    handler = type('ConfiguredQueryServiceHandler', (QueryServiceHandler,), {'verbose': verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.service = QueryService(db_params, pool_size=pool_size, cache_size=cache_size)
+    return server
+
+def _request(url, etag=None):
+    """벤치마크용 GET 요청. (상태 코드, ETag)를 반환합니다."""
+    request = Request(url, headers={'If-None-Match': etag} if etag else {})
+    try:
+        with urlopen(request) as response:
+            response.read()
+            return response.status, response.headers.get('ETag')
+    except HTTPError as e:
+        return e.code, e.headers.get('ETag')
+
+def _measure(label, urls, concurrency, etags=None):
+    """urls를 concurrency개 스레드로 요청하고 초당 요청 수를 기록/반환합니다."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(lambda url: _request(url, (etags or {}).get(url))[0], urls))
+    elapsed = time.perf_counter() - started
+    rps = len(urls) / elapsed if elapsed > 0 else 0.0
+    status_counts = {status: statuses.count(status) for status in sorted(set(statuses))}
+    logger.info(f"⏱️  {label}: {len(urls)}건 / {elapsed:.3f}초 = {rps:,.1f} req/s (상태 코드: {status_counts})")
+    return rps
+
+def run_benchmark(db_params, total_requests=2000, concurrency=8):
+    """
+    로컬 PostgreSQL을 대상으로 서비스의 초당 요청 수를 측정하는 함수.
+    - 캐시 미사용 / LRU 캐시 적중 / ETag 조건부 요청(304) 세 경우를 비교합니다.
+    """
+    server = create_server(db_params, port=0, pool_size=concurrency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    service = server.service
+
+    try:
+        fleet = service.fleet()
+        companies = [c['company_name'] for c in fleet['companies']]
+        plates = [row['vehicle_plate_no'] for row in service.run_query(
+            "SELECT vehicle_plate_no FROM bus_vehicle_master ORDER BY vehicle_plate_no LIMIT 200;")]
+        if not plates:
+            logger.warning("⚠️ 벤치마크할 차량 데이터가 없습니다. 01번부터 스크립트를 실행했는지 확인해주세요.")
+            return
+
+        paths = ['/fleet'] + [f"/companies/{quote(c)}" for c in companies] + [f"/vehicles/{quote(p)}" for p in plates]
+        urls = [base_url + paths[i % len(paths)] for i in range(total_requests)]
+        logger.info(f"⏳ 벤치마크: 경로 {len(paths)}개, 요청 {total_requests}건, 동시 요청 {concurrency}개")
+
+        cache_size = service.cache.max_entries
+        service.cache.max_entries = 0
+        service.cache.clear()
+        _measure("캐시 미사용", urls, concurrency)
+
+        service.cache.max_entries = cache_size
+        _measure("LRU 캐시 (첫 요청 포함)", urls, concurrency)
+        _measure("LRU 캐시 적중", urls, concurrency)
+
+        etags = {base_url + path: _request(base_url + path)[1] for path in paths}
+        _measure("ETag 조건부 요청 (304)", urls, concurrency, etags)
+        logger.info(f"ℹ️ 캐시 통계: {service.cache.stats()}")
+    finally:
+        server.shutdown()
+        server.service.close()
+
+def main():
+    """메인 실행 함수."""
+    from db_config import db_connection_params
+
+    parser = argparse.ArgumentParser(description="베이스라인/감축량 조회 전용 로컬 HTTP(JSON) 서비스")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"바인딩 주소 (기본값: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"포트 (기본값: {DEFAULT_PORT})")
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE,
+                        help=f"DB 연결 풀 크기 (기본값: {DEFAULT_POOL_SIZE})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help=f"LRU 캐시 최대 응답 수, 0이면 캐시 미사용 (기본값: {DEFAULT_CACHE_SIZE})")
+    parser.add_argument('--verbose', action='store_true', help="요청마다 접근 로그를 출력합니다.")
+    parser.add_argument('--benchmark', action='store_true', help="서비스를 띄우지 않고 초당 요청 수를 측정합니다.")
+    parser.add_argument('--requests', type=int, default=2000, help="벤치마크 요청 수 (기본값: 2000)")
+    parser.add_argument('--concurrency', type=int, default=8, help="벤치마크 동시 요청 수 (기본값: 8)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        logger.info("--- [query_service] 조회 서비스 벤치마크 시작 ---")
+        run_benchmark(db_connection_params, total_requests=args.requests, concurrency=args.concurrency)
+        return
+
+    logger.info("--- [query_service] 조회 서비스 시작 ---")
+    try:
+        server = create_server(db_connection_params, host=args.host, port=args.port, pool_size=args.pool_size,
+                               cache_size=args.cache_size, verbose=args.verbose)
+    except RuntimeError as e:
+        logger.error(f"❌ {e}")
+        return
+    logger.info(f"✅ http://{args.host}:{args.port} 에서 요청을 받습니다. (종료: Ctrl+C)")
+    logger.info("   GET /vehicles/<차량번호>, /companies/<업체명>, /fleet, /health")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("ℹ️ 서비스를 종료합니다.")
+    finally:
+        server.server_close()
+        server.service.close()
+
+if __name__ == '__main__':
+    main()
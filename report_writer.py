@@ -0,0 +1,129 @@
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from log_config import logger
+
+# Excel 시트 한 장의 최대 행 수 (머리글 행 포함)
+EXCEL_MAX_ROWS = 1048576
+
+def split_sheet_name(base_name, part):
+    """행 수 제한으로 나뉜 시트의 이름을 만드는 함수. 예: '월별 운행기록 (2)'"""
+    return f"{base_name} ({part})"
+
+def _iter_rows(chunks):
+    """DataFrame 청크를 (머리글, 행 튜플) 순서로 풀어내는 제너레이터. NaN/NaT는 빈 셀(None)로 변환합니다."""
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        values = chunk.astype(object).where(chunk.notna(), None)
+        columns = list(chunk.columns)
+        for row in values.itertuples(index=False, name=None):
+            yield columns, row
+
+def safe_filename(name):
+    """업체명 등을 파일명으로 쓸 수 있도록 경로/예약 문자를 '_'로 바꾸는 함수."""
+    cleaned = re.sub(r'[\\/:*?"<>|\s]+', '_', str(name)).strip('._')
+    return cleaned or 'unnamed'
+
+def assign_safe_filenames(names):
+    """
+    이름마다 겹치지 않는 파일명(확장자 제외)을 정하는 함수.
+    - safe_filename 결과가 다른 이름과 겹치면(대소문자만 다른 경우 포함) 원래 이름의 짧은 해시를 붙이고 경고를 남깁니다.
+      (예: 'A/B운수'와 'A:B운수'가 모두 'A_B운수'가 되어 서로 덮어쓰지 않도록 함)
+    :return: {이름: 파일명} 딕셔너리
+    """
+    stems = {name: safe_filename(name) for name in names}
+    counts = {}
+    for stem in stems.values():
+        counts[stem.lower()] = counts.get(stem.lower(), 0) + 1
+    for name, stem in stems.items():
+        if counts[stem.lower()] > 1:
+            digest = hashlib.sha1(str(name).encode('utf-8')).hexdigest()[:8]
+            stems[name] = f"{stem}_{digest}"
+            logger.warning(f"⚠️ 파일명이 다른 이름과 겹쳐 해시를 붙입니다: '{name}' -> {stems[name]}")
+    return stems
+
+def write_streaming_workbook(report_path, sheets, max_rows_per_sheet=EXCEL_MAX_ROWS, verbose=True):
+    """
+    openpyxl의 write-only 모드로 Excel 파일을 스트리밍 저장하는 함수.
+    - 행은 시트별 임시 파일로 바로 기록되므로, 데이터 크기와 관계없이 메모리 사용량이 일정합니다.
+    - 시트 행 수가 max_rows_per_sheet를 넘으면 '시트명 (1)', '시트명 (2)' ... 로 자동 분할합니다.
+    :param report_path: 저장할 파일 경로
+    :param sheets: [(시트명, DataFrame 청크 이터러블)] 목록
+    :param max_rows_per_sheet: 시트 한 장의 최대 행 수 (머리글 포함)
+    :param verbose: 시트별 기록 결과와 소요 시간 출력 여부
+    :return: [(실제 시트명, 데이터 행 수)] 목록
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    written_sheets = []
+    started = time.perf_counter()
+
+    for base_name, chunks in sheets:
+        parts = []  # [워크시트, 데이터 행 수]
+        for columns, row in _iter_rows(chunks):
+            if not parts or parts[-1][1] + 1 >= max_rows_per_sheet:
+                if len(parts) == 1:
+                    # 두 번째 시트가 필요해진 시점에 첫 시트 이름을 '(1)'로 변경
+                    parts[0][0].title = split_sheet_name(base_name, 1)
+                title = base_name if not parts else split_sheet_name(base_name, len(parts) + 1)
+                worksheet = workbook.create_sheet(title=title)
+                worksheet.append(columns)
+                parts.append([worksheet, 0])
+            parts[-1][0].append(row)
+            parts[-1][1] += 1
+
+        if not parts:
+            # 데이터가 없어도 시트는 만들어 보고서 구성을 유지
+            parts.append([workbook.create_sheet(title=base_name), 0])
+
+        for worksheet, row_count in parts:
+            written_sheets.append((worksheet.title, row_count))
+            if verbose:
+                logger.info(f"✅ '{worksheet.title}' 시트에 {row_count}개 행을 기록했습니다.")
+
+    workbook.save(report_path)
+    if verbose:
+        logger.info(f"⏱️  스트리밍 보고서 저장 소요 시간: {time.perf_counter() - started:.3f}초")
+    return written_sheets
+
+def write_report_job(report_path, sheets):
+    """
+    프로세스 풀 작업자에서 실행되는 보고서 1건 저장 함수.
+    (작업자 프로세스가 pickle로 불러올 수 있도록 DB 설정을 import하지 않는 이 모듈에 둡니다.)
+    :param report_path: 저장할 파일 경로
+    :param sheets: [(시트명, DataFrame)] 목록
+    :return: (파일 경로, [(실제 시트명, 데이터 행 수)], 소요 시간)
+    """
+    started = time.perf_counter()
+    written_sheets = write_streaming_workbook(report_path, [(name, [df]) for name, df in sheets], verbose=False)
+    return report_path, written_sheets, time.perf_counter() - started
+
+def write_reports_in_parallel(jobs, max_workers=None):
+    """
+    여러 보고서를 프로세스 풀에서 동시에 저장하는 함수.
+    - openpyxl 셀 생성과 xlsx 직렬화는 CPU 작업이므로 스레드 대신 프로세스로 나눠 코어 수만큼 확장합니다.
+    :param jobs: {작업 키: (파일 경로, [(시트명, DataFrame)])} 딕셔너리
+    :param max_workers: 작업자 프로세스 수 (None이면 CPU 코어 수)
+    :return: {작업 키: (파일 경로, [(실제 시트명, 데이터 행 수)], 소요 시간)} 딕셔너리 (실패한 작업은 제외)
+    """
+    if not jobs: return {}
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    results = {}
+    started = time.perf_counter()
+    logger.info(f"⏳ 보고서 {len(jobs)}건을 작업자 프로세스 {max_workers}개로 저장합니다...")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(write_report_job, path, sheets): key for key, (path, sheets) in jobs.items()}
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+                logger.info(f"✅ [{done_count}/{len(jobs)}] {key} 보고서 저장 완료 ({results[key][2]:.3f}초)")
+            except Exception as e:
+                logger.error(f"❌ [{done_count}/{len(jobs)}] {key} 보고서 저장 오류: {e}")
+    logger.info(f"⏱️  보고서 {len(results)}건 병렬 저장 전체 소요 시간: {time.perf_counter() - started:.3f}초")
+    return results
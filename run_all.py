@@ -1,12 +1,247 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import pstats
 import subprocess
 import sys
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
 from log_config import logger # 로거 임포트
+from metrics import RUN_ID, RUN_ID_ENV, STAGE_ENV, load_run_records, format_summary
+from query_cache import cache_stats, clear_run_cache, load_run_cache_stats
 
-def run_script(script_name):
+# 프로파일 결과 저장 폴더
+PROFILE_DIR = os.path.join('logs', 'profiles')
+
+# 파이프라인의 핵심 스크립트 목록 (실행 순서)
+PIPELINE_SCRIPTS = [
+    '01_insert_monthly_data.py',        # 1. 데이터 생성 및 적재
+    '10_screen_monthly_data.py',        # 2. 월별 연료 데이터 품질 검사 (격리)
+    '02_calculate_baseline.py',         # 3. 베이스라인 계산 (격리된 월 제외)
+    '08_calculate_ev_emission.py',      # 4. 전기버스 간접배출량 산정 (충전량 기반)
+    '07_calculate_ev_period.py',        # 5. 전기버스 운행기간 계산
+    '04_calculate_business_target.py',  # 6. 감축량 계산 (단순)
+    '05_co2_reduction_calc.py',         # 7. 감축량 계산 (상세, 덮어쓰기)
+    '03_display_baseline.py',           # 8. 베이스라인 결과 확인 (콘솔)
+    '06_Report.py'                      # 9. 최종 결과 보고서 생성 (Excel)
+]
+
+# 단계 체크포인트(완료 표시 + 입력 지문)를 저장하는 파일 (--resume에서 사용)
+CHECKPOINT_PATH = os.path.join('logs', 'checkpoints.json')
+
+# 단계별 입력 테이블: --resume 시 이 테이블들의 누적 변경 행 수(pg_stat)가 마지막 완료 때와 같으면 단계를 건너뜀
+# (지문은 단계가 끝난 직후의 상태로 기록하므로, 05처럼 앞 단계(04)가 덮어쓰는 출력 테이블을 넣으면 덮어쓴 뒤 다시 실행됨)
+STAGE_INPUT_TABLES = {
+    '00_edit_db.py': [],
+    '01_insert_monthly_data.py': [],
+    '10_screen_monthly_data.py': ['bus_vehicle_master', 'bus_monthly_fuel_data', 'bus_driving_records'],
+    '02_calculate_baseline.py': ['bus_vehicle_master', 'bus_monthly_fuel_data', 'bus_monthly_quarantine'],
+    '08_calculate_ev_emission.py': ['bus_vehicle_master', 'bus_driving_records', 'grid_emission_factors'],
+    '07_calculate_ev_period.py': ['bus_vehicle_master', 'bus_driving_records'],
+    '04_calculate_business_target.py': ['bus_vehicle_master', 'bus_baseline_parameters', 'bus_ev_annual_emissions'],
+    '05_co2_reduction_calc.py': ['bus_vehicle_master', 'bus_vehicle_lineage', 'bus_baseline_parameters', 'bus_monthly_fuel_data',
+                                 'bus_ev_annual_emissions', 'bus_emission_reductions'],
+    '03_display_baseline.py': ['bus_vehicle_master', 'bus_baseline_parameters'],
+    '06_Report.py': ['bus_vehicle_master', 'bus_baseline_parameters', 'bus_emission_reductions', 'bus_driving_records']
+}
+
+# 모든 단계의 계산 결과에 영향을 주는 공용 모듈 (내용이 바뀌면 모든 단계를 다시 실행)
+SHARED_SOURCES = ['constants.py']
+
+# 단계 의존성: {스크립트: 먼저 끝나야 하는 스크립트 목록}
+# 의존 단계가 모두 끝난 단계는 --workers 개수까지 동시에 실행합니다. (예: 03은 02만 끝나면 04/05와 함께 실행)
+# 값을 바꿀 때는 STAGE_INPUT_TABLES의 입력 테이블을 쓰는 단계가 모두 포함되어야 합니다.
+STAGE_DEPENDENCIES = {
+    '00_edit_db.py': [],
+    '01_insert_monthly_data.py': ['00_edit_db.py'],
+    '10_screen_monthly_data.py': ['01_insert_monthly_data.py'],
+    '02_calculate_baseline.py': ['10_screen_monthly_data.py'],
+    '08_calculate_ev_emission.py': ['01_insert_monthly_data.py'],
+    '07_calculate_ev_period.py': ['01_insert_monthly_data.py'],
+    '04_calculate_business_target.py': ['02_calculate_baseline.py', '08_calculate_ev_emission.py'],
+    '05_co2_reduction_calc.py': ['04_calculate_business_target.py'],  # 04의 감축량을 덮어쓰므로 04 다음에 실행
+    '03_display_baseline.py': ['02_calculate_baseline.py'],
+    '06_Report.py': ['05_co2_reduction_calc.py']
+}
+
+# 동시에 실행할 단계 수 기본값 (01 이후 10/07/08이 함께 실행 가능)
+DEFAULT_WORKERS = 3
+
+# 동시 실행 중인 단계의 출력이 섞이지 않도록 콘솔 쓰기를 보호하는 잠금
+_output_lock = threading.Lock()
+# 여러 작업 스레드가 같은 체크포인트 파일을 읽고 쓰므로 보호하는 잠금
+_checkpoint_lock = threading.Lock()
+
+def build_script_list(reset_db=False):
+    """
+    실행할 (스크립트, 인자 목록) 순서를 만드는 함수.
+    :param reset_db: True면 00_edit_db.py로 모든 테이블을 재생성, False면 기존 데이터를 유지한 채 마이그레이션만 적용
+    """
+    # 초기화하지 않는 경우에도 기존 데이터를 유지한 채 스키마를 최신 버전으로 맞춤
+    scripts = [('00_edit_db.py', []) if reset_db else ('00_edit_db.py', ['--migrate'])]
+    return scripts + [(script, []) for script in PIPELINE_SCRIPTS]
+
+def resolve_stage(name, scripts):
+    """
+    단계 이름(파일명, 확장자 없는 이름, 번호 중 하나)을 실행 목록의 스크립트 파일명으로 바꾸는 함수.
+    예: '02', '02_calculate_baseline', '02_calculate_baseline.py'
+    :return: 스크립트 파일명 (없으면 None)
+    """
+    name = os.path.basename(name)
+    for script in scripts:
+        if name in (script, os.path.splitext(script)[0], script.split('_', 1)[0]):
+            return script
+    return None
+
+def select_scripts(scripts_to_run, start=None, only=None):
+    """
+    실행 목록에서 --from/--only로 지정한 단계만 남기는 함수.
+    :param scripts_to_run: [(스크립트, 인자 목록)] 목록
+    :param start: 이 단계부터 끝까지 실행 (스크립트 파일명)
+    :param only: 이 단계들만 실행 (스크립트 파일명 목록, 순서는 실행 목록을 따름)
+    """
+    if only:
+        return [(script, args) for script, args in scripts_to_run if script in only]
+    if start:
+        names = [script for script, _ in scripts_to_run]
+        return scripts_to_run[names.index(start):]
+    return scripts_to_run
+
+def load_checkpoints():
+    """체크포인트 파일을 읽어 {스크립트: 체크포인트} 딕셔너리로 반환하는 함수."""
+    if not os.path.exists(CHECKPOINT_PATH):
+        return {}
+    try:
+        with open(CHECKPOINT_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ 체크포인트 파일을 읽지 못해 무시합니다: {e}")
+        return {}
+
+def save_checkpoints(checkpoints):
+    """체크포인트를 임시 파일에 쓴 뒤 교체하여, 기록 중 중단되어도 파일이 깨지지 않도록 저장하는 함수."""
+    os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+    temp_path = f"{CHECKPOINT_PATH}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoints, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, CHECKPOINT_PATH)
+
+def update_checkpoint(script_name, **entry):
+    """단계 1개의 체크포인트를 덮어쓰는 함수. (실행 시작/완료/실패 시 호출)"""
+    with _checkpoint_lock:
+        checkpoints = load_checkpoints()
+        checkpoints[script_name] = {'run_id': RUN_ID, **entry}
+        save_checkpoints(checkpoints)
+
+def _file_digest(path):
+    """파일 내용의 SHA-256 값을 반환하는 함수. (파일이 없으면 None)"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def fetch_input_change_counters(tables):
+    """
+    입력 테이블의 누적 변경 행 수를 통계 뷰에서 조회하는 함수. (테이블을 스캔하지 않으며, DB 모듈은 입력 테이블이 있는 단계에서만 불러옴)
+    :return: {테이블명: 누적 변경 행 수} 딕셔너리 (연결 또는 조회 실패 시 None)
+    """
+    try:
+        from db_config import db_connection_params
+        from db_utils import connect_to_db, close_db_connection
+        from db_reader import fetch_table_change_counters
+    except ImportError as e:
+        logger.warning(f"⚠️ DB 모듈을 불러오지 못해 입력 테이블 상태를 확인할 수 없습니다: {e}")
+        return None
+    conn = connect_to_db(db_connection_params)
+    if not conn:
+        return None
+    try:
+        counters = fetch_table_change_counters(conn, tables)
+    except Exception as e:
+        logger.warning(f"⚠️ 입력 테이블 상태 조회 중 오류가 발생했습니다: {e}")
+        return None
+    finally:
+        close_db_connection(conn)
+    return {table: counters[table] for table in tables}
+
+def compute_stage_fingerprint(script_name, args=None):
+    """
+    단계 입력의 지문(SHA-256)을 계산하는 함수.
+    - 스크립트와 공용 모듈의 내용, 실행 인자, 산정 기준월(베이스라인/감축량이 현재 월·연도 기준이므로), 입력 테이블의 누적 변경 행 수를 합칩니다.
+    :return: 지문 문자열 (입력 테이블 상태를 확인할 수 없으면 None)
+    """
+    state = {
+        'source': _file_digest(script_name),
+        'shared': {path: _file_digest(path) for path in SHARED_SOURCES},
+        'args': list(args or []),
+        'period': datetime.now().strftime('%Y%m')
+    }
+    tables = STAGE_INPUT_TABLES.get(script_name, [])
+    if tables:
+        state['tables'] = fetch_input_change_counters(tables)
+        if state['tables'] is None:
+            return None
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+def is_stage_current(script_name, args, checkpoints):
+    """단계가 완료 상태이고 입력 지문이 마지막 완료 때와 같은지 확인하는 함수. (--resume에서 건너뛸지 판단)"""
+    checkpoint = checkpoints.get(script_name)
+    if not checkpoint or checkpoint.get('status') != 'completed' or not checkpoint.get('fingerprint'):
+        return False
+    fingerprint = compute_stage_fingerprint(script_name, args)
+    return fingerprint is not None and fingerprint == checkpoint.get('fingerprint')
+
+def build_command(script_name, args=None, profiler=None):
+    """
+    스크립트 실행 명령을 만드는 함수. profiler를 지정하면 프로파일러 아래에서 실행하도록 감쌉니다.
+    :param profiler: None, 'cprofile', 'pyinstrument' 중 하나
+    :return: (명령 목록, 프로파일 결과 파일 경로 또는 None)
+    """
+    if not profiler:
+        return [sys.executable, script_name] + (args or []), None
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(script_name))[0]
+    if profiler == 'pyinstrument' and importlib.util.find_spec('pyinstrument') is None:
+        logger.warning("'pyinstrument'가 설치되지 않아 cProfile로 대신 측정합니다. ('pip install pyinstrument')")
+        profiler = 'cprofile'
+    if profiler == 'pyinstrument':
+        output_path = os.path.join(PROFILE_DIR, f'{stem}_{RUN_ID}.html')
+        return [sys.executable, '-m', 'pyinstrument', '-r', 'html', '-o', output_path, script_name] + (args or []), output_path
+    output_path = os.path.join(PROFILE_DIR, f'{stem}_{RUN_ID}.prof')
+    return [sys.executable, '-m', 'cProfile', '-o', output_path, script_name] + (args or []), output_path
+
+def log_profile_summary(profile_path, limit=20):
+    """cProfile 결과에서 누적 시간 상위 함수를 로그로 출력하는 함수."""
+    if not profile_path or not profile_path.endswith('.prof') or not os.path.exists(profile_path):
+        return
+    from io import StringIO
+    buffer = StringIO()
+    pstats.Stats(profile_path, stream=buffer).sort_stats('cumulative').print_stats(limit)
+    logger.info(f"--- cProfile 누적 시간 상위 {limit}개 ({profile_path}) ---\n{buffer.getvalue().strip()}")
+
+def write_stage_output(script_name, output):
+    """
+    캡처한 단계 출력을 다른 단계의 출력과 섞이지 않도록 한 덩어리로 콘솔에 쓰는 함수.
+    (파일 로그는 자식 스크립트가 logs/project.log에 직접 기록하므로 로거를 거치지 않음)
+    """
+    if output and not output.endswith('\n'):
+        output += '\n'
+    with _output_lock:
+        sys.stdout.write(f"----- [{script_name}] output -----\n{output}----- [{script_name}] end -----\n")
+        sys.stdout.flush()
+
+def run_script(script_name, args=None, profiler=None, capture=False):
     """
     주어진 Python 스크립트를 현재 인터프리터로 실행하고 결과를 확인하는 함수.
     :param script_name: 실행할 스크립트 파일명
+    :param args: 스크립트에 전달할 명령행 인자 목록 (선택)
+    :param profiler: 이 스크립트를 프로파일러 아래에서 실행 ('cprofile' 또는 'pyinstrument', 선택)
+    :param capture: True면 출력을 캡처했다가 끝난 뒤 한 덩어리로 출력 (여러 단계를 동시에 실행할 때)
     :return: 성공 시 True, 실패 시 False
     """
     logger.info("="*60)
@@ -22,57 +257,219 @@ def run_script(script_name):
     # Windows 콘솔의 기본 인코딩(cp949)이 특정 유니코드 문자(예: ⏳)를 지원하지 않아 발생하는 오류를 방지합니다.
     env = os.environ.copy()
     env['PYTHONIOENCODING'] = 'utf-8'
+    # 자식 스크립트의 측정 레코드(metrics.py)를 이번 실행과 단계로 묶기 위한 값
+    env[RUN_ID_ENV] = RUN_ID
+    env[STAGE_ENV] = os.path.splitext(script_name)[0]
 
-    try:
-        # 현재 파이썬 실행 파일을 사용하여 스크립트 실행
-        result = subprocess.run(
-            [sys.executable, script_name], 
-            check=True, 
-            capture_output=True,
-            text=True,
-            encoding='utf-8', # 자식 프로세스의 출력이 UTF-8이므로, 해당 인코딩으로 해석
-            env=env
-        )
-        # 스크립트의 표준 출력을 그대로 보여줌
-        logger.info(f"--- Output from {script_name} ---\n{result.stdout.strip()}")
-        logger.info(f"✅ Success: '{script_name}' finished successfully.")
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"'{script_name}' failed to execute.")
-        if e.stdout:
-            logger.error(f"--- STDOUT ---\n{e.stdout.strip()}")
-        if e.stderr:
-            logger.error(f"--- STDERR ---\n{e.stderr.strip()}")
+    command, profile_path = build_command(script_name, args, profiler)
+    # 자식 스크립트는 자체 로거로 콘솔과 logs/project.log에 직접 기록하므로 출력을 캡처하지 않고 그대로 흘려보냄
+    # (캡처 후 한 덩어리로 다시 로깅하면 끝날 때까지 진행 상황이 보이지 않고, 같은 로그가 파일에 두 번 남음)
+    if capture:
+        result = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                encoding='utf-8', errors='replace')
+        write_stage_output(script_name, result.stdout)
+    else:
+        result = subprocess.run(command, env=env)
+    if result.returncode != 0:
+        logger.error(f"'{script_name}' failed to execute. (exit code {result.returncode}, 자세한 내용은 위 출력과 logs/project.log 참고)")
         return False
+    logger.info(f"✅ Success: '{script_name}' finished successfully.")
+    if profile_path:
+        logger.info(f"⏱️  Profile saved: {profile_path}")
+        log_profile_summary(profile_path)
+    return True
+
+def log_metrics_summary(stage_times):
+    """
+    이번 실행의 단계/세부 단계 측정 결과를 표로 출력하는 함수.
+    측정 레코드를 남기지 못하고 종료된 단계는 부모 프로세스가 잰 실행 시간만 표시합니다.
+    :param stage_times: [(단계명, 소요 시간(초), 성공 여부)] 목록
+    """
+    records = load_run_records(RUN_ID)
+    recorded = {r['stage'] for r in records if r['step'] == 'stage'}
+    for stage, seconds, ok in stage_times:
+        if stage not in recorded:
+            records.append({'stage': stage, 'step': 'stage', 'status': 'ok' if ok else 'error', 'wall_s': round(seconds, 4),
+                            'rows_in': None, 'rows_out': None, 'rows_per_sec': None, 'db_round_trips': None, 'peak_rss_mb': None})
+    logger.info(f"===== ⏱️  Stage metrics (run_id: {RUN_ID}) =====\n{format_summary(records)}")
+    # 자식 프로세스(run_all.py)는 종료 시 이벤트로 남긴 통계를, 한 프로세스 실행(cli.py run)은 현재 프로세스의 통계를 사용
+    stats = load_run_cache_stats(RUN_ID) or cache_stats()
+    if stats['hit_rate'] is not None:
+        logger.info(f"🗃️  Query cache: 적중 {stats['memory_hits'] + stats['disk_hits']}건 "
+                    f"(메모리 {stats['memory_hits']}, 디스크 {stats['disk_hits']}), 미스 {stats['misses']}건, "
+                    f"무효화 {stats['invalidated']}건, 적중률 {stats['hit_rate']}%")
+
+def run_stage_with_checkpoint(script_name, args, profiler=None, capture=False, runner=None, fingerprint=False):
+    """
+    단계 1개를 실행하고 시작/완료/실패 체크포인트를 기록하는 함수. (작업 스레드에서 호출)
+    :param fingerprint: True면 완료 시 입력 지문도 기록 (--resume 실행에서만 사용하므로, 그 외에는 DB 조회 없이 완료 표시만 기록)
+    :param runner: 단계 실행 함수 (run_script와 같은 인자, None이면 run_script로 자식 프로세스에서 실행)
+    :return: (성공 여부, 소요 시간(초))
+    """
+    update_checkpoint(script_name, status='running', started_at=datetime.now().isoformat(timespec='seconds'))
+    started = time.perf_counter()
+    ok = (runner or run_script)(script_name, args, profiler=profiler, capture=capture)
+    seconds = time.perf_counter() - started
+    if ok:
+        # 단계가 끝난 직후의 입력 상태를 지문으로 기록 (다음 --resume에서 비교)
+        update_checkpoint(script_name, status='completed',
+                          fingerprint=compute_stage_fingerprint(script_name, args) if fingerprint else None,
+                          finished_at=datetime.now().isoformat(timespec='seconds'), wall_s=round(seconds, 4))
+    else:
+        update_checkpoint(script_name, status='failed', finished_at=datetime.now().isoformat(timespec='seconds'))
+    return ok, seconds
+
+def run_stages(scripts_to_run, workers=1, resume=False, profile=None, profiler='cprofile', runner=None):
+    """
+    STAGE_DEPENDENCIES에 따라 의존 단계가 끝난 단계를 최대 workers개까지 동시에 실행하는 함수.
+    - 실행 목록에 없는 의존 단계(--from/--only로 제외)는 이미 끝난 것으로 봅니다.
+    - 한 단계가 실패하면 새 단계를 시작하지 않고, 실행 중인 단계가 끝나기를 기다린 뒤 반환합니다.
+    - workers가 1이면 실행 목록 순서대로 1개씩 실행하고 출력을 실시간으로 표시합니다.
+    :param scripts_to_run: [(스크립트, 인자 목록)] 목록 (의존 단계가 앞에 오는 순서)
+    :param runner: 단계 실행 함수 (None이면 run_script, 한 프로세스 실행(cli.py run)은 workers=1과 함께 사용)
+    :return: (단계별 [(단계명, 소요 시간(초), 성공 여부)], {스크립트: 소요 시간(초)}, 건너뛴 스크립트 목록, 실패한 스크립트 또는 None)
+    """
+    script_args = dict(scripts_to_run)
+    pending = [script for script, _ in scripts_to_run]
+    done, skipped, durations, stage_times = set(), [], {}, []
+    running = {}
+    failed = None
+    capture = workers > 1
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            if failed is None:
+                # 실행 목록 순서대로 훑으므로, 건너뛴 단계 뒤의 단계도 같은 반복에서 시작할 수 있음
+                for script in list(pending):
+                    if len(running) >= workers:
+                        break
+                    if any(dep in script_args and dep not in done for dep in STAGE_DEPENDENCIES.get(script, [])):
+                        continue
+                    pending.remove(script)
+                    if resume and is_stage_current(script, script_args[script], load_checkpoints()):
+                        logger.info(f"⏭️  Skipped: '{script}' (완료 체크포인트가 있고 입력이 바뀌지 않음)")
+                        skipped.append(script)
+                        done.add(script)
+                        durations[script] = 0.0
+                        continue
+                    stage_profiler = profiler if profile and os.path.basename(profile) == script else None
+                    future = executor.submit(run_stage_with_checkpoint, script, script_args[script], stage_profiler, capture, runner, resume)
+                    running[future] = script
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                script = running.pop(future)
+                ok, seconds = future.result()
+                stage_times.append((os.path.splitext(script)[0], seconds, ok))
+                durations[script] = seconds
+                if ok:
+                    done.add(script)
+                elif failed is None:
+                    failed = script
+                    logger.critical(f"Pipeline stopped due to an error in '{script}'. 실행 중인 단계가 끝나기를 기다립니다.")
+
+    return stage_times, durations, skipped, failed
+
+def find_critical_path(durations, scripts):
+    """
+    실행한 단계의 소요 시간과 STAGE_DEPENDENCIES로 임계 경로(의존 관계를 따라 가장 오래 걸리는 단계 사슬)를 구하는 함수.
+    동시 실행 시 파이프라인 전체 시간은 이 경로의 합보다 짧아질 수 없습니다.
+    :param durations: {스크립트: 소요 시간(초)} (건너뛴 단계는 0)
+    :param scripts: 스크립트 목록 (의존 단계가 앞에 오는 순서)
+    :return: (임계 경로 스크립트 목록, 경로 소요 시간 합(초))
+    """
+    finish, previous = {}, {}
+    for script in scripts:
+        if script not in durations:
+            continue
+        deps = [dep for dep in STAGE_DEPENDENCIES.get(script, []) if dep in finish]
+        slowest = max(deps, key=finish.get, default=None)
+        finish[script] = durations[script] + (finish[slowest] if slowest else 0.0)
+        previous[script] = slowest
+    if not finish:
+        return [], 0.0
+    end = max(finish, key=finish.get)
+    path = [end]
+    while previous[path[-1]]:
+        path.append(previous[path[-1]])
+    return path[::-1], finish[end]
+
+def log_critical_path(durations, scripts, wall_seconds):
+    """임계 경로와 전체 실행 시간, 단계 시간 합계를 로그로 출력하는 함수."""
+    path, path_seconds = find_critical_path(durations, scripts)
+    if not path:
+        return
+    stages = ' → '.join(os.path.splitext(script)[0].split('_', 1)[0] for script in path)
+    logger.info(f"⏱️  Critical path: {stages} = {path_seconds:.2f}s "
+                f"(wall {wall_seconds:.2f}s, stage sum {sum(durations.values()):.2f}s)")
+
+def execute_pipeline(scripts_to_run, workers=1, resume=False, reset_db=False, profile=None, profiler='cprofile', runner=None):
+    """
+    run_all.py와 cli.py run이 함께 사용하는 파이프라인 실행 함수.
+    - 체크포인트 기록/--resume, 단계 측정 요약, 실행별 쿼리 캐시 정리, 임계 경로 출력을 한곳에서 처리합니다.
+    :param reset_db: True면 이전 체크포인트를 모두 지움 (DB를 재생성하므로 완료 표시가 의미 없음)
+    :param runner: 단계 실행 함수 (run_stages 참고)
+    :return: 실패한 스크립트 또는 None
+    """
+    if reset_db:
+        save_checkpoints({})
+
+    started = time.perf_counter()
+    stage_times, durations, skipped, failed = run_stages(scripts_to_run, workers, resume, profile, profiler, runner)
+    if skipped:
+        logger.info(f"⏭️  체크포인트로 건너뛴 단계 {len(skipped)}개: {', '.join(skipped)}")
+    log_metrics_summary(stage_times)
+    # 단계 간에 공유한 쿼리 캐시(디스크)는 이번 실행에서만 사용
+    clear_run_cache(RUN_ID)
+    log_critical_path(durations, [script for script, _ in scripts_to_run], time.perf_counter() - started)
+    if failed:
+        logger.critical(f"Pipeline failed in '{failed}'. (이번 실행이 '--resume'이었다면 다시 '--resume'으로 실행할 때 완료된 단계는 건너뜁니다.)")
+    return failed
 
 def main():
-    """메인 함수: 모든 프로젝트 스크립트를 순서대로 실행합니다."""
+    """메인 함수: 모든 프로젝트 스크립트를 의존 관계에 따라 실행합니다."""
+    parser = argparse.ArgumentParser(description="버스 CO2 감축량 산정 파이프라인 실행")
+    parser.add_argument('--reset-db', action='store_true',
+                        help="00_edit_db.py로 모든 테이블을 재생성한 뒤 실행합니다. 체크포인트도 모두 지웁니다. "
+                             "(기본값: 기존 데이터를 유지하고 마이그레이션만 적용)")
+    parser.add_argument('--resume', action='store_true',
+                        help="완료 체크포인트가 있고 입력(스크립트, 인자, 입력 테이블 상태)이 그대로인 단계는 건너뜁니다. "
+                             "입력 지문은 --resume 실행에서만 기록하므로, 처음 실행할 때도 이 옵션을 주어야 합니다.")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument('--from', dest='start', metavar='STAGE',
+                           help="이 단계부터 끝까지 실행합니다. (예: 04, 04_calculate_business_target.py)")
+    selection.add_argument('--only', nargs='+', metavar='STAGE', help="지정한 단계만 실행합니다. (예: --only 02 03)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"의존 단계가 끝난 단계를 동시에 실행할 최대 개수 (기본값: {DEFAULT_WORKERS}, "
+                             "1이면 순서대로 실행하고 출력을 실시간으로 표시)")
+    parser.add_argument('--profile', metavar='SCRIPT',
+                        help="이 스크립트 1개만 프로파일러 아래에서 실행합니다. (예: 02_calculate_baseline.py)")
+    parser.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], default='cprofile',
+                        help="--profile에 사용할 프로파일러 (기본값: cprofile)")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers는 1 이상이어야 합니다.")
+
+    scripts_to_run = build_script_list(args.reset_db)
+    all_scripts = [script for script, _ in scripts_to_run]
+    start = resolve_stage(args.start, all_scripts) if args.start else None
+    if args.start and not start:
+        parser.error(f"알 수 없는 단계: {args.start}")
+    only = [resolve_stage(name, all_scripts) for name in args.only or []]
+    if None in only:
+        parser.error(f"알 수 없는 단계: {' '.join(name for name, script in zip(args.only, only) if not script)}")
+    scripts_to_run = select_scripts(scripts_to_run, start, only)
+
     logger.info("===== 🚌 Bus CO2 Reduction Calculation Pipeline Start =====")
+    logger.info(f"run_id: {RUN_ID}")
 
-    # 사용자에게 DB 초기화 여부 확인
-    reset_db = input("\n❓ 데이터베이스를 초기화하시겠습니까? ('00_edit_db.py' 실행) [y/N]: ").lower().strip()
-    
-    scripts_to_run = []
-    if reset_db == 'y':
-        scripts_to_run.append('00_edit_db.py')
-
-    # 파이프라인의 핵심 스크립트 목록
-    pipeline_scripts = [
-        '01_insert_monthly_data.py',        # 1. 데이터 생성 및 적재
-        '02_calculate_baseline.py',         # 2. 베이스라인 계산
-        '04_calculate_business_target.py',  # 3. 감축량 계산 (단순)
-        '05_co2_reduction_calc.py',         # 4. 감축량 계산 (상세, 덮어쓰기)
-        '03_display_baseline.py',           # 5. 베이스라인 결과 확인 (콘솔)
-        '06_Report.py'                      # 6. 최종 결과 보고서 생성 (Excel)
-    ]
-    scripts_to_run.extend(pipeline_scripts)
-
-    for script in scripts_to_run:
-        if not run_script(script):
-            logger.critical(f"Pipeline stopped due to an error in '{script}'.")
-            sys.exit(1)  # 오류 발생 시 스크립트 종료
+    failed = execute_pipeline(scripts_to_run, args.workers, args.resume, args.reset_db, args.profile, args.profiler)
+    if failed:
+        sys.exit(1)  # 오류 발생 시 스크립트 종료
 
     logger.info("🎉🎉🎉 All scripts executed successfully! Pipeline finished. 🎉🎉🎉")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,569 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+import pandas as pd
+from metrics import track_step, count_round_trip
+from log_config import logger
+from query_cache import MEMOIZED_TABLES
+
+# 저장소 종류: PostgreSQL(운영) / DuckDB(Parquet 스냅샷 분석) / SQLite(테스트, 추가 설치 불필요)
+BACKENDS = ('postgres', 'duckdb', 'sqlite')
+
+# --storage를 지정하지 않았을 때 사용할 저장소 종류를 읽는 환경 변수 (없으면 postgres)
+STORAGE_ENV = 'PIPELINE_STORAGE'
+
+# 09_export_parquet.py의 기본 저장 폴더 (테이블별 하위 폴더, Hive 방식 파티션)
+DEFAULT_SNAPSHOT_DIR = os.path.join('exports', 'parquet')
+
+# 09번 스냅샷의 연도 파티션 폴더(year=2023/) 컬럼과, 그 값을 만든 운행년월 컬럼 (year = 운행년월 / 100)
+# year는 원본 테이블에 없는 컬럼이므로 읽은 결과에서 빼고, 운행년월 필터에서 연도 조건을 만들어 폴더 단위로 걸러냅니다.
+SNAPSHOT_PARTITION_COLUMN = 'year'
+SNAPSHOT_YEAR_MONTH_COLUMNS = ('year_month', 'record_year_month')
+
+# 내장 저장소의 기본 DB 파일 경로
+DEFAULT_PATHS = {
+    'duckdb': os.path.join('exports', 'snapshot.duckdb'),
+    'sqlite': os.path.join('exports', 'snapshot.sqlite')
+}
+
+# load_table의 filters에 사용할 수 있는 비교 연산자
+FILTER_OPERATORS = ('=', '<', '<=', '>', '>=')
+
+# PostgreSQL에서 테이블을 읽을 때 서버 측 커서로 한 번에 가져오는 행 수
+LOAD_CHUNK_ROWS = 50000
+
+# 내장 저장소 upsert에서 저장할 데이터를 잠시 올려두는 테이블(뷰) 이름
+STAGING_TABLE = 'tmp_storage_staged'
+
+_IDENTIFIER = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+def _check_identifiers(*names):
+    """SQL 문자열에 직접 넣는 테이블/컬럼명이 소문자 식별자인지 확인하는 함수."""
+    for name in names:
+        if not _IDENTIFIER.match(name):
+            raise ValueError(f"허용되지 않는 식별자입니다: {name!r}")
+
+def snapshot_year_conditions(filters):
+    """
+    운행년월 필터에서 연도 파티션 조건을 만드는 함수. (예: record_year_month >= 202001 -> year >= 2020)
+    '<', '>'도 경계 연도를 포함하므로 필요한 폴더를 빠뜨리지 않습니다. (행 단위 조건은 원래 필터가 적용)
+    :return: [(연산자, 연도)] 목록
+    """
+    conditions = []
+    for column, operator, value in filters:
+        if column not in SNAPSHOT_YEAR_MONTH_COLUMNS or not pd.api.types.is_integer(value):
+            continue
+        year_operator = {'=': '=', '<': '<=', '<=': '<=', '>': '>=', '>=': '>='}[operator]
+        conditions.append((year_operator, int(value) // 100))
+    return conditions
+
+def _check_filters(filters):
+    """(컬럼, 연산자, 값) 필터 목록을 검사하는 함수."""
+    for column, operator, _ in filters:
+        _check_identifiers(column)
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"허용되지 않는 연산자입니다: {operator!r} (허용: {', '.join(FILTER_OPERATORS)})")
+
+class Storage(ABC):
+    """
+    단계 스크립트가 사용하는 읽기/저장 작업의 공통 인터페이스.
+    - load_table(테이블, 컬럼, 필터): 테이블(또는 조건에 맞는 행)을 DataFrame으로 읽습니다.
+    - upsert(테이블, DataFrame, 키 컬럼): 키 기준으로 신규 행은 추가하고 기존 행은 갱신합니다.
+    - delete_missing(테이블, DataFrame, 키 컬럼): DataFrame에 없는 키의 행을 삭제합니다.
+    - sync(테이블, DataFrame, 키 컬럼): upsert와 delete_missing을 한 트랜잭션으로 실행하여 테이블을 DataFrame과 같게 맞춥니다.
+    - has_table(테이블): 테이블 존재 여부를 반환합니다.
+    구현하지 않은 추상 메서드가 남은 저장소는 객체를 만들 때 TypeError가 발생합니다.
+    """
+    name = None
+
+    def load_table(self, table_name, columns=None, filters=None):
+        """
+        테이블 데이터를 DataFrame으로 불러오는 함수. 실패 시 빈 DataFrame을 반환합니다.
+        :param columns: 읽을 컬럼 목록 (None이면 전체)
+        :param filters: [(컬럼, 연산자, 값)] 목록, AND로 결합 (예: [('record_year_month', '>=', 202001)])
+        """
+        filters = filters or []
+        _check_identifiers(table_name, *(columns or []))
+        _check_filters(filters)
+        condition = ', '.join(f"{column} {operator} {value}" for column, operator, value in filters)
+        logger.info(f"⏳ '{table_name}' 테이블에서 데이터를 로드합니다... ({self.name}{', ' + condition if condition else ''})")
+        step = track_step('load', table_name)
+        try:
+            df = self._load(table_name, columns, filters)
+        except Exception as e:
+            step.finish(status='error')
+            logger.error(f"❌ '{table_name}' 데이터 로드 중 오류 발생: {e}")
+            self._rollback()
+            return pd.DataFrame(columns=columns or [])
+        step.finish(rows_out=len(df))
+        logger.info(f"✅ {len(df)}개의 '{table_name}' 데이터를 성공적으로 로드했습니다.")
+        return df
+
+    @abstractmethod
+    def upsert(self, table_name, df, key_cols, label=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_missing(self, table_name, df, key_cols, label=None):
+        """df에 없는 키의 행을 삭제하는 함수. (매번 전체를 다시 판정하는 결과 테이블 정리용) :return: 삭제한 행 수 또는 실패 시 None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def sync(self, table_name, df, key_cols, label=None):
+        """
+        테이블을 df와 같게 맞추는 함수. (upsert + delete_missing, 한 트랜잭션이므로 실패하면 이전 행이 그대로 남음)
+        :return: upsert 결과에 'deleted'(삭제한 행 수)를 더한 딕셔너리 또는 실패 시 None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def has_table(self, table_name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _load(self, table_name, columns, filters):
+        raise NotImplementedError
+
+    def _rollback(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+class PostgresStorage(Storage):
+    """PostgreSQL 저장소. 저장은 db_writer.bulk_upsert(COPY/execute_values, 변경분만 갱신)를 그대로 사용합니다."""
+    name = 'postgres'
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _load(self, table_name, columns, filters):
+        from psycopg2 import sql
+
+        if table_name in MEMOIZED_TABLES and not filters:
+            return self._load_memoized(table_name, columns)
+        params = {}
+        conditions = []
+        for i, (column, operator, value) in enumerate(filters):
+            conditions.append(sql.SQL("{} " + operator + " {}").format(sql.Identifier(column), sql.Placeholder(f'p{i}')))
+            params[f'p{i}'] = value
+        query = sql.SQL("SELECT {cols} FROM {table}{where}").format(
+            cols=sql.SQL(', ').join(map(sql.Identifier, columns)) if columns else sql.SQL('*'),
+            table=sql.Identifier(table_name),
+            where=sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions) if conditions else sql.SQL('')
+        )
+        return self._fetch(query, params)
+
+    def _fetch(self, query, params=None):
+        """
+        서버 측(named) 커서로 결과를 LOAD_CHUNK_ROWS 단위로 받아 DataFrame으로 만드는 함수.
+        전체 결과를 파이썬 튜플 목록으로 한 번에 올리지 않으므로, 수천만 행 테이블도 튜플 변환 메모리가 청크 크기로 제한됩니다.
+        """
+        frames = []
+        with self.conn.cursor(name=f"storage_{uuid.uuid4().hex}") as cur:
+            cur.itersize = LOAD_CHUNK_ROWS
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(LOAD_CHUNK_ROWS)
+                columns = [desc[0] for desc in cur.description]
+                if not rows:
+                    break
+                frames.append(pd.DataFrame(rows, columns=columns))
+        self.conn.rollback()
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def _load_memoized(self, table_name, columns):
+        """
+        참조 테이블 전체를 쿼리 캐시(query_cache)를 거쳐 읽은 뒤 필요한 컬럼만 골라 반환하는 함수.
+        단계마다 읽는 컬럼이 달라도 같은 캐시 결과(테이블 전체)를 함께 사용합니다.
+        """
+        from psycopg2 import sql
+        from query_cache import cached_query
+
+        query = sql.SQL("SELECT * FROM {table}").format(table=sql.Identifier(table_name))
+        try:
+            df = cached_query(self.conn, query, None, [table_name], lambda: self._fetch(query))
+        finally:
+            self.conn.rollback()
+        return df[columns] if columns else df
+
+    def _rollback(self):
+        self.conn.rollback()
+
+    def upsert(self, table_name, df, key_cols, label=None):
+        from db_writer import bulk_upsert
+        return bulk_upsert(self.conn, table_name, df, key_cols=key_cols, label=label)
+
+    def delete_missing(self, table_name, df, key_cols, label=None):
+        from db_writer import delete_missing_keys
+        return delete_missing_keys(self.conn, table_name, df, key_cols, label=label)
+
+    def sync(self, table_name, df, key_cols, label=None):
+        from db_writer import sync_table
+        return sync_table(self.conn, table_name, df, key_cols, label=label)
+
+    def has_table(self, table_name):
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (table_name,))
+            exists = cur.fetchone()[0]
+        self.conn.rollback()
+        return exists
+
+    def close(self):
+        from db_utils import close_db_connection
+        close_db_connection(self.conn)
+
+class EmbeddedStorage(Storage):
+    """
+    DB-API 연결(SQLite, DuckDB) 위의 내장 저장소 공통 구현.
+    - upsert는 저장할 데이터를 STAGING_TABLE로 올린 뒤, 같은 키의 기존 행을 삭제하고 한 번에 추가합니다.
+      (값이 같은 행도 갱신으로 집계하므로 'unchanged'는 항상 0)
+    - 대상 테이블이 없으면 저장할 데이터의 컬럼으로 새로 만듭니다.
+    """
+
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.path = path
+
+    def _execute(self, query, params=()):
+        count_round_trip()
+        return self.conn.execute(query, params)
+
+    def _source(self, table_name, filters=()):
+        """FROM 절에 넣을 테이블 표현식. (filters는 스냅샷 파티션을 거를 때 사용)"""
+        return table_name
+
+    @abstractmethod
+    def _fetch_frame(self, query, params):
+        raise NotImplementedError
+
+    def _load(self, table_name, columns, filters):
+        where = " AND ".join(f"{column} {operator} ?" for column, operator, _ in filters)
+        query = f"SELECT {', '.join(columns) if columns else '*'} FROM {self._source(table_name, filters)}" + (f" WHERE {where}" if where else '')
+        count_round_trip()
+        return self._fetch_frame(query, [value for _, _, value in filters])
+
+    def _rollback(self):
+        try:
+            self.conn.rollback()
+        except Exception:
+            pass
+
+    @abstractmethod
+    def _has_db_table(self, table_name):
+        """DB 파일 안에 테이블이 있는지 확인하는 함수. (Parquet 스냅샷은 제외)"""
+        raise NotImplementedError
+
+    def has_table(self, table_name):
+        return self._has_db_table(table_name)
+
+    def _begin(self):
+        pass
+
+    @abstractmethod
+    def _stage(self, df):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _unstage(self):
+        raise NotImplementedError
+
+    def _create_from_source(self, table_name):
+        """DB 파일에 테이블이 없을 때 원본(스냅샷)에서 테이블을 만드는 함수. 원본이 없으면 False."""
+        return False
+
+    def _merge_staged(self, table_name, df, key_cols):
+        """STAGING_TABLE의 행으로 같은 키의 기존 행을 교체하는 함수. (커밋하지 않음) :return: 교체된 기존 행 수"""
+        cols = ', '.join(df.columns)
+        key_match = ' AND '.join(f"s.{col} = {table_name}.{col}" for col in key_cols)
+        if not (self._has_db_table(table_name) or self._create_from_source(table_name)):
+            self._execute(f"CREATE TABLE {table_name} AS SELECT {cols} FROM {STAGING_TABLE}")
+            return 0
+        existing = self._execute(
+            f"SELECT COUNT(*) FROM {STAGING_TABLE} s WHERE EXISTS (SELECT 1 FROM {table_name} WHERE {key_match})"
+        ).fetchone()[0]
+        self._execute(f"DELETE FROM {table_name} WHERE EXISTS (SELECT 1 FROM {STAGING_TABLE} s WHERE {key_match})")
+        self._execute(f"INSERT INTO {table_name} ({cols}) SELECT {cols} FROM {STAGING_TABLE}")
+        return existing
+
+    def _delete_unstaged(self, table_name, key_cols):
+        """STAGING_TABLE에 없는 키의 행을 삭제하는 함수. (커밋하지 않음) :return: 삭제한 행 수"""
+        key_match = ' AND '.join(f"s.{col} = {table_name}.{col}" for col in key_cols)
+        condition = f"NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} s WHERE {key_match})"
+        deleted = self._execute(f"SELECT COUNT(*) FROM {table_name} WHERE {condition}").fetchone()[0]
+        self._execute(f"DELETE FROM {table_name} WHERE {condition}")
+        return deleted
+
+    def upsert(self, table_name, df, key_cols, label=None):
+        """
+        키 기준으로 데이터를 저장하는 함수. (반환 값 형식은 db_writer.bulk_upsert와 같음)
+        :return: {'inserted', 'updated', 'unchanged', 'rows', 'method', 'seconds', 'rows_per_sec'} 또는 실패 시 None
+        """
+        return self._write(table_name, df, key_cols, label)
+
+    def _write(self, table_name, df, key_cols, label=None, sync=False):
+        """upsert/sync 공통 구현. sync=True면 같은 트랜잭션에서 df에 없는 키의 행도 삭제합니다."""
+        if df is None or df.empty: return None
+        _check_identifiers(table_name, *df.columns, *key_cols)
+        label = label or table_name
+        df = df.drop_duplicates(subset=key_cols, keep='last')
+        step = track_step('write', table_name, rows_in=len(df))
+
+        logger.info(f"⏳ '{table_name}' 테이블에 {label} 데이터 {len(df)}건을 저장/업데이트합니다... (방식: {self.name})")
+        started = time.perf_counter()
+        try:
+            self._begin()
+            self._stage(df)
+            existing = self._merge_staged(table_name, df, key_cols)
+            deleted = self._delete_unstaged(table_name, key_cols) if sync else None
+            self.conn.commit()
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            logger.error(f"❌ {label} 데이터 저장 오류: {e}")
+            self._rollback()
+            step.finish(status='error')
+            return None
+        finally:
+            self._unstage()
+
+        metrics = {
+            'inserted': len(df) - existing,
+            'updated': existing,
+            'unchanged': 0,
+            'rows': len(df),
+            'method': self.name,
+            'seconds': round(elapsed, 4),
+            'rows_per_sec': round(len(df) / elapsed, 1) if elapsed > 0 else None
+        }
+        step.finish(rows_out=len(df))
+        logger.info(f"✅ {label} 레코드 저장 완료: 신규 {metrics['inserted']}건, 갱신 {metrics['updated']}건 ({self.name}: {self.path})")
+        if sync:
+            metrics['deleted'] = deleted
+            logger.info(f"✅ {label} 이전 데이터 정리 완료: 해당되지 않는 {deleted}건 삭제 ({self.name}: {self.path})")
+        return metrics
+
+    def delete_missing(self, table_name, df, key_cols, label=None):
+        _check_identifiers(table_name, *key_cols)
+        label = label or table_name
+        if not (self._has_db_table(table_name) or self._create_from_source(table_name)):
+            return 0
+        try:
+            self._begin()
+            self._stage(df[key_cols].drop_duplicates())
+            deleted = self._delete_unstaged(table_name, key_cols)
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"❌ {label} 이전 데이터 정리 오류: {e}")
+            self._rollback()
+            return None
+        finally:
+            self._unstage()
+        logger.info(f"✅ {label} 이전 데이터 정리 완료: 해당되지 않는 {deleted}건 삭제 ({self.name}: {self.path})")
+        return deleted
+
+    def sync(self, table_name, df, key_cols, label=None):
+        if df is None or df.empty:
+            deleted = self.delete_missing(table_name, pd.DataFrame(columns=key_cols), key_cols, label=label)
+            return None if deleted is None else {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rows': 0, 'deleted': deleted}
+        return self._write(table_name, df, key_cols, label=label, sync=True)
+
+    def load_snapshot(self, snapshot_dir=DEFAULT_SNAPSHOT_DIR, tables=None):
+        """
+        09번 스크립트로 내보낸 Parquet 스냅샷을 DB 파일의 테이블로 가져오는 함수. (같은 이름의 테이블은 교체)
+        :param tables: 가져올 테이블명 목록 (None이면 스냅샷 폴더의 전체 테이블)
+        :return: 가져온 테이블명 목록
+        """
+        if not os.path.isdir(snapshot_dir):
+            logger.warning(f"⚠️ 스냅샷 폴더가 없습니다: {snapshot_dir} (09_export_parquet.py를 먼저 실행해주세요.)")
+            return []
+        loaded = []
+        for table_name in tables or sorted(os.listdir(snapshot_dir)):
+            table_dir = os.path.join(snapshot_dir, table_name)
+            if not os.path.isdir(table_dir) or not _IDENTIFIER.match(table_name):
+                continue
+            started = time.perf_counter()
+            rows = self._import_parquet(table_name, table_dir)
+            self.conn.commit()
+            logger.info(f"✅ '{table_name}' 스냅샷 {rows}행을 가져왔습니다. ({time.perf_counter() - started:.3f}초)")
+            loaded.append(table_name)
+        return loaded
+
+    @abstractmethod
+    def _import_parquet(self, table_name, table_dir):
+        raise NotImplementedError
+
+    def close(self):
+        self.conn.close()
+
+class SQLiteStorage(EmbeddedStorage):
+    """SQLite 저장소 (표준 라이브러리만 사용). 테스트나 소규모 스냅샷 확인용입니다. path=':memory:'이면 메모리 DB."""
+    name = 'sqlite'
+
+    def _fetch_frame(self, query, params):
+        return pd.read_sql_query(query, self.conn, params=params)
+
+    def _has_db_table(self, table_name):
+        return self._execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone() is not None
+
+    def _stage(self, df):
+        df.to_sql(STAGING_TABLE, self.conn, index=False, if_exists='replace')
+
+    def _unstage(self):
+        self.conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        self.conn.commit()
+
+    def _import_parquet(self, table_name, table_dir):
+        df = pd.read_parquet(table_dir)
+        # 연도 파티션 폴더에서 생긴 year 컬럼은 원본 테이블에 없으므로 제외
+        if any(entry.startswith(f"{SNAPSHOT_PARTITION_COLUMN}=") for entry in os.listdir(table_dir)):
+            df = df.drop(columns=[SNAPSHOT_PARTITION_COLUMN], errors='ignore')
+        df.to_sql(table_name, self.conn, index=False, if_exists='replace')
+        return len(df)
+
+class DuckDBStorage(EmbeddedStorage):
+    """
+    DuckDB 저장소 (컬럼 기반 분석 엔진, 'pip install duckdb' 필요).
+    - DB 파일에 없는 테이블은 snapshot_dir의 Parquet 스냅샷(09번 스크립트 결과)을 그대로 읽습니다.
+      운행년월 필터는 연도 파티션 조건(snapshot_year_conditions)으로도 바뀌어 해당 연도 폴더만 열고,
+      행 단위 조건은 Parquet 행 그룹 통계로 걸러지므로 필요한 부분만 읽습니다. 파티션용 year 컬럼은 결과에 넣지 않습니다.
+    - 저장 결과는 DB 파일의 테이블에 남고, 이후 단계는 스냅샷 대신 이 테이블을 읽습니다.
+    """
+    name = 'duckdb'
+
+    def __init__(self, conn, path, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+        super().__init__(conn, path)
+        self.snapshot_dir = snapshot_dir
+
+    def _parquet_source(self, table_name, filters=()):
+        """
+        스냅샷 폴더의 Parquet 파일을 읽는 FROM 절 표현식. 스냅샷이 없으면 None.
+        - 연도 파티션(year=) 스냅샷은 운행년월 필터에서 만든 연도 조건으로 폴더를 거르고, year 컬럼은 결과에서 뺍니다.
+        """
+        table_dir = os.path.join(self.snapshot_dir, table_name)
+        if not os.path.isdir(table_dir):
+            return None
+        pattern = os.path.join(table_dir, '**', '*.parquet').replace("'", "''")
+        source = f"read_parquet('{pattern}', hive_partitioning = true)"
+        if not any(entry.startswith(f"{SNAPSHOT_PARTITION_COLUMN}=") for entry in os.listdir(table_dir)):
+            return source
+        conditions = [f"{SNAPSHOT_PARTITION_COLUMN} {operator} {year}" for operator, year in snapshot_year_conditions(filters)]
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        return f"(SELECT * EXCLUDE ({SNAPSHOT_PARTITION_COLUMN}) FROM {source}{where}) AS {table_name}"
+
+    def _source(self, table_name, filters=()):
+        if self._has_db_table(table_name):
+            return table_name
+        return self._parquet_source(table_name, filters) or table_name
+
+    def _fetch_frame(self, query, params):
+        return self.conn.execute(query, params).df()
+
+    def _has_db_table(self, table_name):
+        return self.conn.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = ?", [table_name]
+        ).fetchone() is not None
+
+    def has_table(self, table_name):
+        return self._has_db_table(table_name) or self._parquet_source(table_name) is not None
+
+    def _begin(self):
+        self.conn.begin()
+
+    def _stage(self, df):
+        self.conn.register(STAGING_TABLE, df)
+
+    def _unstage(self):
+        self.conn.unregister(STAGING_TABLE)
+
+    def _create_from_source(self, table_name):
+        source = self._parquet_source(table_name)
+        if source is None:
+            return False
+        # 스냅샷의 기존 행을 유지한 채 갱신하도록 먼저 테이블로 가져옴
+        self._execute(f"CREATE TABLE {table_name} AS SELECT * FROM {source}")
+        return True
+
+    def _import_parquet(self, table_name, table_dir):
+        self._execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM {self._parquet_source(table_name)}")
+        return self._execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+def open_storage(backend=None, path=None, snapshot_dir=DEFAULT_SNAPSHOT_DIR, db_params=None):
+    """
+    저장소를 여는 함수.
+    :param backend: 'postgres', 'duckdb', 'sqlite' 중 하나 (None이면 PIPELINE_STORAGE 환경 변수, 없으면 postgres)
+    :param path: 내장 저장소의 DB 파일 경로 (None이면 DEFAULT_PATHS, SQLite는 ':memory:'도 가능)
+    :param snapshot_dir: DuckDB가 읽을 Parquet 스냅샷 폴더
+    :param db_params: PostgreSQL 연결 정보 (None이면 db_config.db_connection_params)
+    :return: Storage 객체 또는 실패 시 None
+    """
+    backend = backend or os.environ.get(STORAGE_ENV) or 'postgres'
+    if backend not in BACKENDS:
+        logger.error(f"❌ 알 수 없는 저장소입니다: {backend} (사용 가능: {', '.join(BACKENDS)})")
+        return None
+
+    if backend == 'postgres':
+        # PostgreSQL 관련 모듈은 이 저장소를 쓸 때만 불러옴 (내장 저장소는 psycopg2/db_config 없이 실행 가능)
+        from db_utils import connect_to_db
+        if db_params is None:
+            from db_config import db_connection_params as db_params
+        conn = connect_to_db(db_params)
+        return PostgresStorage(conn) if conn else None
+
+    path = path or DEFAULT_PATHS[backend]
+    if path != ':memory:' and os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if backend == 'sqlite':
+        storage = SQLiteStorage(sqlite3.connect(path), path)
+    else:
+        try:
+            import duckdb
+        except ImportError:
+            logger.warning("⚠️ 'duckdb' 라이브러리가 필요합니다. 'pip install duckdb' 명령으로 설치 후 다시 실행해주세요.")
+            return None
+        storage = DuckDBStorage(duckdb.connect(path), path, snapshot_dir)
+    logger.info(f"✅ {backend} 저장소를 열었습니다: {path}")
+    return storage
+
+def add_storage_arguments(parser):
+    """단계 스크립트의 argparse에 저장소 선택 옵션(--storage, --storage-path, --snapshot-dir)을 추가하는 함수."""
+    parser.add_argument('--storage', choices=BACKENDS,
+                        help=f"읽기/저장에 사용할 저장소 (기본값: {STORAGE_ENV} 환경 변수, 없으면 postgres)")
+    parser.add_argument('--storage-path',
+                        help=f"duckdb/sqlite DB 파일 경로 (기본값: {DEFAULT_PATHS['duckdb']}, {DEFAULT_PATHS['sqlite']})")
+    parser.add_argument('--snapshot-dir', default=DEFAULT_SNAPSHOT_DIR,
+                        help=f"duckdb가 읽을 Parquet 스냅샷 폴더 (기본값: {DEFAULT_SNAPSHOT_DIR})")
+
+def open_storage_from_args(args):
+    """add_storage_arguments로 받은 옵션으로 저장소를 여는 함수."""
+    return open_storage(args.storage, args.storage_path, args.snapshot_dir)
+
+def main():
+    """메인 실행 함수: Parquet 스냅샷을 내장 저장소(DuckDB/SQLite) DB 파일로 가져옵니다."""
+    parser = argparse.ArgumentParser(description="Parquet 스냅샷을 DuckDB/SQLite 파일로 가져오기")
+    parser.add_argument('backend', choices=['duckdb', 'sqlite'], help="가져올 저장소")
+    parser.add_argument('--path', help="DB 파일 경로 (기본값: exports/snapshot.<backend>)")
+    parser.add_argument('--snapshot-dir', default=DEFAULT_SNAPSHOT_DIR, help=f"스냅샷 폴더 (기본값: {DEFAULT_SNAPSHOT_DIR})")
+    parser.add_argument('--tables', nargs='+', help="가져올 테이블 (기본값: 스냅샷 폴더의 전체 테이블)")
+    args = parser.parse_args()
+
+    storage = open_storage(args.backend, args.path, args.snapshot_dir)
+    if not storage: return
+    with storage:
+        storage.load_snapshot(args.snapshot_dir, args.tables)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# 파이프라인 모듈은 저장소 루트에 평평하게 있으므로 루트를 import 경로에 추가
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# log_config/metrics는 현재 폴더의 logs/에 기록하므로, 테스트 실행이 저장소의 로그를 건드리지 않도록 임시 폴더에서 실행
+_work_dir = tempfile.mkdtemp(prefix='pipeline-tests-')
+os.chdir(_work_dir)
+atexit.register(shutil.rmtree, _work_dir, ignore_errors=True)
@@ -0,0 +1,30 @@
+import chatbot_index
+
+def test_tokenize_splits_identifiers_and_korean_bigrams():
+    assert chatbot_index.tokenize("bus_driving_records 전기버스") == [
+        'bus_driving_records', 'bus', 'driving', 'records', '전기', '기버', '버스'
+    ]
+
+def test_tokenize_keeps_single_korean_character():
+    assert chatbot_index.tokenize("차 CO2") == ['차', 'co2']
+
+def test_search_returns_matching_chunk_first(tmp_path):
+    source = tmp_path / 'guide.md'
+    source.write_text(
+        "# 베이스라인\n\n최근 60개월 연료 사용량으로 베이스라인을 계산합니다.\n\n"
+        "# 전기버스 배출량\n\n충전 전력량에 전력 배출계수를 곱해 간접배출량을 산정합니다.\n",
+        encoding='utf-8'
+    )
+    index_dir = tmp_path / 'index'
+    assert chatbot_index.build_index([str(source)], str(index_dir)) == 2
+
+    results = chatbot_index.ChatbotIndex(str(index_dir)).search("전력 배출계수", k=2)
+    assert results[0][2]['heading'] == '전기버스 배출량'
+    assert results[0][0] >= results[-1][0]
+
+def test_search_without_matching_tokens_returns_nothing(tmp_path):
+    source = tmp_path / 'guide.md'
+    source.write_text("# 베이스라인\n\n연료 사용량\n", encoding='utf-8')
+    index_dir = tmp_path / 'index'
+    chatbot_index.build_index([str(source)], str(index_dir))
+    assert chatbot_index.ChatbotIndex(str(index_dir)).search("zzz") == []
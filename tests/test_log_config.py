@@ -0,0 +1,27 @@
+import logging
+import log_config
+
+def test_warning_aggregator_groups_by_reason(monkeypatch):
+    events = []
+    monkeypatch.setattr(log_config, 'log_event', lambda event, message, level, **fields: events.append((event, level, fields)))
+
+    skipped = log_config.WarningAggregator('baseline.skipped', sample_size=2)
+    for plate in ['A', 'B', 'C']:
+        skipped.add("데이터 부족", plate, detail=3)
+    skipped.add("연료 종류 없음", 'D')
+
+    assert skipped.flush() == 4
+    assert events == [
+        ('baseline.skipped', logging.WARNING, {'reason': "데이터 부족", 'count': 3, 'samples': ['A(3)', 'B(3)']}),
+        ('baseline.skipped', logging.WARNING, {'reason': "연료 종류 없음", 'count': 1, 'samples': ['D']}),
+    ]
+
+def test_warning_aggregator_flush_resets(monkeypatch):
+    events = []
+    monkeypatch.setattr(log_config, 'log_event', lambda *args, **kwargs: events.append(args))
+
+    aggregator = log_config.WarningAggregator('screening.flagged')
+    aggregator.add("범위 초과", 'A')
+    aggregator.flush()
+    assert aggregator.flush() == 0
+    assert len(events) == 1
@@ -0,0 +1,21 @@
+import run_all
+
+def test_find_critical_path_follows_slowest_dependencies():
+    scripts = list(run_all.STAGE_DEPENDENCIES)
+    durations = {script: 1.0 for script in scripts}
+    durations['08_calculate_ev_emission.py'] = 10.0
+    path, seconds = run_all.find_critical_path(durations, scripts)
+    assert path == [
+        '00_edit_db.py', '01_insert_monthly_data.py', '08_calculate_ev_emission.py',
+        '04_calculate_business_target.py', '05_co2_reduction_calc.py', '06_Report.py'
+    ]
+    assert seconds == 15.0
+
+def test_find_critical_path_ignores_stages_not_run():
+    scripts = ['02_calculate_baseline.py', '03_display_baseline.py']
+    path, seconds = run_all.find_critical_path({'02_calculate_baseline.py': 2.0, '03_display_baseline.py': 0.5}, scripts)
+    assert path == scripts
+    assert seconds == 2.5
+
+def test_find_critical_path_without_durations():
+    assert run_all.find_critical_path({}, list(run_all.STAGE_DEPENDENCIES)) == ([], 0.0)
@@ -0,0 +1,49 @@
+import importlib
+import numpy as np
+import pandas as pd
+
+# 파일명이 숫자로 시작하므로 importlib로 불러옴
+screening = importlib.import_module('10_screen_monthly_data')
+
+VEHICLE_MASTER = pd.DataFrame({'vehicle_plate_no': ['A', 'B'], 'original_fuel_type': ['경유', 'CNG']})
+
+def monthly_rows(plate, months, fuel, distance):
+    return pd.DataFrame({
+        'vehicle_plate_no': plate,
+        'record_year_month': months,
+        'fuel_consumption_l': fuel,
+        'distance_km': distance
+    })
+
+def test_clean_rows_have_no_flags():
+    months = [202301 + i for i in range(8)]
+    fuel_df = monthly_rows('A', months, [300.0 + i for i in range(8)], [1000.0] * 8)
+    result = screening.screen_monthly_rows(fuel_df, VEHICLE_MASTER, current_year_month=202312)
+    assert (result['flags'] == 0).all()
+    assert result.index.equals(fuel_df.index)
+
+def test_fleet_bounds_and_calendar_flags():
+    fuel_df = monthly_rows('B', [202301, 202213, 202401], [5000.0, 300.0, 300.0], [1000.0, 1000.0, 1000.0])
+    result = screening.screen_monthly_rows(fuel_df, VEHICLE_MASTER, current_year_month=202312)
+    assert result['flags'].tolist() == [
+        screening.FLAG_FLEET_BOUNDS,
+        screening.FLAG_INVALID_MONTH,
+        screening.FLAG_FUTURE_MONTH
+    ]
+
+def test_vehicle_statistics_flag_outlier_and_distance_spike():
+    months = [202201 + i for i in range(10)]
+    fuel = [300.0, 310.0, 305.0, 295.0, 300.0, 302.0, 298.0, 301.0, 299.0, 1100.0]
+    distance = [1000.0] * 9 + [6000.0]
+    result = screening.screen_monthly_rows(monthly_rows('A', months, fuel, distance), VEHICLE_MASTER, current_year_month=202312)
+    assert result['flags'].iloc[-1] & screening.FLAG_DISTANCE_SPIKE
+    assert (result['flags'].iloc[:-1] == 0).all()
+    assert np.isfinite(result['robust_z'].iloc[0])
+
+def test_operating_day_checks():
+    fuel_df = monthly_rows('A', [202302, 202303], [300.0, 300.0], [1000.0, 1000.0])
+    result = screening.screen_monthly_rows(fuel_df, VEHICLE_MASTER, operating_days=[29, 1], current_year_month=202312)
+    assert result['flags'].tolist() == [screening.FLAG_OPERATING_DAYS, screening.FLAG_DAILY_DISTANCE]
+
+def test_days_in_month_handles_leap_years():
+    assert screening.days_in_month(np.array([202402, 202302, 190002, 200002, 202313])).tolist() == [29, 28, 28, 29, 0]
@@ -0,0 +1,69 @@
+import sqlite3
+import pandas as pd
+import pytest
+
+import storage
+
+@pytest.fixture
+def sqlite_storage():
+    with storage.SQLiteStorage(sqlite3.connect(':memory:'), ':memory:') as store:
+        yield store
+
+def load_sorted(store, table_name):
+    return store.load_table(table_name).sort_values(['vehicle_plate_no', 'record_year_month']).reset_index(drop=True)
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['vehicle_plate_no', 'record_year_month', 'flags'])
+
+KEY_COLS = ['vehicle_plate_no', 'record_year_month']
+
+def test_upsert_creates_table_then_inserts_and_updates(sqlite_storage):
+    metrics = sqlite_storage.upsert('quarantine', frame([('A', 202301, 1), ('A', 202302, 2)]), KEY_COLS)
+    assert (metrics['inserted'], metrics['updated']) == (2, 0)
+
+    metrics = sqlite_storage.upsert('quarantine', frame([('A', 202302, 4), ('B', 202301, 8)]), KEY_COLS)
+    assert (metrics['inserted'], metrics['updated']) == (1, 1)
+    assert load_sorted(sqlite_storage, 'quarantine').values.tolist() == [
+        ['A', 202301, 1], ['A', 202302, 4], ['B', 202301, 8]
+    ]
+
+def test_upsert_keeps_last_duplicate_key(sqlite_storage):
+    sqlite_storage.upsert('quarantine', frame([('A', 202301, 1), ('A', 202301, 2)]), KEY_COLS)
+    assert load_sorted(sqlite_storage, 'quarantine')['flags'].tolist() == [2]
+
+def test_delete_missing_removes_keys_not_in_frame(sqlite_storage):
+    sqlite_storage.upsert('quarantine', frame([('A', 202301, 1), ('A', 202302, 2), ('B', 202301, 4)]), KEY_COLS)
+    deleted = sqlite_storage.delete_missing('quarantine', frame([('A', 202302, 0)]), KEY_COLS)
+    assert deleted == 2
+    assert load_sorted(sqlite_storage, 'quarantine').values.tolist() == [['A', 202302, 2]]
+
+def test_delete_missing_without_table_deletes_nothing(sqlite_storage):
+    assert sqlite_storage.delete_missing('quarantine', frame([('A', 202301, 1)]), KEY_COLS) == 0
+
+def test_sync_matches_table_to_frame(sqlite_storage):
+    sqlite_storage.upsert('quarantine', frame([('A', 202301, 1), ('B', 202301, 4)]), KEY_COLS)
+    metrics = sqlite_storage.sync('quarantine', frame([('A', 202301, 2), ('C', 202305, 8)]), KEY_COLS)
+    assert (metrics['inserted'], metrics['updated'], metrics['deleted']) == (1, 1, 1)
+    assert load_sorted(sqlite_storage, 'quarantine').values.tolist() == [['A', 202301, 2], ['C', 202305, 8]]
+
+def test_sync_with_empty_frame_clears_table(sqlite_storage):
+    sqlite_storage.upsert('quarantine', frame([('A', 202301, 1)]), KEY_COLS)
+    metrics = sqlite_storage.sync('quarantine', frame([]), KEY_COLS)
+    assert metrics['deleted'] == 1
+    assert sqlite_storage.load_table('quarantine').empty
+
+def test_load_table_applies_filters(sqlite_storage):
+    sqlite_storage.upsert('quarantine', frame([('A', 202212, 1), ('A', 202301, 2), ('A', 202302, 4)]), KEY_COLS)
+    df = sqlite_storage.load_table('quarantine', columns=['record_year_month'], filters=[('record_year_month', '>=', 202301)])
+    assert sorted(df['record_year_month']) == [202301, 202302]
+
+def test_load_table_rejects_unsafe_identifiers(sqlite_storage):
+    with pytest.raises(ValueError):
+        sqlite_storage.load_table('quarantine; DROP TABLE x')
+
+def test_incomplete_backend_fails_on_creation():
+    class IncompleteStorage(storage.EmbeddedStorage):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError):
+        IncompleteStorage(sqlite3.connect(':memory:'), ':memory:')
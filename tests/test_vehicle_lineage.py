@@ -0,0 +1,73 @@
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+db_config = pytest.importorskip('db_config')
+
+import vehicle_lineage
+
+@pytest.fixture
+def cur():
+    """PostgreSQL 세션의 임시 테이블(같은 이름의 실제 테이블을 가림)로 계보를 계산하는 커서. (DB에 연결할 수 없으면 건너뜀)"""
+    try:
+        conn = psycopg2.connect(**db_config.db_connection_params)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL에 연결할 수 없습니다: {e}")
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE bus_vehicle_master (
+                    vehicle_plate_no VARCHAR(20) PRIMARY KEY,
+                    replaced_by_ev_plate_no VARCHAR(20),
+                    original_ice_plate_no VARCHAR(20)
+                );
+                CREATE TEMP TABLE bus_vehicle_lineage (
+                    ancestor_plate_no VARCHAR(20) NOT NULL,
+                    descendant_plate_no VARCHAR(20) NOT NULL,
+                    depth INT NOT NULL,
+                    PRIMARY KEY (ancestor_plate_no, descendant_plate_no)
+                );
+            """)
+            yield cursor
+    finally:
+        conn.rollback()
+        conn.close()
+
+def insert_vehicles(cur, rows):
+    cur.executemany(
+        "INSERT INTO bus_vehicle_master (vehicle_plate_no, replaced_by_ev_plate_no, original_ice_plate_no) VALUES (%s, %s, %s);",
+        rows
+    )
+
+def snapshot(cur):
+    cur.execute("SELECT ancestor_plate_no, descendant_plate_no, depth FROM bus_vehicle_lineage ORDER BY 1, 2;")
+    return cur.fetchall()
+
+def test_update_lineage_with_second_parent_outside_lineage(cur):
+    # S -> M -> G <- X -> Y: G의 두 번째 부모 X는 조상으로만 계보에 포함되고, X의 다른 자손 Y는 계보 밖
+    insert_vehicles(cur, [
+        ('S', None, None), ('M', 'G', None), ('G', None, None), ('X', 'G', None), ('Y', None, 'X'),
+    ])
+    vehicle_lineage.rebuild_lineage(cur)
+
+    cur.execute("UPDATE bus_vehicle_master SET replaced_by_ev_plate_no = 'M' WHERE vehicle_plate_no = 'S';")
+    vehicle_lineage.update_lineage(cur, ['S'])
+    incremental = snapshot(cur)
+
+    vehicle_lineage.rebuild_lineage(cur)
+    assert incremental == snapshot(cur)
+    assert ('X', 'Y', 1) in incremental
+    assert ('S', 'G', 2) in incremental
+
+def test_update_lineage_detaches_replaced_vehicle(cur):
+    insert_vehicles(cur, [('I', 'E', None), ('E', None, 'I'), ('N', None, None)])
+    vehicle_lineage.rebuild_lineage(cur)
+
+    cur.execute("UPDATE bus_vehicle_master SET replaced_by_ev_plate_no = NULL WHERE vehicle_plate_no = 'I';")
+    cur.execute("UPDATE bus_vehicle_master SET original_ice_plate_no = 'N' WHERE vehicle_plate_no = 'E';")
+    cur.execute("UPDATE bus_vehicle_master SET replaced_by_ev_plate_no = 'E' WHERE vehicle_plate_no = 'N';")
+    vehicle_lineage.update_lineage(cur, ['I', 'E', 'N'])
+    incremental = snapshot(cur)
+
+    vehicle_lineage.rebuild_lineage(cur)
+    assert incremental == snapshot(cur)
+    assert ('I', 'E', 1) not in incremental
@@ -0,0 +1,262 @@
+import argparse
+import psycopg2
+from psycopg2 import sql
+from metrics import track_step
+from log_config import logger
+
+# 차량 대체 계보 closure 테이블: 대체 관계(내연기관 -> 전기버스 -> 새 전기버스 ...)로 이어진 모든 (조상, 자손) 쌍과 거리
+# - 모든 차량은 자기 자신과의 쌍(depth 0)을 가지므로, 계보 조회가 차량 종류와 관계없이 같은 형태가 됩니다.
+# - 대체 차량의 최초 내연기관 차량 = descendant_plate_no가 그 차량인 행 중 depth가 가장 큰 조상 (인덱스 조회 1회)
+LINEAGE_TABLE = 'bus_vehicle_lineage'
+
+LINEAGE_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS bus_vehicle_lineage (
+        ancestor_plate_no VARCHAR(20) NOT NULL,
+        descendant_plate_no VARCHAR(20) NOT NULL,
+        depth INT NOT NULL,
+        PRIMARY KEY (ancestor_plate_no, descendant_plate_no),
+        FOREIGN KEY (ancestor_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no),
+        FOREIGN KEY (descendant_plate_no) REFERENCES bus_vehicle_master(vehicle_plate_no)
+    );
+    CREATE INDEX IF NOT EXISTS idx_bus_vehicle_lineage_descendant_depth ON bus_vehicle_lineage (descendant_plate_no, depth);
+"""
+
+# 계보를 따라가는 최대 단계 수 (잘못된 데이터로 대체 관계가 순환해도 재귀 쿼리가 끝나도록 제한)
+MAX_LINEAGE_DEPTH = 20
+
+# 계보를 바꾸는 차량 마스터 컬럼 (이 값이 바뀐 차량만 증분 갱신 대상)
+LINK_COLUMNS = ['replaced_by_ev_plate_no', 'original_ice_plate_no']
+
+# 대체 관계 간선(이전 차량 -> 대체 차량). 두 컬럼 중 한쪽만 채워진 데이터도 같은 간선으로 인식합니다.
+_EDGES_CTE = """
+    edges (parent_plate_no, child_plate_no) AS (
+        SELECT vehicle_plate_no, replaced_by_ev_plate_no FROM bus_vehicle_master
+        WHERE replaced_by_ev_plate_no IS NOT NULL AND replaced_by_ev_plate_no <> vehicle_plate_no
+        UNION
+        SELECT original_ice_plate_no, vehicle_plate_no FROM bus_vehicle_master
+        WHERE original_ice_plate_no IS NOT NULL AND original_ice_plate_no <> vehicle_plate_no
+    )
+"""
+
+# members(plate)의 각 차량에서 자손 방향으로 내려가며 (조상, 자손, 거리)를 만들어 저장 (같은 쌍이 여러 경로면 최단 거리)
+_INSERT_CLOSURE = """
+    INSERT INTO bus_vehicle_lineage (ancestor_plate_no, descendant_plate_no, depth)
+    WITH RECURSIVE {edges},
+    paths (ancestor_plate_no, descendant_plate_no, depth) AS (
+        SELECT plate, plate, 0 FROM {members}
+        UNION ALL
+        SELECT p.ancestor_plate_no, e.child_plate_no, p.depth + 1
+        FROM paths p JOIN edges e ON e.parent_plate_no = p.descendant_plate_no
+        WHERE p.depth < %(max_depth)s
+    )
+    SELECT ancestor_plate_no, descendant_plate_no, MIN(depth) FROM paths
+    GROUP BY ancestor_plate_no, descendant_plate_no;
+"""
+
+# 변경된 차량이 속한 계보(이번 간선 기준 + 기존 closure 기준)의 모든 차량과, 그 차량들의 모든 조상을 임시 테이블로 수집
+# - 부모가 둘 이상이거나 두 대체 관계 컬럼이 서로 맞지 않는 데이터에서는 계보 밖의 차량이 조상일 수 있으므로,
+#   조상까지 포함해야 지운 (조상, 자손) 행이 모두 다시 만들어집니다.
+_COLLECT_MEMBERS = """
+    CREATE TEMP TABLE tmp_lineage_members ON COMMIT DROP AS
+    WITH RECURSIVE {edges},
+    seeds (plate) AS (
+        SELECT m.vehicle_plate_no FROM bus_vehicle_master m WHERE m.vehicle_plate_no = ANY(%(plates)s)
+        UNION
+        SELECT e.parent_plate_no FROM edges e WHERE e.child_plate_no = ANY(%(plates)s)
+        UNION
+        SELECT e.child_plate_no FROM edges e WHERE e.parent_plate_no = ANY(%(plates)s)
+    ),
+    up (plate, depth) AS (
+        SELECT plate, 0 FROM seeds
+        UNION
+        SELECT e.parent_plate_no, up.depth + 1 FROM up JOIN edges e ON e.child_plate_no = up.plate
+        WHERE up.depth < %(max_depth)s
+    ),
+    down (plate, depth) AS (
+        SELECT plate, 0 FROM up
+        UNION
+        SELECT e.child_plate_no, down.depth + 1 FROM down JOIN edges e ON e.parent_plate_no = down.plate
+        WHERE down.depth < %(max_depth)s
+    ),
+    affected (plate) AS (
+        SELECT plate FROM down
+        UNION
+        SELECT old.descendant_plate_no
+        FROM bus_vehicle_lineage cur JOIN bus_vehicle_lineage old ON old.ancestor_plate_no = cur.ancestor_plate_no
+        WHERE cur.descendant_plate_no = ANY(%(plates)s)
+    ),
+    ancestors (plate, depth) AS (
+        SELECT plate, 0 FROM affected
+        UNION
+        SELECT e.parent_plate_no, a.depth + 1 FROM ancestors a JOIN edges e ON e.child_plate_no = a.plate
+        WHERE a.depth < %(max_depth)s
+    )
+    SELECT DISTINCT plate FROM ancestors;
+"""
+
+def lineage_table_exists(cur):
+    """계보 테이블이 있는지 확인하는 함수. (마이그레이션 5 적용 전에는 없음)"""
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (LINEAGE_TABLE,))
+    return cur.fetchone()[0]
+
+def create_lineage_table(cur):
+    """계보 테이블과 자손 기준 조회 인덱스를 생성하는 함수. (없을 때만)"""
+    cur.execute(LINEAGE_TABLE_DDL)
+
+def rebuild_lineage(cur):
+    """
+    차량 마스터 전체로 계보 테이블을 다시 만드는 함수. (마이그레이션 적용 시, 계보 테이블이 비어 있을 때)
+    :return: (대상 차량 수, 삭제한 행 수, 추가한 행 수)
+    """
+    cur.execute("DELETE FROM bus_vehicle_lineage;")
+    deleted = cur.rowcount
+    cur.execute(
+        sql.SQL(_INSERT_CLOSURE).format(
+            edges=sql.SQL(_EDGES_CTE),
+            members=sql.SQL("(SELECT vehicle_plate_no AS plate FROM bus_vehicle_master) AS members")
+        ),
+        {'max_depth': MAX_LINEAGE_DEPTH}
+    )
+    inserted = cur.rowcount
+    cur.execute("SELECT COUNT(*) FROM bus_vehicle_master;")
+    return cur.fetchone()[0], deleted, inserted
+
+def update_lineage(cur, plates):
+    """
+    대체 관계가 바뀐 차량이 속한 계보만 다시 계산하는 함수. (증분 갱신)
+    - 바뀐 차량과 이전/새 대체 관계로 연결된 차량(계보 전체)과 그 모든 조상을 모은 뒤,
+      그 차량들이 조상이거나 자손인 행을 지우고 새 간선으로 다시 만듭니다.
+    - 모은 차량에서 내려가는 경로는 모두 다시 만들어지므로, 조상으로만 포함된 차량(두 번째 부모 등)의
+      계보 밖 자손 행도 지워야 다시 넣을 때 기본 키가 충돌하지 않습니다. 작업량은 전체 차량 수가 아니라 바뀐 계보의 크기에 비례합니다.
+    :param plates: 대체 관계 컬럼이 바뀌었거나 새로 추가된 차량번호 목록
+    :return: (대상 차량 수, 삭제한 행 수, 추가한 행 수)
+    """
+    params = {'plates': list(plates), 'max_depth': MAX_LINEAGE_DEPTH}
+    cur.execute(sql.SQL(_COLLECT_MEMBERS).format(edges=sql.SQL(_EDGES_CTE)), params)
+    members = cur.rowcount
+    cur.execute("""
+        DELETE FROM bus_vehicle_lineage
+        WHERE descendant_plate_no IN (SELECT plate FROM tmp_lineage_members)
+           OR ancestor_plate_no IN (SELECT plate FROM tmp_lineage_members);
+    """)
+    deleted = cur.rowcount
+    cur.execute(
+        sql.SQL(_INSERT_CLOSURE).format(edges=sql.SQL(_EDGES_CTE), members=sql.Identifier('tmp_lineage_members')),
+        params
+    )
+    return members, deleted, cur.rowcount
+
+def find_changed_link_plates(conn, df):
+    """
+    저장할 차량 마스터 중 대체 관계 컬럼이 DB 값과 다르거나 새로 추가되는 차량번호를 반환하는 함수. (bulk_upsert 전에 호출)
+    같은 데이터로 재실행하면 빈 목록이 되어 계보 갱신이 일어나지 않습니다.
+    :param df: 저장할 차량 마스터 데이터프레임 (vehicle_plate_no와 LINK_COLUMNS 포함)
+    :return: 차량번호 목록
+    """
+    import pandas as pd
+    if not conn or df.empty: return []
+    with conn.cursor() as cur:
+        cur.execute(
+            sql.SQL("SELECT vehicle_plate_no, {cols} FROM bus_vehicle_master WHERE vehicle_plate_no = ANY(%s);").format(
+                cols=sql.SQL(', ').join(map(sql.Identifier, LINK_COLUMNS))
+            ),
+            (df['vehicle_plate_no'].tolist(),)
+        )
+        stored = pd.DataFrame(cur.fetchall(), columns=['vehicle_plate_no', *LINK_COLUMNS])
+    conn.rollback()
+    merged = df[['vehicle_plate_no', *LINK_COLUMNS]].merge(
+        stored, on='vehicle_plate_no', how='left', suffixes=('', '_stored'), indicator=True
+    )
+    changed = merged['_merge'] == 'left_only'
+    for col in LINK_COLUMNS:
+        # NULL/NaN은 빈 문자열로 맞춰 비교
+        changed |= merged[col].fillna('').astype(str) != merged[f"{col}_stored"].fillna('').astype(str)
+    return merged.loc[changed, 'vehicle_plate_no'].tolist()
+
+def refresh_lineage(conn, plates=None):
+    """
+    계보 테이블을 갱신하는 함수. 차량 마스터를 저장한 직후(01번) 호출합니다.
+    - plates가 주어지면 해당 차량의 계보만 증분 갱신하고, None이거나 계보 테이블이 비어 있으면 전체를 다시 만듭니다.
+    - 계보 테이블이 없으면(마이그레이션 5 적용 전) 경고만 남기고 건너뜁니다.
+    :param plates: 대체 관계가 바뀐 차량번호 목록 (find_changed_link_plates 결과)
+    :return: {'vehicles', 'deleted', 'inserted', 'mode'} 또는 실패/건너뜀 시 None
+    """
+    if not conn: return None
+    if plates is not None and len(plates) == 0:
+        logger.info("ℹ️ 대체 관계가 바뀐 차량이 없어 차량 대체 계보를 갱신하지 않습니다.")
+        return {'vehicles': 0, 'deleted': 0, 'inserted': 0, 'mode': 'incremental'}
+    step = track_step('write', LINEAGE_TABLE, rows_in=None if plates is None else len(plates))
+    with conn.cursor() as cur:
+        try:
+            if not lineage_table_exists(cur):
+                logger.warning(f"⚠️ '{LINEAGE_TABLE}' 테이블이 없어 계보를 갱신하지 않습니다. ('00_edit_db.py --migrate'를 실행하세요.)")
+                conn.rollback()
+                step.finish(status='error')
+                return None
+            cur.execute("SELECT EXISTS (SELECT 1 FROM bus_vehicle_lineage);")
+            if plates is None or not cur.fetchone()[0]:
+                mode = 'rebuild'
+                vehicles, deleted, inserted = rebuild_lineage(cur)
+            else:
+                mode = 'incremental'
+                vehicles, deleted, inserted = update_lineage(cur, plates)
+            conn.commit()
+        except psycopg2.Error as e:
+            logger.error(f"❌ 차량 대체 계보 갱신 오류: {e}")
+            conn.rollback()
+            step.finish(status='error')
+            return None
+    step.finish(rows_out=inserted)
+    action = "전체 재생성" if mode == 'rebuild' else "증분 갱신"
+    logger.info(f"✅ 차량 대체 계보 {action} 완료: 대상 차량 {vehicles}대, 경로 삭제 {deleted}건, 추가 {inserted}건")
+    return {'vehicles': vehicles, 'deleted': deleted, 'inserted': inserted, 'mode': mode}
+
+def fetch_vehicle_lineage(conn, plate):
+    """
+    차량 1대의 계보(조상과 자손)를 조회하는 함수.
+    :return: [(구분('ancestor'/'self'/'descendant'), 차량번호, 거리, 차종 구분, 연료)] 목록 (조상은 먼 순서, 자손은 가까운 순서)
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT CASE WHEN vl.depth = 0 THEN 'self' ELSE 'ancestor' END, vl.ancestor_plate_no, vl.depth,
+                   vm.business_type, vm.original_fuel_type
+            FROM bus_vehicle_lineage vl JOIN bus_vehicle_master vm ON vm.vehicle_plate_no = vl.ancestor_plate_no
+            WHERE vl.descendant_plate_no = %(plate)s
+            UNION ALL
+            SELECT 'descendant', vl.descendant_plate_no, -vl.depth, vm.business_type, vm.original_fuel_type
+            FROM bus_vehicle_lineage vl JOIN bus_vehicle_master vm ON vm.vehicle_plate_no = vl.descendant_plate_no
+            WHERE vl.ancestor_plate_no = %(plate)s AND vl.depth > 0
+            ORDER BY 3 DESC;
+        """, {'plate': plate})
+        rows = [(kind, plate_no, abs(depth), business_type, fuel) for kind, plate_no, depth, business_type, fuel in cur.fetchall()]
+    conn.rollback()
+    return rows
+
+def main():
+    """메인 실행 함수."""
+    from db_config import db_connection_params
+    from db_utils import connect_to_db, close_db_connection
+
+    parser = argparse.ArgumentParser(description="차량 대체 계보(closure 테이블) 관리")
+    parser.add_argument('--rebuild', action='store_true', help="차량 마스터 전체로 계보 테이블을 다시 만듭니다.")
+    parser.add_argument('--plate', help="이 차량의 계보(최초 내연기관 차량 ~ 최신 대체 차량)를 출력합니다.")
+    args = parser.parse_args()
+
+    logger.info("--- [차량 대체 계보] 시작 ---")
+    conn = connect_to_db(db_connection_params)
+    if not conn:
+        return
+    try:
+        if args.rebuild:
+            refresh_lineage(conn)
+        if args.plate:
+            rows = fetch_vehicle_lineage(conn, args.plate)
+            if not rows:
+                logger.warning(f"⚠️ 계보가 없습니다: {args.plate} (차량번호 또는 계보 갱신 여부 확인)")
+            for kind, plate_no, depth, business_type, fuel in rows:
+                logger.info(f"   - {kind:<10} {plate_no} (거리 {depth}, {business_type}, {fuel or '-'})")
+    finally:
+        close_db_connection(conn)
+
+if __name__ == '__main__':
+    main()